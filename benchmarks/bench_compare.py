@@ -0,0 +1,23 @@
+import numpy as np
+from falass import compare, dataformat
+
+
+class Compare:
+    """Fitting the scale and background of calculated to synthetic experimental reflectometry."""
+    params = ([50, 5000], [100])
+    param_names = ['q_points', 'frames']
+
+    def setup(self, q_points, frames):
+        q = np.linspace(0.01, 0.5, q_points)
+        sim = 1e-7 / np.power(q, 4) + 1e-8
+        rng = np.random.RandomState(0)
+        exp = 0.8 * sim * (1 + 0.05 * rng.normal(size=q_points)) + 2e-7
+        self.exp_data = dataformat.QDataTable(q, exp, 0.05 * exp, 0.05 * q)
+        self.sim_data = dataformat.QDataTable(q, sim, np.zeros(q_points), 0.05 * q)
+        self.sim_stack = dataformat.QDataStack(q, sim * (1 + 0.1 * rng.normal(size=(frames, 1))), dq=0.05 * q)
+
+    def time_fit(self, q_points, frames):
+        compare.Compare(self.exp_data, self.sim_data, 1e-1, 1e-6).fit()
+
+    def time_fit_frames(self, q_points, frames):
+        compare.Compare(self.exp_data, self.sim_data, 1e-1, 1e-6).fit_frames(self.sim_stack)
@@ -0,0 +1,42 @@
+from falass import readwrite
+from benchmarks import synthetic
+from benchmarks.common import quiet
+
+
+class ReadPDB:
+    """Reading a synthetic .pdb trajectory with the native reader and with MDAnalysis."""
+    params = ([1000, 10000], [10, 100], [True, False])
+    param_names = ['atoms', 'frames', 'native']
+    timeout = 600
+
+    def setup(self, atoms, frames, native):
+        self.pdbfile, self.lgtfile, self.datfile = synthetic.files(atoms, frames)
+
+    def time_read_pdb(self, atoms, frames, native):
+        with quiet():
+            readwrite.Files(self.pdbfile).read_pdb(native=native, index=False)
+
+    def time_read_pdb_lazy(self, atoms, frames, native):
+        with quiet():
+            readwrite.Files(self.pdbfile).read_pdb(lazy=True, native=native, index=False)
+
+    def peakmem_read_pdb(self, atoms, frames, native):
+        with quiet():
+            readwrite.Files(self.pdbfile).read_pdb(native=native, index=False)
+
+
+class ReadDat:
+    """Reading the .lgt and a synthetic .dat file."""
+    params = ([50, 5000],)
+    param_names = ['q_points']
+
+    def setup(self, q_points):
+        self.pdbfile, self.lgtfile, self.datfile = synthetic.files(1000, 10, q_points)
+
+    def time_read_dat(self, q_points):
+        with quiet():
+            readwrite.Files(self.pdbfile, datfile=self.datfile).read_dat()
+
+    def time_read_lgt(self, q_points):
+        with quiet():
+            readwrite.Files(self.pdbfile, lgtfile=self.lgtfile).read_lgt()
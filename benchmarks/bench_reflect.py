@@ -0,0 +1,52 @@
+from falass import reflect
+from benchmarks import synthetic
+from benchmarks.common import quiet
+
+
+class Reflectivity:
+    """The reflectometry of a single frame, unsmeared and smeared."""
+    params = ([100, 1000], [50, 500])
+    param_names = ['layers', 'q_points']
+
+    def setup(self, layers, q_points):
+        self.sld_profile = synthetic.sld_profiles(1, layers)[0]
+        self.exp_data = synthetic.q_data(q_points)
+
+    def time_reflectivity(self, layers, q_points):
+        reflect.reflectivity(self.exp_data.q, self.sld_profile)
+
+    def time_convolution(self, layers, q_points):
+        reflect.convolution(self.exp_data, self.sld_profile)
+
+    def time_convolution_pointwise(self, layers, q_points):
+        reflect.convolution_stack(self.exp_data, [self.sld_profile], pointwise=True)
+
+
+class Reflect:
+    """The reflectometry of many frames, and its average."""
+    params = ([10, 100], [100], [50, 500])
+    param_names = ['frames', 'layers', 'q_points']
+    timeout = 600
+
+    def setup(self, frames, layers, q_points):
+        self.sld_profile = synthetic.sld_profiles(frames, layers)
+        self.exp_data = synthetic.q_data(q_points)
+        with quiet():
+            self.reflect = reflect.Reflect(self.sld_profile, self.exp_data)
+            self.reflect.calc_ref()
+
+    def time_calc_ref(self, frames, layers, q_points):
+        with quiet():
+            reflect.Reflect(self.sld_profile, self.exp_data).calc_ref()
+
+    def time_calc_ref_merged(self, frames, layers, q_points):
+        with quiet():
+            reflect.Reflect(self.sld_profile, self.exp_data).calc_ref(merge=1e-7)
+
+    def time_average_ref(self, frames, layers, q_points):
+        with quiet():
+            self.reflect.average_ref()
+
+    def time_average_ref_profile(self, frames, layers, q_points):
+        with quiet():
+            self.reflect.average_ref(method='profile')
@@ -0,0 +1,34 @@
+from falass import job, readwrite, sld
+from benchmarks import synthetic
+from benchmarks.common import quiet
+
+
+class SLD:
+    """Calculating and averaging the SLD profile of each frame of a synthetic trajectory."""
+    params = ([1000, 10000], [10, 100])
+    param_names = ['atoms', 'frames']
+    timeout = 600
+
+    def setup(self, atoms, frames):
+        pdbfile, lgtfile, datfile = synthetic.files(atoms, frames)
+        with quiet():
+            files = readwrite.Files(pdbfile, lgtfile=lgtfile)
+            files.read_pdb()
+            files.read_lgt()
+            self.job = job.Job(files, 1., 0., interactive=False)
+            self.job.set_lgts()
+            self.job.set_times()
+            self.sld = sld.SLD(self.job)
+            self.sld.get_sld_profile()
+
+    def time_get_sld_profile(self, atoms, frames):
+        with quiet():
+            sld.SLD(self.job).get_sld_profile()
+
+    def time_get_sld_profile_not_stored(self, atoms, frames):
+        with quiet():
+            sld.SLD(self.job).get_sld_profile(store=False)
+
+    def time_average_sld_profile(self, atoms, frames):
+        with quiet():
+            self.sld.average_sld_profile()
@@ -0,0 +1,9 @@
+import contextlib
+import io
+
+
+@contextlib.contextmanager
+def quiet():
+    """Hide the progress output of falass while it is timed."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
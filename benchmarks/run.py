@@ -0,0 +1,200 @@
+"""Run the benchmarks without asv.
+
+The benchmark classes in this directory follow the asv conventions (https://asv.readthedocs.io), so ``asv run`` may be
+used to track the timings across the git history. This runner is a lightweight alternative: it times each benchmark
+for every combination of its parameters, appends the minimum times, with the git commit and date, to a JSON history
+file, and prints the ratio of each time to that of the previous entry so that regressions are visible.
+
+    python -m benchmarks.run [--output FILE] [--repeat N] [--filter NAME] [--set atoms=1000,10000]
+"""
+import argparse
+import datetime
+import importlib
+import inspect
+import itertools
+import json
+import os
+import pkgutil
+import subprocess
+import timeit
+import tracemalloc
+
+import numpy as np
+import benchmarks
+
+PREFIXES = ('time_', 'peakmem_')
+
+
+def benchmark_classes():
+    """Find the benchmark classes.
+
+    Returns
+    -------
+    list of tuple
+        The name, in the form 'module.Class', and the class for each benchmark class in the benchmarks package.
+    """
+    classes = []
+    for module_info in pkgutil.iter_modules(benchmarks.__path__):
+        if not module_info.name.startswith('bench_'):
+            continue
+        module = importlib.import_module('benchmarks.' + module_info.name)
+        for name, obj in inspect.getmembers(module, inspect.isclass):
+            if obj.__module__ == module.__name__ and any(m.startswith(PREFIXES) for m in dir(obj)):
+                classes.append(('{}.{}'.format(module_info.name, name), obj))
+    return classes
+
+
+def parameter_sets(cls, overrides=None):
+    """The combinations of parameters of a benchmark class.
+
+    Parameters
+    ----------
+    cls: class
+        The benchmark class, with the asv params and param_names attributes.
+    overrides: dict, optional
+        Replacement values for some of the parameters, by parameter name.
+
+    Returns
+    -------
+    list of tuple
+        Each combination of the parameters.
+    """
+    params = getattr(cls, 'params', [])
+    names = getattr(cls, 'param_names', [])
+    if overrides:
+        params = [overrides.get(name, values) for name, values in zip(names, params)]
+    return list(itertools.product(*params))
+
+
+def measure(instance, method, args, repeat):
+    """Time, or measure the peak memory of, one benchmark.
+
+    Parameters
+    ----------
+    instance: object
+        The benchmark class instance, after setup().
+    method: str
+        The name of the benchmark method.
+    args: tuple
+        The parameters.
+    repeat: int
+        The number of times a time benchmark is repeated.
+
+    Returns
+    -------
+    float
+        The minimum time in seconds, or the peak memory in bytes allocated through Python.
+    """
+    func = getattr(instance, method)
+    if method.startswith('peakmem_'):
+        tracemalloc.start()
+        try:
+            func(*args)
+            return float(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    return min(timeit.repeat(lambda: func(*args), number=1, repeat=repeat))
+
+
+def run(pattern=None, repeat=3, overrides=None):
+    """Run the benchmarks.
+
+    Parameters
+    ----------
+    pattern: str, optional
+        Only benchmarks with this in their full name are run.
+    repeat: int, optional
+        The number of times each time benchmark is repeated.
+    overrides: dict, optional
+        Replacement values for some of the parameters, by parameter name.
+
+    Returns
+    -------
+    dict
+        The result of each benchmark, keyed by its full name and parameters.
+    """
+    results = {}
+    for class_name, cls in benchmark_classes():
+        methods = sorted(m for m in dir(cls) if m.startswith(PREFIXES))
+        for args in parameter_sets(cls, overrides):
+            label = '({})'.format(', '.join(repr(a) for a in args))
+            selected = [m for m in methods if pattern is None or pattern in '{}.{}'.format(class_name, m)]
+            if not selected:
+                continue
+            instance = cls()
+            if hasattr(instance, 'setup'):
+                instance.setup(*args)
+            for method in selected:
+                key = '{}.{}{}'.format(class_name, method, label)
+                results[key] = measure(instance, method, args, repeat)
+                print('{:<80s} {}'.format(key, format_result(method, results[key])))
+    return results
+
+
+def format_result(method, value):
+    """A time in ms or a memory in MiB."""
+    if method.startswith('peakmem_'):
+        return '{:10.2f} MiB'.format(value / 2 ** 20)
+    return '{:10.3f} ms'.format(value * 1e3)
+
+
+def git_commit():
+    """The current git commit of the repository, or None if this is not known."""
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=os.path.dirname(__file__),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def read_history(filename):
+    """The previous entries in the JSON history file, an empty list if there is no file."""
+    if not os.path.isfile(filename):
+        return []
+    with open(filename) as f:
+        return json.load(f)
+
+
+def compare(results, previous):
+    """Print the ratio of each result to that in the previous entry of the history."""
+    print('\nratio to {} ({})'.format(previous['commit'], previous['date']))
+    for key, value in results.items():
+        if key in previous['results'] and previous['results'][key] > 0:
+            ratio = value / previous['results'][key]
+            flag = '  +' if ratio > 1.1 else ('  -' if ratio < 0.9 else '')
+            print('{:<80s} {:10.2f}{}'.format(key, ratio, flag))
+
+
+def parse_set(values):
+    """Parse the --set options, of the form 'name=value,value', into a dict of parameter overrides."""
+    overrides = {}
+    for value in values:
+        if '=' not in value:
+            raise ValueError('The parameter override {} should be of the form name=value,value.'.format(value))
+        name, items = value.split('=', 1)
+        overrides[name.strip()] = [json.loads(item) for item in items.split(',')]
+    return overrides
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run', description='Run the falass benchmarks.')
+    parser.add_argument('--output', default='benchmarks/results.json',
+                        help='the JSON history file the results are appended to')
+    parser.add_argument('--repeat', type=int, default=3, help='the number of repeats of each time benchmark')
+    parser.add_argument('--filter', default=None, help='only run benchmarks with this in their name')
+    parser.add_argument('--set', action='append', default=[], metavar='NAME=VALUES',
+                        help='replace the values of a parameter, e.g. atoms=1000,10000')
+    args = parser.parse_args(argv)
+    results = run(args.filter, args.repeat, parse_set(args.set))
+    history = read_history(args.output)
+    if history:
+        compare(results, history[-1])
+    history.append({'commit': git_commit(), 'date': datetime.datetime.now().isoformat(timespec='seconds'),
+                    'numpy': np.__version__, 'results': results})
+    with open(args.output, 'w') as f:
+        json.dump(history, f, indent=1)
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,137 @@
+import os
+import tempfile
+import numpy as np
+from falass import dataformat
+
+TYPES = ['C1', 'C2', 'N', 'O', 'P', 'H']
+
+_directory = None
+_files = {}
+
+
+def directory():
+    """The directory that the synthetic files are written to, this is kept for the whole benchmark session."""
+    global _directory
+    if _directory is None:
+        _directory = tempfile.mkdtemp(prefix='falass-benchmarks-')
+    return _directory
+
+
+def write_pdb(filename, atoms, frames, seed=0):
+    """Synthetic trajectory.
+
+    Writes a .pdb trajectory in the style of that from GROMACS, with a 'TITLE' line giving the time, a 'CRYST1' line
+    and the atoms of each frame between 'MODEL' and 'ENDMDL' lines. The z-positions are random, denser in the middle
+    of the cell.
+
+    Parameters
+    ----------
+    filename: str
+        Path and name of the .pdb file.
+    atoms: int
+        The number of atoms in each frame.
+    frames: int
+        The number of frames.
+    seed: int, optional
+        The seed for the random z-positions.
+    """
+    rng = np.random.RandomState(seed)
+    names = [TYPES[i % len(TYPES)] for i in range(0, atoms)]
+    with open(filename, 'w') as f:
+        for k in range(0, frames):
+            f.write('TITLE     falass benchmark t= {:.5f}\n'.format(k * 1000.))
+            f.write('CRYST1   50.000   50.000  100.000  90.00  90.00  90.00 P 1           1\n')
+            f.write('MODEL     {:4d}\n'.format(k + 1))
+            zpos = np.clip(rng.normal(50., 15., atoms), 0., 99.999)
+            f.write(''.join('ATOM  {:5d} {:^4s} BENCH   1      25.000  25.000{:8.3f}  1.00  0.00\n'.format(
+                i % 100000, names[i], zpos[i]) for i in range(0, atoms)))
+            f.write('TER\nENDMDL\n')
+
+
+def write_lgt(filename):
+    """Scattering lengths for the synthetic atom types."""
+    with open(filename, 'w') as f:
+        for i, name in enumerate(TYPES):
+            f.write('{} {} {}\n'.format(name, 1. + i, 0.))
+
+
+def write_dat(filename, q_points, seed=0):
+    """Synthetic reflectometry data.
+
+    Writes a 4 column .dat file of a reflectometry-like curve, decaying as q^-4, with 5 % noise and 5 % resolution.
+
+    Parameters
+    ----------
+    filename: str
+        Path and name of the .dat file.
+    q_points: int
+        The number of q-vectors.
+    seed: int, optional
+        The seed for the random noise.
+    """
+    rng = np.random.RandomState(seed)
+    q = np.linspace(0.01, 0.5, q_points)
+    i = 1e-7 / np.power(q, 4) * (1 + 0.05 * rng.normal(size=q_points)) + 1e-7
+    np.savetxt(filename, np.column_stack([q, np.abs(i), 0.05 * np.abs(i), 0.05 * q]))
+
+
+def files(atoms, frames, q_points=50):
+    """Synthetic input files.
+
+    Writes, or reuses from earlier in the session, a synthetic .pdb, .lgt and .dat file.
+
+    Parameters
+    ----------
+    atoms: int
+        The number of atoms in each frame.
+    frames: int
+        The number of frames.
+    q_points: int, optional
+        The number of q-vectors in the .dat file.
+
+    Returns
+    -------
+    tuple
+        The paths of the .pdb, .lgt and .dat files.
+    """
+    key = (atoms, frames, q_points)
+    if key not in _files:
+        pdbfile = os.path.join(directory(), 'synthetic_{}_{}.pdb'.format(atoms, frames))
+        lgtfile = os.path.join(directory(), 'synthetic.lgt')
+        datfile = os.path.join(directory(), 'synthetic_{}.dat'.format(q_points))
+        if not os.path.isfile(pdbfile):
+            write_pdb(pdbfile, atoms, frames)
+        write_lgt(lgtfile)
+        write_dat(datfile, q_points)
+        _files[key] = (pdbfile, lgtfile, datfile)
+    return _files[key]
+
+
+def sld_profiles(frames, layers, seed=0):
+    """Synthetic SLD profiles.
+
+    Parameters
+    ----------
+    frames: int
+        The number of frames.
+    layers: int
+        The number of layers in each profile.
+    seed: int, optional
+        The seed for the random profiles.
+
+    Returns
+    -------
+    falass.dataformat.SLDProfileStack
+        SLD profiles rising from 0 to 6.35e-6 with random fluctuations, with 1 Angstrom layers.
+    """
+    rng = np.random.RandomState(seed)
+    real = np.linspace(0., 6.35e-6, layers) + rng.normal(0., 2e-7, (frames, layers))
+    real[:, 0] = 0.
+    imag = np.zeros((frames, layers))
+    return dataformat.SLDProfileStack(np.ones((frames, layers)), real, imag)
+
+
+def q_data(q_points):
+    """Synthetic q-vectors with 5 % resolution, as a falass.dataformat.QDataTable."""
+    q = np.linspace(0.01, 0.5, q_points)
+    return dataformat.QDataTable(q, dq=0.05 * q)
@@ -0,0 +1,4 @@
+import sys
+from falass.cli import main
+
+sys.exit(main())
@@ -0,0 +1,110 @@
+import numpy as np
+from falass import compare, dataformat, job, progress, reflect, sld, stats
+
+
+def adaptive_average(assigned_job, exp_data, tolerance=1e-3, batch=10, min_frames=20, fit=True, pointwise=False,
+                     merge=None):
+    """Average until converged.
+
+    Calculates the SLD profile and reflectometry of the frames of a falass.job.Job in a coarse to fine order (see
+    falass.job.coarse_to_fine()), a batch of frames at a time, and stops once the average has converged, rather than
+    analysing every frame. After each batch the running average reflectometry is compared with that after the
+    previous batch; if the experimental data has intensities (and fit is true) the change is the relative change in
+    the chi-squared of the fitted scale and background (see falass.compare.fit_scale_and_background()), otherwise it
+    is the largest relative change in the average reflectometry. As the early frames of the order are spread over the
+    whole trajectory, an over-sampled trajectory converges after a fraction of its frames.
+
+    The times of the job are replaced by those of the frames that were analysed, and the returned SLD and Reflect
+    objects hold the profiles of these frames in time order, as from falass.sld.SLD.get_sld_profile() and
+    falass.reflect.Reflect.calc_ref().
+
+    Parameters
+    ----------
+    assigned_job: falass.job.Job
+        The job, with the scattering lengths and times set.
+    exp_data: falass.dataformat.QDataTable or array_like falass.dataformat.QData
+        The q-vectors to calculate the reflectometry at, and optionally the experimental data.
+    tolerance: float, optional
+        The relative change below which the average is taken to have converged.
+    batch: int, optional
+        The number of frames analysed between each check of the convergence.
+    min_frames: int, optional
+        The number of frames in the first batch, the average of which is the first that later averages are compared
+        with.
+    fit: bool, optional
+        Should the change in chi-squared be used if there is experimental data.
+    pointwise: bool, optional
+        Should the resolution of each q-vector be used for the smearing, see falass.reflect.Reflect.calc_ref().
+    merge: float, optional
+        If given, adjacent layers with SLD within this tolerance are merged before the reflectometry is calculated,
+        see falass.reflect.merge_layers().
+
+    Returns
+    -------
+    falass.sld.SLD
+        The SLD profiles of the frames that were analysed.
+    falass.reflect.Reflect
+        The reflectometry of the frames that were analysed.
+    array_like float
+        The number of frames and the change at each check of the convergence, as a (checks x 2) array.
+    """
+    if tolerance <= 0 or batch < 1:
+        raise ValueError("The tolerance must be positive and the batch at least one frame.")
+    files = assigned_job.files
+    exp_data = dataformat.as_qdata_table(exp_data)
+    use_chi2 = fit and exp_data.i is not None and exp_data.di is not None
+    real_scatlens, imag_scatlens = sld.scatlen_arrays(files.atom_names, files.scat_len_table())
+    indices = np.flatnonzero(files.frame_mask(assigned_job.times))
+    if indices.size == 0:
+        raise ValueError("None of the timesteps of the job are in the trajectory, so no frames were selected.")
+    order = indices[job.coarse_to_fine(indices.size)]
+    layers = sld.number_of_layers(np.asarray(files.cell)[indices], assigned_job.layer_thickness,
+                                  assigned_job.cut_off_size)
+
+    profiles = sld.SLD(assigned_job)
+    profiles.running_average = stats.RunningAverage()
+    reflectometry = reflect.Reflect([], exp_data)
+    reflectometry.running_average = stats.RunningAverage()
+    progress.message("Calculating SLD profile and reflectometry until converged")
+    sld_list = []
+    refl = []
+    history = []
+    previous = None
+    done = 0
+    prog = progress.progress('adaptive', indices.size)
+    while done < order.size:
+        chunk = order[done:min(done + max(batch, min_frames - done), order.size)]
+        batch_profiles = []
+        for frame in files.frames(indices=chunk):
+            real, imag = sld.bin_sld(frame.zpos, real_scatlens, imag_scatlens, frame.cell,
+                                     assigned_job.layer_thickness, assigned_job.cut_off_size, layers)
+            profiles._add_profile(real, imag, batch_profiles, True)
+            prog.update()
+        block_profiles = dataformat.as_sld_stack(batch_profiles)
+        if merge is not None:
+            block_profiles = reflect.merge_layers(block_profiles, merge)
+        block = reflect.convolution_stack(exp_data, block_profiles, pointwise=pointwise)
+        reflectometry.running_average.update_batch(block)
+        sld_list.extend(batch_profiles)
+        refl.append(block)
+        done += chunk.size
+        average = reflectometry.running_average.mean
+        if use_chi2:
+            current = compare.fit_scale_and_background(exp_data, average)[2]
+        else:
+            current = average.copy()
+        if previous is not None:
+            change = np.max(np.abs(current - previous) / np.maximum(np.abs(previous), np.finfo(float).tiny))
+            history.append((done, change))
+            if change < tolerance:
+                break
+        previous = current
+    prog.close()
+    progress.message("Analysed {} of {} frames".format(done, indices.size))
+
+    taken = np.argsort(order[:done], kind='stable')
+    assigned_job.times = np.asarray(files.times, dtype=np.float64)[order[:done][taken]]
+    profiles.sld_profile = dataformat.as_sld_stack([sld_list[k] for k in taken])
+    reflectometry.sld_profile = profiles.sld_profile
+    reflectometry.reflect = dataformat.QDataStack(exp_data.q, np.concatenate(refl)[taken], dq=exp_data.dq)
+    return profiles, reflectometry, np.array(history).reshape(-1, 2)
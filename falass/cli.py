@@ -0,0 +1,94 @@
+import argparse
+import json
+import logging
+import sys
+from falass import pipeline, progress
+
+
+def parse_override(text):
+    """Parse a command line configuration value.
+
+    Parameters
+    ----------
+    text: str
+        A value in the form section.key=value, where the value is read as JSON if possible and otherwise kept as a
+        string.
+
+    Returns
+    -------
+    str
+        The section.
+    str
+        The key.
+    object
+        The value.
+    """
+    name, separator, value = text.partition('=')
+    section, dot, key = name.partition('.')
+    if not separator or not dot:
+        raise ValueError("The configuration value {} should be given as section.key=value.".format(text))
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+    return section, key, value
+
+
+def main(argv=None):
+    """Command line interface.
+
+    The falass command, 'falass run config.toml' runs the full analysis described by the configuration file without
+    any user input (see falass.pipeline.run()), resuming from the checkpoints of any stages that have already
+    finished unless the --restart option is given. Configuration values may be given or replaced with the --set
+    option. With the --log option the progress bars are replaced by the time taken and throughput of each stage,
+    written to the given log file (see falass.progress.LoggingReporter).
+
+    Parameters
+    ----------
+    argv: array_like str, optional
+        The command line arguments, if not given these are taken from sys.argv.
+
+    Returns
+    -------
+    int
+        The exit status, 0 on success and 1 if the job failed.
+    """
+    parser = argparse.ArgumentParser(prog='falass', description='Neutron and X-ray reflectometry from computer '
+                                                                'simulation.')
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+    run = subparsers.add_parser('run', help='run the analysis described by a configuration file')
+    run.add_argument('config', help='the .toml or .json configuration file')
+    run.add_argument('--set', action='append', default=[], metavar='SECTION.KEY=VALUE',
+                     help='give or replace a configuration value, such as --set job.times=[0,5000,100]')
+    run.add_argument('--restart', action='store_true',
+                     help='run every stage, rather than resuming from the checkpoints of finished stages')
+    run.add_argument('--log', metavar='FILE',
+                     help='write the progress and timing of each stage to a log file, rather than progress bars')
+    args = parser.parse_args(argv)
+
+    previous = progress.get_reporter()
+    handler = None
+    if args.log:
+        handler = logging.FileHandler(args.log)
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+        logger = logging.getLogger('falass')
+        logger.addHandler(handler)
+        logger.setLevel(logging.INFO)
+        progress.set_reporter(progress.LoggingReporter(logger))
+
+    try:
+        overrides = {}
+        for text in args.set:
+            section, key, value = parse_override(text)
+            overrides.setdefault(section, {})[key] = value
+        pipeline.run(pipeline.load_config(args.config, overrides), resume=not args.restart)
+    except (ValueError, OSError) as error:
+        print('falass: error: {}'.format(error), file=sys.stderr)
+        return 1
+    finally:
+        if handler is not None:
+            progress.set_reporter(previous)
+            logging.getLogger('falass').removeHandler(handler)
+            handler.close()
+    return 0
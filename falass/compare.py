@@ -1,7 +1,6 @@
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.optimize import curve_fit
-from falass import dataformat
+from falass import dataformat, stats
 
 
 class Compare:
@@ -11,9 +10,9 @@ class Compare:
 
     Parameters
     ----------
-    exp_data: array_like falass.dataformat.QData
+    exp_data: falass.dataformat.QDataTable or array_like falass.dataformat.QData
         The experimental reflectometry data read from the datfile.
-    sim_data: array_like falass.dataformat.QData
+    sim_data: falass.dataformat.QDataTable or array_like falass.dataformat.QData
         The calculated reflectometry data from the simulation.
     scale: float
         The amount by which the calculated reflectometry should be scaled.
@@ -26,29 +25,112 @@ class Compare:
         self.scale = scale
         self.background = background
         self.sim_data_fitted = []
+        self.chi2 = None
+        self.series = None
 
     def fit(self, bounds=((1e-100, 0), (np.inf, np.inf))):
         """Fit scale and background.
 
-        Perform the fitting of the scale and background for the calculated data to the experimental data.
-        Currently only a logarithmically transformed fitted can be conducted.
+        Perform the fitting of the scale and background for the calculated data to the experimental data. The fit is
+        a weighted linear least squares in Rq^4 space, which is solved exactly (see fit_scale_and_background()). The
+        chi-squared of the fit is stored in chi2.
+
+        Parameters
+        ----------
+        bounds: tuple, optional
+            The lower and upper bounds, ((scale, background), (scale, background)).
+        """
+        exp_data = self._exp_data()
+        sim_data = dataformat.as_qdata_table(self.sim_data)
+        scale, background, chi2 = fit_scale_and_background(exp_data, sim_data.i, bounds)
+        self.scale = float(scale)
+        self.background = float(background)
+        self.chi2 = float(chi2)
+
+    def fit_frames(self, sim_data, bounds=((1e-100, 0), (np.inf, np.inf))):
+        """Fit scale and background to many frames.
+
+        Fits the scale and background for the calculated reflectometry of each of a number of frames (or candidate
+        simulations) to the experimental data in a single vectorized call, the scale and background of the Compare
+        object are not changed.
+
+        Parameters
+        ----------
+        sim_data: falass.dataformat.QDataStack or array_like float
+            The calculated reflectometry of each frame, such as falass.reflect.Reflect.reflect, or a (frames x q)
+            array of intensities.
+        bounds: tuple, optional
+            The lower and upper bounds, ((scale, background), (scale, background)).
+
+        Returns
+        -------
+        array_like float
+            The scale for each frame.
+        array_like float
+            The background for each frame.
+        array_like float
+            The chi-squared of the fit to each frame.
+        """
+        exp_data = self._exp_data()
+        if isinstance(sim_data, dataformat.QDataStack):
+            sim_data = sim_data.i
+        return fit_scale_and_background(exp_data, np.atleast_2d(sim_data), bounds)
+
+    def fit_series(self, sim_data, window=1, step=1, times=None, bounds=((1e-100, 0), (np.inf, np.inf))):
+        """Goodness of fit through the trajectory.
+
+        Fits the scale and background, and finds the chi-squared, for the calculated reflectometry of each frame
+        (window=1) or for the average reflectometry of each sliding window of frames, giving a time series that shows
+        which parts of the trajectory agree with the experimental data and whether the simulation has equilibrated.
+        The window averages are found from a cumulative sum (see falass.stats.window_mean()) and all of the windows
+        are fitted in a single call of fit_scale_and_background(). The result is also kept as the series attribute.
+
+        Parameters
+        ----------
+        sim_data: falass.dataformat.QDataStack or array_like float
+            The calculated reflectometry of each frame, such as falass.reflect.Reflect.reflect.
+        window: int, optional
+            The number of frames in each window.
+        step: int, optional
+            The number of frames between the starts of consecutive windows.
+        times: array_like float, optional
+            The time of each frame, if not given the frame indices are used.
+        bounds: tuple, optional
+            The lower and upper bounds, ((scale, background), (scale, background)).
+
+        Returns
+        -------
+        array_like float
+            The mean time of the frames in each window.
+        array_like float
+            The scale for each window.
+        array_like float
+            The background for each window.
+        array_like float
+            The chi-squared of each window.
         """
+        exp_data = self._exp_data()
+        if isinstance(sim_data, dataformat.QDataStack):
+            sim_data = sim_data.i
+        if np.size(sim_data) == 0:
+            raise ValueError("The reflectometry of each frame has not been kept -- please run calc_ref() with "
+                             "store=True.")
+        sim_data = np.atleast_2d(sim_data)
+        if times is None:
+            times = np.arange(sim_data.shape[0], dtype=np.float64)
+        means = stats.window_mean(sim_data, window, step)[0]
+        window_times = stats.window_mean(times, window, step)[0]
+        scale, background, chi2 = fit_scale_and_background(exp_data, means, bounds)
+        self.series = (window_times, scale, background, chi2)
+        return self.series
+
+    def _exp_data(self):
         if len(self.exp_data) > 0:
-            if self.exp_data[0].i is not None:
-                y = []
-                dy = []
-                y2 = []
-                for i in range(0, len(self.exp_data)):
-                    y.append(self.exp_data[i].i * np.power(self.exp_data[i].q, 4))
-                    dy.append(self.exp_data[i].di * np.power(self.exp_data[i].q, 4))
-                    y2.append(self.sim_data[i].i * np.power(self.exp_data[i].q, 4))
-                popt, pcov = curve_fit(scale_and_background, y2, y, bounds=bounds, sigma=dy)
-                self.scale = popt[0]
-                self.background = popt[1]
-            else:
-                raise ValueError('No experimental data has been set for comparison, please read in a a .dat file.')
-        else:
-            raise ValueError('No q vectors have been defined -- either read a .dat file or get q vectors.')
+            exp_data = dataformat.as_qdata_table(self.exp_data)
+            if exp_data.i is not None:
+                return exp_data
+            raise ValueError('No experimental data has been set for comparison, please read in a a .dat file.')
+        raise ValueError('No q vectors have been defined -- either read a .dat file or get q vectors.')
 
     def plot_compare(self, fitted=True, rq4=True): #pragma: no cover
         """Plot a comparison.
@@ -62,51 +144,31 @@ class Compare:
         fitted: bool
             Should the fitted reflectometry data be used.
         """
-        x = []
-        y = []
-        dy = []
-        x2 = []
-        y2 = []
-        dy2 = []
+        exp_data = dataformat.as_qdata_table(self.exp_data)
         plt.rc('text')
         plt.rc('font', family='serif')
         plt.figure(figsize=(15,10))
         if fitted:
             if len(self.sim_data_fitted) > 0:
-                k = self.sim_data_fitted
+                k = dataformat.as_qdata_table(self.sim_data_fitted)
             else:
                 raise ValueError("The reflectometry data has not been returned yet -- please run the fit() function "
                                  "and the return_fitted().")
         else:
-            k = self.sim_data
+            k = dataformat.as_qdata_table(self.sim_data)
+        x = k.q
+        x2 = exp_data.q
         if rq4:
-            for i in range(0, len(self.exp_data)):
-                x.append(k[i].q)
-                y.append(k[i].i * np.power(self.exp_data[i].q, 4))
-                da = k[i].di * np.power(self.exp_data[i].q, 4)
-                dy.append(da)
-                x2.append(self.exp_data[i].q)
-                y2.append(self.exp_data[i].i * np.power(self.exp_data[i].q, 4))
-                da = self.exp_data[i].di * np.power(self.exp_data[i].q, 4)
-                dy2.append(da)
-                plt.ylabel('$Rq^4$')
+            y = k.i * np.power(exp_data.q, 4)
+            dy = k.di * np.power(exp_data.q, 4)
+            y2 = exp_data.i * np.power(exp_data.q, 4)
+            dy2 = exp_data.di * np.power(exp_data.q, 4)
         else:
-            for i in range(0, len(self.exp_data)):
-                x.append(k[i].q)
-                y.append(k[i].i)
-                da = k[i].di
-                dy.append(da)
-                x2.append(self.exp_data[i].q)
-                y2.append(self.exp_data[i].i)
-                da = self.exp_data[i].di
-                dy2.append(da)
-                plt.ylabel('$Rq^4$')
-        x = np.asarray(x)
-        y = np.asarray(y)
-        dy = np.asarray(dy)
-        x2 = np.asarray(x2)
-        y2 = np.asarray(y2)
-        dy2 = np.asarray(dy2)
+            y = k.i
+            dy = k.di
+            y2 = exp_data.i
+            dy2 = exp_data.di
+        plt.ylabel('$Rq^4$')
         plt.errorbar(x, y, yerr=dy)
         plt.errorbar(x2, y2, yerr=dy2, linestyle='', marker='o')
         plt.xlabel('$q$ (\AA)')
@@ -118,11 +180,9 @@ class Compare:
 
         Return the fitted calculated reflectometry data for use.
         """
-        self.sim_data_fitted = []
-        for i in range(0, len(self.sim_data)):
-            a = self.sim_data[i].i * self.scale + self.background
-            b = self.sim_data[i].di * self.scale
-            self.sim_data_fitted.append(dataformat.QData(self.sim_data[i].q, a, b, self.sim_data[i].dq))
+        sim_data = dataformat.as_qdata_table(self.sim_data)
+        self.sim_data_fitted = dataformat.QDataTable(sim_data.q, sim_data.i * self.scale + self.background,
+                                                     sim_data.di * self.scale, sim_data.dq)
 
 
 def scale_and_background(sim_data, scale, background):
@@ -146,3 +206,75 @@ def scale_and_background(sim_data, scale, background):
     """
     sim_data = (sim_data * scale + background)
     return sim_data
+
+
+def fit_scale_and_background(exp_data, sim_i, bounds=((1e-100, 0), (np.inf, np.inf))):
+    """Weighted linear fit of scale and background.
+
+    Finds the scale and background that minimise the chi-squared between the scaled calculated and the experimental
+    reflectometry in Rq^4 space, weighted by the experimental uncertainty. As the model is linear in both parameters
+    the minimum is found in closed form: if the unconstrained solution is outside of the bounds, the minimum is on one
+    of the edges of the bounds, where the best value of the other parameter is again found in closed form and clipped.
+    The sums are taken about the weighted mean for numerical stability.
+
+    Parameters
+    ----------
+    exp_data: falass.dataformat.QDataTable
+        The experimental reflectometry data, with uncertainties.
+    sim_i: array_like float
+        The calculated reflectometry at the same q-vectors, for a single frame or a (frames x q) array.
+    bounds: tuple, optional
+        The lower and upper bounds, ((scale, background), (scale, background)).
+
+    Returns
+    -------
+    float or array_like float
+        The scale, for each frame if sim_i is 2 dimensional.
+    float or array_like float
+        The background.
+    float or array_like float
+        The chi-squared at the minimum.
+    """
+    q4 = np.power(exp_data.q, 4)
+    y = exp_data.i * q4
+    w = 1. / np.square(exp_data.di * q4)
+    x = np.asarray(sim_i, dtype=np.float64) * q4
+    (scale_lo, background_lo), (scale_hi, background_hi) = bounds
+
+    sw = np.sum(w)
+    ybar = np.dot(w, y) / sw
+    xbar = x.dot(w) / sw
+    xc = x - xbar[..., np.newaxis] if x.ndim > 1 else x - xbar
+    yc = y - ybar
+    cxx = np.square(xc).dot(w)
+    cxy = xc.dot(w * yc)
+    cyy = np.dot(w, np.square(yc))
+
+    def chi2(scale, background):
+        return cyy - 2 * scale * cxy + np.square(scale) * cxx + sw * np.square(ybar - scale * xbar - background)
+
+    candidates = []
+    with np.errstate(divide='ignore', invalid='ignore'):
+        scale = cxy / cxx
+        background = ybar - scale * xbar
+        inside = ((scale >= scale_lo) & (scale <= scale_hi) & (background >= background_lo) &
+                  (background <= background_hi))
+        candidates.append((np.where(inside, scale, np.nan), np.where(inside, background, np.nan)))
+        for scale_edge in (scale_lo, scale_hi):
+            if np.isfinite(scale_edge):
+                scale = np.full_like(xbar, scale_edge)
+                candidates.append((scale, np.clip(ybar - scale * xbar, background_lo, background_hi)))
+        for background_edge in (background_lo, background_hi):
+            if np.isfinite(background_edge):
+                background = np.full_like(xbar, background_edge)
+                scale = (cxy + sw * xbar * (ybar - background)) / (cxx + sw * np.square(xbar))
+                candidates.append((np.clip(scale, scale_lo, scale_hi), background))
+        scales = np.array([candidate[0] for candidate in candidates])
+        backgrounds = np.array([candidate[1] for candidate in candidates])
+        chi2s = chi2(scales, backgrounds)
+    chi2s = np.where(np.isnan(chi2s), np.inf, chi2s)
+    best = np.argmin(chi2s, axis=0)
+    if x.ndim > 1:
+        frames = np.arange(x.shape[0])
+        return scales[best, frames], backgrounds[best, frames], chi2s[best, frames]
+    return scales[best], backgrounds[best], chi2s[best]
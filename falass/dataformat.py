@@ -1,3 +1,6 @@
+import numpy as np
+
+
 class QData:
     """Reflectometry data.
 
@@ -23,6 +26,112 @@ class ScatLens:
         self.imag = imag * 1e-5
 
 
+class ScatLenTable:
+    """Scattering length lookup.
+
+    A class to hold the scattering lengths of the different atom types as a mapping from the atom type name to an
+    integer type id, with the real and imaginary scattering lengths in the real and imag arrays indexed by the type
+    id. These arrays are only rebuilt when an atom type is added. As with a list of falass.dataformat.ScatLens, only
+    the first occurrence of an atom type is kept.
+
+    Parameters
+    ----------
+    scat_lens: array_like falass.dataformat.ScatLens, optional
+        The scattering lengths of the atom types.
+    """
+    def __init__(self, scat_lens=()):
+        self.ids = {}
+        self.atoms = []
+        self.real = np.zeros(0)
+        self.imag = np.zeros(0)
+        for scat_len in scat_lens:
+            self.add(scat_len)
+
+    def __len__(self):
+        return len(self.atoms)
+
+    def __contains__(self, atom):
+        return atom in self.ids
+
+    def add(self, scat_len):
+        """Add an atom type.
+
+        Parameters
+        ----------
+        scat_len: falass.dataformat.ScatLens
+            The scattering lengths of the atom type.
+
+        Returns
+        -------
+        bool
+            True if the atom type was added, false if it was already present.
+        """
+        if scat_len.atom in self.ids:
+            return False
+        self.ids[scat_len.atom] = len(self.atoms)
+        self.atoms.append(scat_len.atom)
+        self.real = np.append(self.real, float(scat_len.real))
+        self.imag = np.append(self.imag, float(scat_len.imag))
+        return True
+
+    def missing(self, atoms):
+        """Atom types without scattering lengths.
+
+        Parameters
+        ----------
+        atoms: array_like str
+            The atom type name of each atom.
+
+        Returns
+        -------
+        list str
+            The atom types that are not in the table, in the order in which they first appear.
+        """
+        types, first = np.unique(np.asarray(atoms, dtype=str), return_index=True)
+        return self._missing(types, first)
+
+    def _missing(self, types, first):
+        absent = set(types.tolist()) - self.ids.keys()
+        return [atom for atom in types[np.argsort(first)].tolist() if atom in absent]
+
+    def encode(self, atoms):
+        """Integer type ids.
+
+        Parameters
+        ----------
+        atoms: array_like str
+            The atom type name of each atom.
+
+        Returns
+        -------
+        array_like int
+            The type id of each atom.
+        """
+        types, first, type_index = np.unique(np.asarray(atoms, dtype=str), return_index=True, return_inverse=True)
+        missing = self._missing(types, first)
+        if len(missing) > 0:
+            raise ValueError("The atom types {} have no scattering lengths defined.".format(', '.join(missing)))
+        return np.array([self.ids[atom] for atom in types.tolist()], dtype=np.int64)[type_index]
+
+    def lengths(self, atoms):
+        """Scattering lengths for every atom.
+
+        Parameters
+        ----------
+        atoms: array_like str
+            The atom type name of each atom.
+
+        Returns
+        -------
+        array_like float
+            The real scattering length of each atom.
+        array_like float
+            The imaginary scattering length of each atom.
+        """
+        ids = self.encode(atoms)
+        return self.real[ids], self.imag[ids]
+
+
 class AtomPositions:
     """z-Dimension positions.
 
@@ -54,4 +163,314 @@ class Atom3Positions:
         self.atom = atom
         self.x = x
         self.y = y
-        self.z = z
\ No newline at end of file
+        self.z = z
+
+
+class Frame:
+    """Trajectory frame.
+
+    A class to hold a single frame of the trajectory consisting of a float time of the timestep, an array of the three
+    cell dimensions and an array of the position of each atom in the z-dimension.
+    """
+    def __init__(self, time, cell, zpos):
+        self.time = time
+        self.cell = cell
+        self.zpos = zpos
+
+
+class QDataTable:
+    """Columnar reflectometry data.
+
+    A class to hold a set of q points as contiguous arrays of the q-vector, intensity, uncertainty in the intensity and
+    resolution of the q-vector. The intensity and its uncertainty may be None when only q-vectors have been defined.
+    Indexing with an integer returns a falass.dataformat.QData object, indexing with a slice or array returns a new
+    QDataTable.
+
+    Parameters
+    ----------
+    q: array_like float
+        The q-vectors.
+    i: array_like float, optional
+        The intensity at each q-vector.
+    di: array_like float, optional
+        The uncertainty in the intensity at each q-vector.
+    dq: array_like float, optional
+        The resolution of each q-vector.
+    """
+    def __init__(self, q, i=None, di=None, dq=None):
+        self.q = np.asarray(q, dtype=np.float64)
+        self.i = _as_column(i)
+        self.di = _as_column(di)
+        self.dq = _as_column(dq)
+
+    def __len__(self):
+        return self.q.size
+
+    def __iter__(self):
+        for j in range(0, len(self)):
+            yield self[j]
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return QData(self.q[index], _item(self.i, index), _item(self.di, index), _item(self.dq, index))
+        return QDataTable(self.q[index], _item(self.i, index), _item(self.di, index), _item(self.dq, index))
+
+
+class QDataStack:
+    """Columnar reflectometry data for many frames.
+
+    A class to hold a reflectometry profile for each of a number of frames, all sharing the same q-vectors. The
+    intensity and its uncertainty are (frames x q) arrays. Indexing with an integer returns the
+    falass.dataformat.QDataTable of that frame.
+
+    Parameters
+    ----------
+    q: array_like float
+        The q-vectors.
+    i: array_like float
+        The (frames x q) intensities.
+    di: array_like float, optional
+        The (frames x q) uncertainties in the intensity, zero if not given.
+    dq: array_like float, optional
+        The resolution of each q-vector.
+    """
+    def __init__(self, q, i, di=None, dq=None):
+        self.q = np.asarray(q, dtype=np.float64)
+        self.i = _as_rows(i)
+        if di is None:
+            di = np.zeros_like(self.i)
+        self.di = _as_rows(di)
+        self.dq = _as_column(dq)
+
+    def __len__(self):
+        return self.i.shape[0]
+
+    def __iter__(self):
+        for j in range(0, len(self)):
+            yield self[j]
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return QDataTable(self.q, self.i[index], self.di[index], self.dq)
+        return QDataStack(self.q, self.i[index], self.di[index], self.dq)
+
+
+class SLDProfile:
+    """Columnar layer information for an SLD profile.
+
+    A class to hold a single SLD profile as contiguous arrays of the thickness, real scattering length density and
+    imaginary scattering length density of each layer. Indexing with an integer returns a falass.dataformat.SLDPro
+    object.
+
+    Parameters
+    ----------
+    thick: array_like float
+        The thickness of each layer.
+    real: array_like float
+        The real scattering length density of each layer.
+    imag: array_like float
+        The imaginary scattering length density of each layer.
+    """
+    def __init__(self, thick, real, imag):
+        self.thick = np.asarray(thick, dtype=np.float64)
+        self.real = np.asarray(real, dtype=np.float64)
+        self.imag = np.asarray(imag, dtype=np.float64)
+
+    def __len__(self):
+        return self.thick.size
+
+    def __iter__(self):
+        for j in range(0, len(self)):
+            yield self[j]
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return SLDPro(self.thick[index], self.real[index], self.imag[index])
+        return SLDProfile(self.thick[index], self.real[index], self.imag[index])
+
+
+class SLDProfileStack:
+    """Columnar SLD profiles for many frames.
+
+    A class to hold the SLD profile of each of a number of frames as (frames x layers) arrays of the thickness, real
+    scattering length density and imaginary scattering length density. Indexing with an integer returns the
+    falass.dataformat.SLDProfile of that frame.
+
+    Parameters
+    ----------
+    thick: array_like float
+        The (frames x layers) thickness of each layer.
+    real: array_like float
+        The (frames x layers) real scattering length density of each layer.
+    imag: array_like float
+        The (frames x layers) imaginary scattering length density of each layer.
+    """
+    def __init__(self, thick, real, imag):
+        self.thick = _as_rows(thick)
+        self.real = _as_rows(real)
+        self.imag = _as_rows(imag)
+
+    def __len__(self):
+        return self.thick.shape[0]
+
+    def __iter__(self):
+        for j in range(0, len(self)):
+            yield self[j]
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return SLDProfile(self.thick[index], self.real[index], self.imag[index])
+        return SLDProfileStack(self.thick[index], self.real[index], self.imag[index])
+
+
+class AtomPositionsStack:
+    """Columnar z-dimension positions for many frames.
+
+    A class to hold the atom positions in the z-dimension of each of a number of frames as a single (frames x atoms)
+    array, with the atom type names shared between the frames. Indexing with an integer returns a list of
+    falass.dataformat.AtomPositions objects for that frame, these are only created when they are needed.
+
+    Parameters
+    ----------
+    names: array_like str
+        The atom type name of each atom.
+    zpos: array_like float
+        The (frames x atoms) position of each atom in the z-dimension.
+    """
+    def __init__(self, names, zpos):
+        self.names = np.asarray(names)
+        self.zpos = np.atleast_2d(zpos)
+
+    def __len__(self):
+        return self.zpos.shape[0]
+
+    def __iter__(self):
+        for j in range(0, len(self)):
+            yield self[j]
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            return [AtomPositions(name, position) for name, position in zip(self.names, self.zpos[index])]
+        return AtomPositionsStack(self.names, self.zpos[index])
+
+
+def as_qdata_table(data):
+    """Reflectometry data as a QDataTable.
+
+    Converts an array of falass.dataformat.QData objects to a falass.dataformat.QDataTable, a QDataTable is returned
+    unchanged.
+
+    Parameters
+    ----------
+    data: array_like falass.dataformat.QData or falass.dataformat.QDataTable
+        The reflectometry data.
+
+    Returns
+    -------
+    falass.dataformat.QDataTable
+        The reflectometry data as contiguous arrays.
+    """
+    if isinstance(data, QDataTable):
+        return data
+    return QDataTable([point.q for point in data], _column([point.i for point in data]),
+                      _column([point.di for point in data]), _column([point.dq for point in data]))
+
+
+def as_qdata_stack(data):
+    """Reflectometry data for many frames as a QDataStack.
+
+    Converts an array of arrays of falass.dataformat.QData objects (or of falass.dataformat.QDataTable) to a
+    falass.dataformat.QDataStack, a QDataStack is returned unchanged. The q-vectors and resolution are taken from
+    the first frame.
+
+    Parameters
+    ----------
+    data: array_like
+        The reflectometry data for each frame.
+
+    Returns
+    -------
+    falass.dataformat.QDataStack
+        The reflectometry data as (frames x q) arrays.
+    """
+    if isinstance(data, QDataStack):
+        return data
+    tables = [as_qdata_table(frame) for frame in data]
+    i = np.array([table.i for table in tables], dtype=np.float64)
+    di = np.array([table.di if table.di is not None else np.zeros(len(table)) for table in tables],
+                  dtype=np.float64)
+    return QDataStack(tables[0].q, i, di, tables[0].dq)
+
+
+def as_sld_profile(profile):
+    """SLD profile as an SLDProfile.
+
+    Converts an array of falass.dataformat.SLDPro objects to a falass.dataformat.SLDProfile, an SLDProfile is
+    returned unchanged.
+
+    Parameters
+    ----------
+    profile: array_like falass.dataformat.SLDPro or falass.dataformat.SLDProfile
+        The layers of the SLD profile.
+
+    Returns
+    -------
+    falass.dataformat.SLDProfile
+        The SLD profile as contiguous arrays.
+    """
+    if isinstance(profile, SLDProfile):
+        return profile
+    return SLDProfile([layer.thick for layer in profile], [layer.real for layer in profile],
+                      [layer.imag for layer in profile])
+
+
+def as_sld_stack(profiles):
+    """SLD profiles for many frames as an SLDProfileStack.
+
+    Converts an array of SLD profiles (each an array of falass.dataformat.SLDPro or a falass.dataformat.SLDProfile)
+    to a falass.dataformat.SLDProfileStack, an SLDProfileStack is returned unchanged.
+
+    Parameters
+    ----------
+    profiles: array_like
+        The SLD profile of each frame.
+
+    Returns
+    -------
+    falass.dataformat.SLDProfileStack
+        The SLD profiles as (frames x layers) arrays.
+    """
+    if isinstance(profiles, SLDProfileStack):
+        return profiles
+    profiles = [as_sld_profile(profile) for profile in profiles]
+    if len(set([len(profile) for profile in profiles])) > 1:
+        raise ValueError("The SLD profiles have differing numbers of layers, if the cell size changes during the "
+                         "simulation each frame should be binned with the same number of layers (see "
+                         "falass.sld.number_of_layers()).")
+    return SLDProfileStack([profile.thick for profile in profiles], [profile.real for profile in profiles],
+                           [profile.imag for profile in profiles])
+
+
+def _as_rows(values):
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim < 2 and values.size == 0:
+        return values.reshape(0, 0)
+    return np.atleast_2d(values)
+
+
+def _as_column(values):
+    if values is None:
+        return None
+    return np.asarray(values, dtype=np.float64)
+
+
+def _column(values):
+    if any(value is None for value in values):
+        return None
+    return values
+
+
+def _item(values, index):
+    if values is None:
+        return None
+    return values[index]
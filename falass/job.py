@@ -1,5 +1,5 @@
 import numpy as np
-from falass import readwrite, dataformat
+from falass import dataformat, progress
 import os
 
 
@@ -18,11 +18,15 @@ class Job():
     cut_off_size: float
         The size of the simulation cell that should be ignored from the bottom -- this is to allow for the use
         of a vacuum gap at the bottom of the cell.
+    interactive: bool, optional
+        If false the job will never ask for input, missing scattering lengths or invalid timesteps raise a ValueError
+        instead, as is needed for unattended batch jobs.
     """
-    def __init__(self, files, layer_thickness, cut_off_size):
+    def __init__(self, files, layer_thickness, cut_off_size, interactive=True):
         self.files = files
         self.layer_thickness = layer_thickness
         self.cut_off_size = cut_off_size
+        self.interactive = interactive
         self.times = np.asarray(self.files.times)
         self.new_file = False
 
@@ -56,44 +60,34 @@ class Job():
         will help the user to build one by working through the atom types in the pdb file and requesting input of the
         real and imaginary scattering lengths. This will also occur if a atom type if found in the pdbfile but not in
         the given lgts file. falass will write the lgtfile to disk if atom types do not feature in the given lgtfile or
-        one is written from scratch.
+        one is written from scratch. The atom types are taken from the topology, as these are the same in every frame,
+        and the missing atom types are found with a single set difference against the falass.dataformat.ScatLenTable
+        of the files (see falass.readwrite.Files.scat_len_table()).
         """
+        missing = self.files.scat_len_table().missing(self.files.atom_names)
+        if not self.interactive:
+            if not self.files.lgtfile:
+                raise ValueError("No lgtfile has been defined.")
+            if len(missing) > 0:
+                raise ValueError("The following atom types have no scattering length given in the lgt file {}: "
+                                 "{}".format(self.files.lgtfile, ', '.join(missing)))
+            return
         if self.files.lgtfile:
-            lines = len(self.files.atoms)
-            print("Setting atoms lengths")
-            percentage = 0
-            readwrite.print_update(percentage)
+            progress.message("Setting atoms lengths")
+            prog = progress.progress('set_lgts', len(missing))
             path, extension = os.path.splitext(self.files.lgtfile)
             lgtfile_name = path + extension
-            for i in range(0, len(self.files.atoms)):
-                percentage_new = np.floor(i / lines * 100)
-                percentage = readwrite.check_update(percentage, percentage_new)
-                for j in range(0, len(self.files.atoms[i])):
-                    duplicate = readwrite.check_duplicates(self.files.scat_lens, self.files.atoms[i][j].atom)
-                    if not duplicate:
-                        self.new_file = True
-                        real_scat_len = input('The following atom type has no scattering length given '
-                                              'in the lgt file {} \nPlease define a real scattering length for '
-                                              'this atom type: '.format(self.files.atoms[i][j].atom))
-                        imag_scat_len = input('\nPlease define a imaginary scattering length for '
-                                              'this atom type: '.format(self.files.atoms[i][j].atom))
-                        self.files.scat_lens.append(dataformat.ScatLens(self.files.atoms[i][j].atom, float(real_scat_len),
-                                                                  float(imag_scat_len)))
-            readwrite.print_update(100)
+            for atom in missing:
+                self.new_file = True
+                self._input_scat_len(atom)
+                prog.update()
+            prog.close()
         else:
             self.new_file = True
-            print('There was no lgt file defined, falass will help you define one and save it for future use.')
-            for i in range(0, len(self.files.atoms)):
-                for j in range(0, len(self.files.atoms[i])):
-                    duplicate = readwrite.check_duplicates(self.files.scat_lens, self.files.atoms[i][j].atom)
-                    if not duplicate:
-                        real_scat_len = input('The following atom type has no scattering length given '
-                                              'in the lgt file {} \nPlease define a real scattering length for '
-                                              'this atom type: '.format(self.files.atoms[i][j].atom))
-                        imag_scat_len = input('\nPlease define a imaginary scattering length for '
-                                              'this atom type: '.format(self.files.atoms[i][j].atom))
-                        self.files.scat_lens.append(dataformat.ScatLens(self.files.atoms[i][j].atom, float(real_scat_len),
-                                                                  float(imag_scat_len)))
+            progress.message('There was no lgt file defined, falass will help you define one and save it for future '
+                             'use.')
+            for atom in missing:
+                self._input_scat_len(atom)
             lgtfile_name = input("What should the lgt file be named? ")
             path, extension = os.path.splitext(lgtfile_name)
             if extension != '.lgt':
@@ -108,20 +102,35 @@ class Job():
             for i in range(0, len(self.files.scat_lens)):
                 lgtsf.write('{} {} {}\n'.format(self.files.scat_lens[i].atom, self.files.scat_lens[i].real * 1e5,
                                                 self.files.scat_lens[i].imag * 1e5))
-            print('A new lgtfile has been written with the name {}'.format(lgtfile_name))
+            progress.message('A new lgtfile has been written with the name {}'.format(lgtfile_name))
+
+    def _input_scat_len(self, atom):
+        real_scat_len = input('The following atom type has no scattering length given '
+                              'in the lgt file {} \nPlease define a real scattering length for '
+                              'this atom type: '.format(atom))
+        imag_scat_len = input('\nPlease define a imaginary scattering length for '
+                              'this atom type: '.format(atom))
+        self.files.scat_lens.append(dataformat.ScatLens(atom, float(real_scat_len), float(imag_scat_len)))
 
     def set_times(self, times=None):
         """Assign times to analyse.
 
-        The assignment of the simulation timesteps that should be analysed. if none are given all will be analysed.
+        The assignment of the simulation timesteps that should be analysed. If none are given the user is asked for
+        them, or if the job is not interactive all will be analysed.
 
         Parameters
         ----------
         times: array_like float
-            The timesteps that should be analysed, in the unit of time that present in the pdbfile.
+            The first timestep, last timestep and interval that should be analysed, in the unit of time that present
+            in the pdbfile. If the job is not interactive the first and last timesteps must be in the pdbfile and the
+            interval must be positive.
         """
         if times:
+            if not self.interactive:
+                check_times(self.files.times, times)
             self.times = np.arange(float(times[0]), float(times[1]) + float(times[2]), float(times[2]))
+        elif not self.interactive:
+            self.times = np.asarray(self.files.times)
         else:
             first_times = float(input(
                 "Please define the first timestep to be analysed, the first in the pdb file was {} ps: ".format(
@@ -144,6 +153,58 @@ class Job():
             self.times = np.arange(first_times, last_times + interval_times, interval_times)
 
 
+def coarse_to_fine(number):
+    """Coarse to fine frame order.
+
+    An order in which to analyse a number of frames such that any number of the first frames in the order are
+    spread over the whole trajectory. The first frame is followed by the frames at the largest power of two stride,
+    then those at half of that stride that have not been taken, and so on until every frame has been taken.
+
+    Parameters
+    ----------
+    number: int
+        The number of frames.
+
+    Returns
+    -------
+    array_like int
+        The index of each frame, in the order that they should be analysed.
+    """
+    indices = np.arange(number)
+    if number < 2:
+        return indices
+    # the largest power of two that divides each index, the first frame is taken first
+    level = (indices & -indices).astype(np.float64)
+    level[0] = np.inf
+    return indices[np.argsort(-level, kind='stable')]
+
+
+def check_times(array, times):
+    """Checks a time window.
+
+    Checks that the first and last timesteps of a time window are in an array of timesteps and that the interval is
+    positive.
+
+    Parameters
+    ----------
+    array: array-type float
+        The timesteps in the pdbfile.
+    times: array-type float
+        The first timestep, last timestep and interval.
+    """
+    if len(times) != 3:
+        raise ValueError("The times should be given as the first timestep, last timestep and interval, not "
+                         "{}.".format(times))
+    first, last, interval = [float(time) for time in times]
+    for time in (first, last):
+        if not check_array(array, time):
+            raise ValueError("The timestep {} was not found in the pdbfile, which runs from {} to {}.".format(
+                time, array[0], array[-1]))
+    if interval <= 0 or last < first:
+        raise ValueError("The time window from {} to {} with an interval of {} is not valid.".format(first, last,
+                                                                                                        interval))
+
+
 def check_array(array, check):
     """Checks if item is in array.
 
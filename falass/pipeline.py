@@ -0,0 +1,462 @@
+import hashlib
+import json
+import os
+import numpy as np
+from falass import adaptive, compare, dataformat, job, progress, readwrite, reflect, sld, stats
+
+try:
+    import tomllib
+except ImportError: #pragma: no cover
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+DEFAULTS = {
+    'files': {'pdbfile': None, 'trajfile': None, 'lgtfile': None, 'datfile': None, 'resolution': 5., 'ierror': 5.,
+              'flip': False, 'xray': False},
+    'read': {'lazy': False, 'native': True, 'index': False, 'cache': False},
+    'qs': {'start': 0.005, 'end': 0.5, 'number': 50},
+    'job': {'layer_thickness': None, 'cut_off_size': None, 'times': None},
+    'sld': {'processes': 1, 'store': True},
+    'adaptive': {'tolerance': 0., 'batch': 10, 'min_frames': 20},
+    'reflect': {'processes': 1, 'q_chunk': None, 'frame_chunk': None, 'store': True, 'pointwise': False,
+                'merge': None, 'method': 'frames'},
+    'compare': {'fit': True, 'scale': 1e-1, 'background': 1e-6, 'window': 0, 'step': 1},
+    'output': {'directory': '.', 'checkpoints': True},
+}
+
+STAGES = ('read', 'sld', 'reflect', 'compare')
+
+REQUIRED = [('files', 'pdbfile'), ('files', 'lgtfile'), ('job', 'layer_thickness'), ('job', 'cut_off_size')]
+
+PATHS = [('files', 'pdbfile'), ('files', 'trajfile'), ('files', 'lgtfile'), ('files', 'datfile'),
+         ('output', 'directory')]
+
+
+def load_config(filename, overrides=None):
+    """Read a job configuration.
+
+    Reads a falass job configuration from a .toml or .json file, the sections and keys of which are those of
+    DEFAULTS. Relative paths in the files and output sections are taken relative to the directory of the
+    configuration file.
+
+    Parameters
+    ----------
+    filename: str
+        Path and name of the configuration file.
+    overrides: dict, optional
+        Values that replace those in the file, as a dictionary of sections, see check_config().
+
+    Returns
+    -------
+    dict
+        The complete configuration.
+    """
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.json':
+        with open(filename, 'r') as f:
+            config = json.load(f)
+    elif extension == '.toml':
+        if tomllib is None: #pragma: no cover
+            raise ValueError("Reading a .toml configuration requires Python 3.11 or the tomli package.")
+        with open(filename, 'rb') as f:
+            config = tomllib.load(f)
+    else:
+        raise ValueError("The configuration file {} should be a .toml or .json file.".format(filename))
+    for section, values in (overrides or {}).items():
+        config.setdefault(section, {}).update(values)
+    config = check_config(config)
+    directory = os.path.dirname(os.path.abspath(filename))
+    for section, key in PATHS:
+        value = config[section][key]
+        if isinstance(value, str) and not os.path.isabs(value):
+            config[section][key] = os.path.normpath(os.path.join(directory, value))
+    return config
+
+
+def check_config(config):
+    """Check a job configuration.
+
+    Checks that a configuration only has the sections and keys of DEFAULTS, and has those that are required, and fills
+    in the default values of the others.
+
+    Parameters
+    ----------
+    config: dict
+        The configuration, as a dictionary of sections each of which is a dictionary of keys and values.
+
+    Returns
+    -------
+    dict
+        The complete configuration.
+    """
+    checked = {}
+    for section, values in config.items():
+        if section not in DEFAULTS:
+            raise ValueError("Unknown configuration section [{}], the sections are {}.".format(
+                section, ', '.join(DEFAULTS)))
+        if not isinstance(values, dict):
+            raise ValueError("The configuration section [{}] should be a table of keys and values.".format(section))
+        for key in values:
+            if key not in DEFAULTS[section]:
+                raise ValueError("Unknown configuration key {} in section [{}], the keys are {}.".format(
+                    key, section, ', '.join(DEFAULTS[section])))
+    for section, defaults in DEFAULTS.items():
+        checked[section] = dict(defaults)
+        checked[section].update(config.get(section, {}))
+    for section, key in REQUIRED:
+        if checked[section][key] is None:
+            raise ValueError("The configuration must give {} in section [{}].".format(key, section))
+    if checked['reflect']['method'] not in ('frames', 'profile'):
+        raise ValueError("The reflect method must be either 'frames' or 'profile'.")
+    if checked['reflect']['method'] == 'frames' and not checked['sld']['store']:
+        raise ValueError("The 'frames' reflect method needs the SLD profile of each timestep, so the sld store "
+                         "option must be true.")
+    if checked['compare']['window'] > 0 and (checked['reflect']['method'] != 'frames' or
+                                             not checked['reflect']['store']):
+        raise ValueError("The compare window needs the reflectometry of each timestep, so the reflect method must be "
+                         "'frames' and the reflect store option must be true.")
+    if checked['adaptive']['tolerance'] > 0 and (checked['reflect']['method'] != 'frames' or
+                                                 not checked['reflect']['store']):
+        raise ValueError("The adaptive averaging calculates the reflectometry of each timestep, so the reflect method "
+                         "must be 'frames' and the reflect store option must be true.")
+    return checked
+
+
+def run(config, resume=True):
+    """Run a falass job.
+
+    Runs the full falass analysis without any user input, as the named stages of STAGES; 'read' reads the files and
+    sets up the job, 'sld' calculates the SLD profiles, 'reflect' calculates the reflectometry and 'compare' fits the
+    scale and background (if the datfile has intensities). The average SLD profile, average reflectometry and fitted
+    reflectometry are written as text files to the output directory. Missing scattering lengths or invalid timesteps
+    raise a ValueError. If the adaptive tolerance is positive, the 'sld' stage also calculates the reflectometry, and
+    stops once the average has converged (see falass.adaptive.adaptive_average()).
+
+    If the checkpoints output option is true, the array output of each stage is saved in the checkpoints directory
+    of the output directory as it finishes, with a manifest of the configuration and input files each stage used (see
+    stage_keys()). A later run resumes after the last stage that finished with the same configuration, so a crash
+    or a change to only the fit does not mean that the SLD profiles must be calculated again. As the SLD stage needs
+    the trajectory, the read stage is run again whenever the SLD stage is.
+
+    Parameters
+    ----------
+    config: dict
+        The configuration, see load_config() and check_config().
+    resume: bool, optional
+        Should finished stages be loaded from the checkpoints, if false every stage is run.
+
+    Returns
+    -------
+    dict
+        The falass.readwrite.Files, falass.job.Job, falass.sld.SLD, falass.reflect.Reflect and falass.compare.Compare
+        (None if there was no comparison) objects, with the keys 'files', 'job', 'sld', 'reflect' and 'compare'.
+    """
+    config = check_config(config)
+    checkpoints = None
+    if config['output']['checkpoints']:
+        checkpoints = os.path.join(config['output']['directory'], 'checkpoints')
+    keys = stage_keys(config)
+    manifest = read_manifest(checkpoints) if checkpoints and resume else {}
+
+    start = 0
+    while (start < len(STAGES) and manifest.get(STAGES[start]) == keys[STAGES[start]] and
+           os.path.isfile(_checkpoint_file(checkpoints, STAGES[start]))):
+        start += 1
+    if start == 1:
+        start = 0
+
+    state = {}
+    for i, stage in enumerate(STAGES):
+        if i < start:
+            progress.message("Loading the {} stage from the checkpoint".format(stage))
+            with np.load(_checkpoint_file(checkpoints, stage)) as checkpoint:
+                _LOAD[stage](config, state, checkpoint)
+            continue
+        with progress.progress('pipeline.{}'.format(stage)):
+            _RUN[stage](config, state)
+        if checkpoints:
+            os.makedirs(checkpoints, exist_ok=True)
+            with open(_checkpoint_file(checkpoints, stage) + '.tmp', 'wb') as f:
+                np.savez(f, **_SAVE[stage](state))
+            os.replace(_checkpoint_file(checkpoints, stage) + '.tmp', _checkpoint_file(checkpoints, stage))
+            manifest = {name: manifest[name] for name in STAGES[:i] if name in manifest}
+            manifest[stage] = keys[stage]
+            write_manifest(checkpoints, manifest)
+
+    write_results(config['output']['directory'], state['sld'], state['reflect'], state['compare'])
+    return state
+
+
+def stage_keys(config):
+    """Checkpoint keys.
+
+    A hash for each stage of the configuration options that change its output, and of the key of the stage before,
+    such that a change invalidates that stage and all those after it. The key of the read stage also includes the
+    path, size and modification time of each of the input files. Options that only change how the work is done (such
+    as the number of processes) are not included.
+
+    Parameters
+    ----------
+    config: dict
+        The complete configuration.
+
+    Returns
+    -------
+    dict
+        The hexadecimal key of each stage.
+    """
+    inputs = []
+    for key in ('pdbfile', 'trajfile', 'lgtfile', 'datfile'):
+        filename = config['files'][key]
+        if filename is not None:
+            stat = os.stat(filename)
+            inputs.append([os.path.abspath(filename), stat.st_size, stat.st_mtime_ns])
+    parts = {'read': [config['files'], config['qs'], config['job']['times'], inputs],
+             'sld': [config['job']['layer_thickness'], config['job']['cut_off_size'], config['sld']['store'],
+                     config['adaptive'] if config['adaptive']['tolerance'] > 0 else None,
+                     [config['reflect']['pointwise'], config['reflect']['merge'], config['compare']['fit']]
+                     if config['adaptive']['tolerance'] > 0 else None],
+             'reflect': [{key: value for key, value in config['reflect'].items()
+                          if key not in ('processes', 'q_chunk', 'frame_chunk')}],
+             'compare': [config['compare']]}
+    keys = {}
+    previous = ''
+    for stage in STAGES:
+        previous = hashlib.sha256(json.dumps([previous, parts[stage]], sort_keys=True).encode()).hexdigest()
+        keys[stage] = previous
+    return keys
+
+
+def read_manifest(directory):
+    """Read the checkpoint manifest.
+
+    Parameters
+    ----------
+    directory: str
+        The checkpoints directory.
+
+    Returns
+    -------
+    dict
+        The key of each stage that has finished, empty if there is no manifest.
+    """
+    try:
+        with open(os.path.join(directory, 'manifest.json'), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_manifest(directory, manifest):
+    """Write the checkpoint manifest.
+
+    Parameters
+    ----------
+    directory: str
+        The checkpoints directory.
+    manifest: dict
+        The key of each stage that has finished.
+    """
+    with open(os.path.join(directory, 'manifest.json.tmp'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(os.path.join(directory, 'manifest.json.tmp'), os.path.join(directory, 'manifest.json'))
+
+
+def _checkpoint_file(directory, stage):
+    return os.path.join(directory or '', stage + '.npz')
+
+
+def _run_read(config, state):
+    files = readwrite.Files(**config['files'])
+    files.read_pdb(**config['read'])
+    files.read_lgt()
+    if files.datfile:
+        files.read_dat()
+    else:
+        files.get_qs(**config['qs'])
+    assigned_job = job.Job(files, config['job']['layer_thickness'], config['job']['cut_off_size'], interactive=False)
+    assigned_job.set_lgts()
+    assigned_job.set_times(config['job']['times'])
+    state['files'] = files
+    state['job'] = assigned_job
+
+
+def _save_read(state):
+    expdata = state['files'].expdata
+    return {'q': expdata.q, 'i': np.array([]) if expdata.i is None else expdata.i,
+            'di': np.array([]) if expdata.di is None else expdata.di, 'dq': expdata.dq,
+            'file_times': np.asarray(state['files'].times), 'times': state['job'].times}
+
+
+def _load_read(config, state, checkpoint):
+    files = readwrite.Files(**config['files'])
+    files.times = checkpoint['file_times'].tolist()
+    files.number_of_timesteps = len(files.times)
+    files.expdata = dataformat.QDataTable(checkpoint['q'], checkpoint['i'] if checkpoint['i'].size else None,
+                                          checkpoint['di'] if checkpoint['di'].size else None, checkpoint['dq'])
+    assigned_job = job.Job(files, config['job']['layer_thickness'], config['job']['cut_off_size'], interactive=False)
+    assigned_job.times = checkpoint['times']
+    state['files'] = files
+    state['job'] = assigned_job
+
+
+def _run_sld(config, state):
+    options = config['adaptive']
+    if options['tolerance'] > 0:
+        profiles, state['adaptive'] = adaptive.adaptive_average(
+            state['job'], state['files'].expdata, options['tolerance'], options['batch'], options['min_frames'],
+            config['compare']['fit'], config['reflect']['pointwise'], config['reflect']['merge'])[:2]
+    else:
+        profiles = sld.SLD(state['job'])
+        profiles.get_sld_profile(**config['sld'])
+    profiles.average_sld_profile()
+    state['sld'] = profiles
+
+
+def _save_sld(state):
+    profiles = state['sld']
+    checkpoint = _save_average(profiles.running_average)
+    checkpoint.update(times=np.asarray(profiles.assigned_job.times, dtype=np.float64))
+    if len(profiles.sld_profile) > 0:
+        checkpoint.update(thick=profiles.sld_profile.thick, real=profiles.sld_profile.real,
+                          imag=profiles.sld_profile.imag)
+    return checkpoint
+
+
+def _load_sld(config, state, checkpoint):
+    state['job'].times = checkpoint['times']
+    profiles = sld.SLD(state['job'])
+    profiles.running_average = _load_average(checkpoint)
+    if 'thick' in checkpoint:
+        profiles.set_sld_profile(dataformat.SLDProfileStack(checkpoint['thick'], checkpoint['real'],
+                                                            checkpoint['imag']))
+    profiles.set_av_sld_profile(*profiles.running_average_sld_profile())
+    state['sld'] = profiles
+
+
+def _run_reflect(config, state):
+    options = dict(config['reflect'])
+    method = options.pop('method')
+    reflectometry = state.pop('adaptive', None)
+    if reflectometry is None:
+        reflectometry = reflect.Reflect(state['sld'].sld_profile, state['files'].expdata)
+        if method == 'frames':
+            reflectometry.calc_ref(**options)
+    reflectometry.average_ref(method, av_sld_profile=state['sld'].av_sld_profile, pointwise=options['pointwise'])
+    state['reflect'] = reflectometry
+
+
+def _save_reflect(state):
+    reflectometry = state['reflect']
+    average = reflectometry.averagereflect
+    checkpoint = {'average_q': average.q, 'average_i': average.i, 'average_di': average.di, 'average_dq': average.dq,
+                  'average_deviation': np.nan if reflectometry.average_deviation is None else
+                  reflectometry.average_deviation}
+    if reflectometry.running_average.count > 0:
+        checkpoint.update(_save_average(reflectometry.running_average))
+    if len(reflectometry.reflect) > 0:
+        checkpoint.update(reflect=reflectometry.reflect.i)
+    return checkpoint
+
+
+def _load_reflect(config, state, checkpoint):
+    reflectometry = reflect.Reflect(state['sld'].sld_profile, state['files'].expdata)
+    if 'count' in checkpoint:
+        reflectometry.running_average = _load_average(checkpoint)
+    if 'reflect' in checkpoint:
+        expdata = state['files'].expdata
+        reflectometry.reflect = dataformat.QDataStack(expdata.q, checkpoint['reflect'], dq=expdata.dq)
+    reflectometry.averagereflect = dataformat.QDataTable(checkpoint['average_q'], checkpoint['average_i'],
+                                                         checkpoint['average_di'], checkpoint['average_dq'])
+    if not np.isnan(checkpoint['average_deviation']):
+        reflectometry.average_deviation = float(checkpoint['average_deviation'])
+    state['reflect'] = reflectometry
+
+
+def _run_compare(config, state):
+    files = state['files']
+    comparison = None
+    if config['compare']['fit'] and files.datfile and files.expdata.i is not None:
+        comparison = compare.Compare(files.expdata, state['reflect'].averagereflect, config['compare']['scale'],
+                                     config['compare']['background'])
+        comparison.fit()
+        comparison.return_fitted()
+        if config['compare']['window'] > 0:
+            times = np.asarray(files.times, dtype=np.float64)[files.frame_mask(state['job'].times)]
+            comparison.fit_series(state['reflect'].reflect, config['compare']['window'], config['compare']['step'],
+                                  times)
+    state['compare'] = comparison
+
+
+def _save_compare(state):
+    comparison = state['compare']
+    if comparison is None:
+        return {}
+    checkpoint = {'scale': comparison.scale, 'background': comparison.background}
+    if comparison.series is not None:
+        checkpoint.update(series=np.array(comparison.series))
+    return checkpoint
+
+
+def _load_compare(config, state, checkpoint):
+    state['compare'] = None
+    if 'scale' in checkpoint:
+        comparison = compare.Compare(state['files'].expdata, state['reflect'].averagereflect,
+                                     float(checkpoint['scale']), float(checkpoint['background']))
+        comparison.return_fitted()
+        if 'series' in checkpoint:
+            comparison.series = tuple(checkpoint['series'])
+        state['compare'] = comparison
+
+
+def _save_average(running_average):
+    return {'count': running_average.count, 'mean': running_average.mean, 'm2': running_average.m2}
+
+
+def _load_average(checkpoint):
+    running_average = stats.RunningAverage()
+    running_average.count = int(checkpoint['count'])
+    running_average.mean = checkpoint['mean']
+    running_average.m2 = checkpoint['m2']
+    return running_average
+
+
+_RUN = {'read': _run_read, 'sld': _run_sld, 'reflect': _run_reflect, 'compare': _run_compare}
+_SAVE = {'read': _save_read, 'sld': _save_sld, 'reflect': _save_reflect, 'compare': _save_compare}
+_LOAD = {'read': _load_read, 'sld': _load_sld, 'reflect': _load_reflect, 'compare': _load_compare}
+
+
+def write_results(directory, profiles, reflectometry, comparison=None):
+    """Write the results.
+
+    Writes the average SLD profile (sld.txt), the average reflectometry (reflect.txt) and, if there was a comparison,
+    the fitted reflectometry (fitted.txt) as space separated text files. If the goodness of fit was found through
+    the trajectory (see falass.compare.Compare.fit_series()) this is written to series.txt.
+
+    Parameters
+    ----------
+    directory: str
+        The directory the files are written to, this is created if it does not exist.
+    profiles: falass.sld.SLD
+        The SLD profiles, after average_sld_profile().
+    reflectometry: falass.reflect.Reflect
+        The reflectometry, after average_ref().
+    comparison: falass.compare.Compare, optional
+        The comparison, after return_fitted().
+    """
+    os.makedirs(directory, exist_ok=True)
+    av, err = profiles.av_sld_profile, profiles.av_sld_profile_err
+    np.savetxt(os.path.join(directory, 'sld.txt'), np.column_stack([av.thick, av.real, av.imag, err.real, err.imag]),
+               header='thick real imag real_err imag_err')
+    data = reflectometry.averagereflect
+    np.savetxt(os.path.join(directory, 'reflect.txt'), np.column_stack([data.q, data.i, data.di, data.dq]),
+               header='q i di dq')
+    if comparison is not None:
+        data = comparison.sim_data_fitted
+        np.savetxt(os.path.join(directory, 'fitted.txt'), np.column_stack([data.q, data.i, data.di, data.dq]),
+                   header='q i di dq scale={} background={}'.format(comparison.scale, comparison.background))
+        if comparison.series is not None:
+            np.savetxt(os.path.join(directory, 'series.txt'), np.column_stack(comparison.series),
+                       header='time scale background chi2')
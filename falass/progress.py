@@ -0,0 +1,264 @@
+import logging
+import time
+from collections import namedtuple
+
+Event = namedtuple('Event', ['stage', 'done', 'total', 'elapsed', 'rate', 'finished'])
+Event.__doc__ = """Progress of a stage.
+
+Parameters
+----------
+stage: str
+    The name of the stage, such as 'sld' or 'reflect'.
+done: int
+    The number of items (frames, lines or atom types) done so far.
+total: int or None
+    The total number of items, None for a stage that is only timed.
+elapsed: float
+    The time since the start of the stage in seconds.
+rate: float
+    The number of items done per second.
+finished: bool
+    Is this the last event of the stage.
+"""
+
+
+class PrintReporter:
+    """Progress bar.
+
+    Prints the progress of a stage as a bar of the form '[## 20 % ]' at the start, each time another step is done and
+    at the end, this is the default reporter. Stages without a total are not printed. Messages (see message()) are
+    printed as they are.
+    """
+    def message(self, text):
+        print(text)
+
+    def __call__(self, event):
+        if event.total is None:
+            return
+        if event.total > 0:
+            percentage = int(event.done * 100 // event.total)
+        else:
+            percentage = 100 if event.finished else 0
+        print("[{} {} % ]".format('#' * int(percentage / 10), int(percentage / 10) * 10))
+
+
+class LoggingReporter:
+    """Progress to a logger.
+
+    Logs the time taken and the throughput at the end of each stage, and the progress at each step at the DEBUG
+    level, such that the per-stage timings can be kept in a log file without any output to stdout. Messages (see
+    message()) are logged at the given level.
+
+    Parameters
+    ----------
+    logger: logging.Logger, optional
+        The logger to write to, the 'falass' logger if not given.
+    level: int, optional
+        The level the end of each stage is logged at.
+    """
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logging.getLogger('falass') if logger is None else logger
+        self.level = level
+
+    def message(self, text):
+        self.logger.log(self.level, '%s', text)
+
+    def __call__(self, event):
+        if event.finished:
+            if event.total is None:
+                self.logger.log(self.level, '%s: finished in %.3f s', event.stage, event.elapsed)
+            else:
+                self.logger.log(self.level, '%s: %d/%d in %.3f s (%.1f per s)', event.stage, event.done, event.total,
+                                event.elapsed, event.rate)
+        elif event.total is not None and self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug('%s: %d/%d after %.3f s (%.1f per s)', event.stage, event.done, event.total,
+                              event.elapsed, event.rate)
+
+
+class Recorder:
+    """Keep the progress events.
+
+    Stores every event, and every message in messages, such that the timings of the stages may be read after a
+    calculation.
+    """
+    def __init__(self):
+        self.events = []
+        self.messages = []
+
+    def message(self, text):
+        self.messages.append(text)
+
+    def __call__(self, event):
+        self.events.append(event)
+
+    def timings(self):
+        """Time taken by each stage.
+
+        Returns
+        -------
+        dict
+            The elapsed time in seconds of each stage that has finished, by stage name. If a stage was run more than
+            once the times are summed.
+        """
+        timings = {}
+        for event in self.events:
+            if event.finished:
+                timings[event.stage] = timings.get(event.stage, 0.) + event.elapsed
+        return timings
+
+
+class Progress:
+    """Progress of a stage.
+
+    Counts the items done in a stage and passes an Event to the reporter at the start, each time another step (a
+    percentage of the total) is done, and once when the stage is closed. Between steps update() only adds to a count
+    and compares it to the next threshold, so it may be called from inside a loop over frames. When used as a context
+    manager, a stage that raises an exception is not closed, so no finished event is reported for it.
+
+    Parameters
+    ----------
+    stage: str
+        The name of the stage.
+    total: int, optional
+        The total number of items, if not given the stage is only timed.
+    reporter: callable
+        A function that takes an Event.
+    step: int, optional
+        The percentage of the total between reports.
+    """
+    def __init__(self, stage, total, reporter, step=10):
+        self.stage = stage
+        self.total = total
+        self.reporter = reporter
+        self.step = step
+        self.done = 0
+        self.closed = False
+        self.start = time.perf_counter()
+        self._next = self._threshold(0)
+        self.reporter(self._event(False))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.closed = True
+
+    def update(self, number=1):
+        """Add to the number of items done.
+
+        Parameters
+        ----------
+        number: int, optional
+            The number of items that have been done since the last update.
+        """
+        self.done += number
+        if self.done >= self._next:
+            self._next = self._threshold(self.done * 100 // self.total)
+            if self.done < self.total:
+                self.reporter(self._event(False))
+
+    def close(self):
+        """End the stage, the last event is only passed to the reporter once."""
+        if not self.closed:
+            self.closed = True
+            self.reporter(self._event(True))
+
+    def _threshold(self, percentage):
+        if not self.total:
+            return float('inf')
+        bucket = percentage // self.step + 1
+        threshold = -(-bucket * self.step * self.total // 100)
+        return threshold if threshold < self.total else float('inf')
+
+    def _event(self, finished):
+        elapsed = time.perf_counter() - self.start
+        rate = self.done / elapsed if elapsed > 0 else 0.
+        return Event(self.stage, self.done, self.total, elapsed, rate, finished)
+
+
+class NullProgress:
+    """Progress that is not reported, used when there is no reporter."""
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def update(self, number=1):
+        pass
+
+    def close(self):
+        pass
+
+
+_null = NullProgress()
+_reporter = PrintReporter()
+
+
+def progress(stage, total=None, step=10):
+    """Start a stage.
+
+    Parameters
+    ----------
+    stage: str
+        The name of the stage.
+    total: int, optional
+        The total number of items, if not given the stage is only timed.
+    step: int, optional
+        The percentage of the total between reports.
+
+    Returns
+    -------
+    falass.progress.Progress or falass.progress.NullProgress
+        The progress of the stage, to be updated as each item is done and closed at the end (or used as a context
+        manager). If reporting has been disabled with set_reporter(None) this does nothing.
+    """
+    if _reporter is None:
+        return _null
+    return Progress(stage, total, _reporter, step)
+
+
+def message(text):
+    """Report a message.
+
+    Passes a message, such as the name of a stage that is starting or a result, to the message() method of the
+    reporter. The message is dropped if reporting has been disabled with set_reporter(None), or if the reporter is a
+    function without a message() method.
+
+    Parameters
+    ----------
+    text: str
+        The message.
+    """
+    report = getattr(_reporter, 'message', None)
+    if report is not None:
+        report(text)
+
+
+def get_reporter():
+    """The current reporter, None if reporting is disabled."""
+    return _reporter
+
+
+def set_reporter(reporter):
+    """Set the reporter.
+
+    Parameters
+    ----------
+    reporter: callable or None
+        A function that takes an Event, such as a PrintReporter (the default), a LoggingReporter or a Recorder, and
+        that may have a message() method that takes the text of a message (see message()). If None neither the
+        progress nor the messages are reported.
+
+    Returns
+    -------
+    callable or None
+        The previous reporter.
+    """
+    global _reporter
+    previous = _reporter
+    _reporter = reporter
+    return previous
@@ -1,5 +1,6 @@
+import warnings
 import numpy as np
-from falass import dataformat
+from falass import dataformat, progress, trajectory
 import matplotlib.pyplot as plt
 import MDAnalysis as mda
 
@@ -37,15 +38,25 @@ class Files:
         xy-plane -- note that falass treats the first side that the neutron or X-ray interacts with as that at z=0.
     xray: bool, optional
         True if the scattering length of the particles should be scaled by the classical radius of an electron.
+    trajfile: str, optional
+        Path and name of a binary trajectory file (such as .xtc, .dcd or .trr) to be read with MDAnalysis, in which
+        case the pdbfile is used only as the topology and the timestep times are taken from the trajectory.
     """
-    def __init__(self, pdbfile=None, lgtfile=None, datfile=None, resolution=5., ierror=5., flip=False, xray=False):
+    def __init__(self, pdbfile=None, lgtfile=None, datfile=None, resolution=5., ierror=5., flip=False, xray=False,
+                 trajfile=None):
         self.pdbfile = pdbfile
+        self.trajfile = trajfile
         self.cell = []
         self.atoms = []
+        self.atom_names = []
+        self.trajectory = None
+        self.u = None
+        self._flipped = False
         self.number_of_timesteps = 0
         self.times = []
         self.lgtfile = lgtfile
         self.scat_lens = []
+        self._scat_len_table = None
         self.datfile = datfile
         self.expdata = []
         self.ierror = ierror
@@ -54,7 +65,7 @@ class Files:
         self.xray = xray
         return
 
-    def set_file(self, pdbfile=None, lgtfile=None, datfile=None):
+    def set_file(self, pdbfile=None, lgtfile=None, datfile=None, trajfile=None):
         """Edits files.
 
         Let the subsequent definition, or redefinition of the pdbfile, lgtfile or datfile.
@@ -74,113 +85,259 @@ class Files:
             define a range of q vectors to calculate the reflectometry over.
             Currently the .dat file style that is supported is a 2, 3, and 4 column space separated txt files where the
             columns are q, i, di, and dq respectively.
+        trajfile: str, optional
+            Path and name of a binary trajectory file, for which the pdbfile is the topology.
         """
         if pdbfile:
             self.pdbfile = pdbfile
+        if trajfile:
+            self.trajfile = trajfile
         if lgtfile:
             self.lgtfile = lgtfile
         if datfile:
             self.datfile = datfile
         return
 
-    def read_pdb(self):
+    def read_pdb(self, lazy=False, native=True, index=False, cache=False):
         """Parse .pdb.
 
         Reads the .pdb file into memory. Currently the atoms must have the title 'ATOM', the timestep time needs to
         be the last text in the 'TITLE' line, and the cell dimensions are taken from the 'CRYST1' line, and assumed to
         be orthorhomic. Non-orthorhomic cells are not necessarily supported.
-        """
-        print("Reading PDB file")
-        self.u = u = mda.Universe(self.pdbfile)
 
+        Parameters
+        ----------
+        lazy: bool, optional
+            If true, only the atom names, cell dimensions and timestep times are read and the atom positions are not
+            held in memory, instead they are read one frame at a time by the frames() function as they are needed.
+        native: bool, optional
+            If true, the file is read in a single pass by the fixed-column reader in falass.trajectory, and the atom
+            positions are held as a single array (atoms is then a falass.dataformat.AtomPositionsStack). If false the
+            file is read with MDAnalysis, which is more forgiving of non-standard .pdb files.
+        index: bool, optional
+            If true, with the native reader the byte offset of each frame is kept in a sidecar index, which is written
+            as a <pdbfile>.index.npz file next to the pdbfile (see falass.trajectory.read_index()). A later lazy read
+            with index true then loads the index rather than scanning the file. The index is also written when the
+            trajectory is loaded from the cache. Nothing is written if this is false.
+            A lazy read always only reads the bytes of the frames that are asked for in the frames() function.
+        cache: bool, optional
+            If true, with the native reader the parsed trajectory is kept in a binary cache next to the pdbfile (see
+            falass.trajectory.read_cached()), such that later sessions load the cache rather than parsing the file.
+            The cache is rebuilt if the pdbfile changes. Like the index, this writes a file next to the pdbfile.
+
+        If a trajfile has been given, the pdbfile is read by MDAnalysis as the topology and the frames are read from
+        the trajfile, the timestep times and cell dimensions are taken from the trajectory and only the z-positions
+        are kept (as a falass.dataformat.AtomPositionsStack). The native, index and cache options are then ignored.
+        """
+        progress.message("Reading PDB file")
         self.cell = []
         self.atoms = []
+        self.number_of_timesteps = 0
+        self.times = []
+        self.trajectory = None
+        self.u = None
+        self._flipped = False
+
+        if self.trajfile:
+            self._read_trajectory(lazy)
+            return
+
+        if native:
+            if cache:
+                self.trajectory = trajectory.read_cached(self.pdbfile)
+                if index and trajectory.load_index(self.pdbfile) is None:
+                    trajectory.save_index(self.trajectory)
+            elif lazy and index:
+                self.trajectory = trajectory.read_index(self.pdbfile)
+            else:
+                self.trajectory = trajectory.read_pdb(self.pdbfile, positions=not lazy)
+                if index:
+                    trajectory.save_index(self.trajectory)
+            self.atom_names = self.trajectory.names
+            self.cell = self.trajectory.cell
+            self.times = self.trajectory.times.tolist()
+            self.number_of_timesteps = len(self.times)
+            if not lazy:
+                if self.flip:
+                    self.trajectory.zpos = flip_zpos(self.trajectory.cell[:, 2:3], self.trajectory.zpos)
+                    self._flipped = True
+                self.atoms = dataformat.AtomPositionsStack(self.atom_names, self.trajectory.zpos)
+            return
 
-        for ts in u.trajectory:
-            self.cell.append(u.dimensions[:3].copy())
-            # grab z positions
-            pos = u.atoms.positions[:, 2]
-            # flip?
-            if self.flip:
-                pos = flip_zpos(u.dimensions[2], pos)
-            self.atoms.append(
-                [dataformat.AtomPositions(at.name, p) for at, p in zip(u.atoms, pos)]
-            )
+        self.u = u = mda.Universe(self.pdbfile)
+        self.atom_names = u.atoms.names.copy()
+
+        if not lazy:
+            for ts in u.trajectory:
+                self.cell.append(u.dimensions[:3].copy())
+                # grab z positions
+                pos = u.atoms.positions[:, 2]
+                # flip?
+                if self.flip:
+                    pos = flip_zpos(u.dimensions[2], pos)
+                self.atoms.append(
+                    [dataformat.AtomPositions(at.name, p) for at, p in zip(u.atoms, pos)]
+                )
 
-        lines = line_count(self.pdbfile)
         with open(self.pdbfile, 'r') as f:
             for i, line in enumerate(f):
                 if "TITLE  " in line:
                     self.number_of_timesteps, new_time = iterate_time(self.number_of_timesteps, line)
                     self.times.append(new_time)
+                if lazy and line.startswith("CRYST1"):
+                    self.cell.append(np.array([line[6:15], line[15:24], line[24:33]], dtype=np.float32))
 
         return
 
+    def _read_trajectory(self, lazy):
+        self.u = u = mda.Universe(self.pdbfile, self.trajfile)
+        self.atom_names = u.atoms.names.copy()
+        cell = np.zeros((u.trajectory.n_frames, 3), dtype=np.float32)
+        zpos = None if lazy else np.zeros((u.trajectory.n_frames, u.atoms.n_atoms), dtype=np.float32)
+        for i, ts in enumerate(u.trajectory):
+            self.times.append(float(ts.time))
+            cell[i] = ts.dimensions[:3]
+            if not lazy:
+                zpos[i] = ts.positions[:, 2]
+        self.cell = cell
+        self.number_of_timesteps = len(self.times)
+        if not lazy:
+            if self.flip:
+                zpos = flip_zpos(cell[:, 2:3], zpos)
+            self.atoms = dataformat.AtomPositionsStack(self.atom_names, zpos)
+
+    def frames(self, times=None, indices=None):
+        """Iterate over frames.
+
+        Reads the atom positions of the trajectory one frame at a time, such that only a single frame is held in
+        memory. This requires that the read_pdb() function has been run. If the positions were read into memory as
+        a falass.dataformat.AtomPositionsStack, the frames are taken from there rather than the file.
+
+        Parameters
+        ----------
+        times: array_like float, optional
+            The timesteps that should be read, if none are given all will be read.
+        indices: array_like int, optional
+            The indices of the frames that should be read, in the order they should be read, used in place of times.
+
+        Yields
+        ------
+        falass.dataformat.Frame
+            The time, cell dimensions and atom z-positions for each of the frames.
+        """
+        if indices is None:
+            indices = np.flatnonzero(self.frame_mask(times))
+        indices = np.asarray(indices, dtype=int)
+        frame_times = np.asarray(self.times)[indices]
+        if self.trajectory is not None:
+            return trajectory.iterate_frames(self.trajectory, indices, self.flip and not self._flipped, frame_times)
+        if isinstance(self.atoms, dataformat.AtomPositionsStack):
+            return stored_frames(self.atoms, self.cell, indices, frame_times)
+        return iterate_frames(self.u, indices, self.flip, frame_times)
+
+    def frame_source(self):
+        """Trajectory for other processes.
+
+        The description of the trajectory that is passed to the open_source() function, such that frames can be read
+        by other processes with frames_from_source(). For the native reader this is the parsed trajectory without the
+        atom positions, so each process only reads the bytes of its own frames.
+
+        Returns
+        -------
+        str, tuple or falass.trajectory.PDBTrajectory
+            The pdbfile, the pdbfile and trajfile, or the parsed trajectory without positions.
+        """
+        if self.trajfile:
+            return self.pdbfile, self.trajfile
+        if self.trajectory is None:
+            return self.pdbfile
+        traj = self.trajectory
+        return trajectory.PDBTrajectory(traj.pdbfile, traj.names, traj.times, traj.cell, None, traj.offsets)
+
+    def frame_mask(self, times=None):
+        """Select frames.
+
+        Finds which of the frames in the trajectory have one of the given timesteps.
+
+        Parameters
+        ----------
+        times: array_like float, optional
+            The timesteps that should be selected, if none are given all will be selected.
+
+        Returns
+        -------
+        array_like bool
+            True for each frame that is selected.
+        """
+        if times is None:
+            return np.ones(len(self.times), dtype=bool)
+        return np.isin(self.times, times)
+
     def read_lgt(self):
         """Parses .lgt.
 
         Parses the lgtfile. If no lgtfile is defined falass will help the user to build one by working through the
         atom types in the pdb file and requesting input of the real and imaginary scattering lengths. This will also
         occur if a atom type if found in the pdbfile but not in the given lgts file. falass will write the lgtfile 
-        to disk if atom types do not feature in the given lgtfile or one is written from scratch. 
+        to disk if atom types do not feature in the given lgtfile or one is written from scratch. The file is read in
+        a single pass (see load_columns()), and only the first occurrence of each atom type is kept.
         """
         if self.lgtfile:
-            lines = line_count(self.lgtfile)
-            print("Reading LGT file")
-            percentage = 0
-            print_update(percentage)
-            file = open(self.lgtfile, 'r')
-            for i, line in enumerate(file):
-                percentage_new = np.floor(i / lines * 100)
-                percentage = check_update(percentage, percentage_new)
-                line_list = line.split()
-                duplicate = check_duplicates(self.scat_lens, line_list[0])
-                if not duplicate:
-                    i = 1
-                    if self.xray:
-                        i *= 2.817940
-                    self.scat_lens.append(dataformat.ScatLens(line_list[0], float(line_list[1])*i, float(line_list[2])*i))
-            print_update(100)
-            file.close()
+            progress.message("Reading LGT file")
+            with progress.progress('read_lgt'):
+                columns = load_columns(self.lgtfile, dtype=str)
+                if columns.shape[0] > 0 and columns.shape[1] < 3:
+                    raise ValueError("The lgtfile {} should have 3 columns, the atom type and the real and imaginary "
+                                     "scattering lengths.".format(self.lgtfile))
+                scale = 2.817940 if self.xray else 1
+                first = np.sort(np.unique(columns[:, 0], return_index=True)[1])
+                lengths = columns[first, 1:3].astype(np.float64) * scale
+                table = self.scat_len_table()
+                for name, (real, imag) in zip(columns[first, 0], lengths):
+                    scat_len = dataformat.ScatLens(str(name), float(real), float(imag))
+                    if table.add(scat_len):
+                        self.scat_lens.append(scat_len)
         else:
             raise ValueError("No lgtfile has been defined.")
         return
 
+    def scat_len_table(self):
+        """Scattering length table.
+
+        The scattering lengths as a falass.dataformat.ScatLenTable. The table is kept between calls, and only the
+        atom types appended to scat_lens since the last call are added to it, so callers may look up the scattering
+        lengths repeatedly without building a new table. If scat_lens is replaced the table is built again.
+
+        Returns
+        -------
+        falass.dataformat.ScatLenTable
+            The scattering lengths of the atom types.
+        """
+        if (self._scat_len_table is None or self._scat_len_table[0] is not self.scat_lens or
+                self._scat_len_table[1] > len(self.scat_lens)):
+            self._scat_len_table = (self.scat_lens, 0, dataformat.ScatLenTable())
+        source, count, table = self._scat_len_table
+        for scat_len in self.scat_lens[count:]:
+            table.add(scat_len)
+        self._scat_len_table = (source, len(self.scat_lens), table)
+        return table
+
     def read_dat(self):
         """Parses .dat.
 
-        Parses the .dat file, supporting 2, 3, and 4 column files consisting of q, i, di, and dq with comments in lines
-        where the first character is a '#'. If there is no .dat file the get_qs() function should be used to generate
+        Parses the .dat file, supporting 2, 3, and 4 column files consisting of q, i, di, and dq with comments
+        following a '#'. The file is read in a single pass into columns (see load_columns() and dat_columns()), so
+        every line must have the same number of columns. If there is no .dat file the get_qs() function should be used to generate
         q vectors to allow for the calculation of the reflectometry profile.
         """
         self.expdata=[]
         if self.datfile:
-            lines = line_count(self.datfile)
-            print("Reading DAT file")
-            percentage = 0
-            print_update(percentage)
-            file = open(self.datfile, 'r')
-            for i, line in enumerate(file):
-                percentage_new = np.floor(i / lines * 100)
-                percentage = check_update(percentage, percentage_new)
-                if line[0] != '#':
-                    line_list = line.split()
-                    if len(line_list) == 2:
-                        self.expdata.append(dataformat.QData(float(line_list[0]), float(line_list[1]),
-                                                             float(line_list[1]) * (self.ierror / 100),
-                                                             float(line_list[0]) * (self.resolution / 100)))
-                    if len(line_list) == 3:
-                        self.expdata.append(dataformat.QData(float(line_list[0]), float(line_list[1]),
-                                                             float(line_list[2]),
-                                                             float(line_list[0]) * (self.resolution / 100)))
-                    if len(line_list) == 4:
-                        self.expdata.append(dataformat.QData(float(line_list[0]), float(line_list[1]),
-                                                             float(line_list[2]), float(line_list[3])))
-            print_update(100)
-            file.close()
+            progress.message("Reading DAT file")
+            with progress.progress('read_dat'):
+                self.expdata = dat_columns(load_columns(self.datfile), self.resolution, self.ierror)
         else:
-            print('No DAT file has been given, therefore no comparison will be conducted, please use the get_qs '
-                  'function. Alternatively the DAT file can be added using the setFile function.')
+            progress.message('No DAT file has been given, therefore no comparison will be conducted, please use the '
+                             'get_qs function. Alternatively the DAT file can be added using the setFile function.')
         return
 
     def get_qs(self, start=0.005, end=0.5, number=50):
@@ -199,8 +356,12 @@ class Files:
             The number of q-vectors.
         """
         q_values = np.linspace(start, end, number)
-        for i in range(0, len(q_values)):
-            self.expdata.append(dataformat.QData(q_values[i], None, None, q_values[i] * (self.resolution / 100)))
+        dq_values = q_values * (self.resolution / 100)
+        if len(self.expdata) > 0:
+            previous = dataformat.as_qdata_table(self.expdata)
+            q_values = np.append(previous.q, q_values)
+            dq_values = np.append(previous.dq, dq_values)
+        self.expdata = dataformat.QDataTable(q_values, dq=dq_values)
         return
 
     def plot_dat(self, rq4=True):
@@ -212,27 +373,19 @@ class Files:
             Should the plot be created with a y-axis of Rq^4
         """
         if self.datfile:
-            x = []
-            y = []
-            dy = []
+            data = dataformat.as_qdata_table(self.expdata)
             plt.rc('text')
             plt.rc('font', family='serif')
             if rq4:
-                for i in range(0, len(self.expdata)):
-                    x.append(self.expdata[i].q)
-                    y.append(np.log10(self.expdata[i].i * self.expdata[i].q ** 4))
-                    dy.append((self.expdata[i].di * self.expdata[i].q ** 4) /
-                              (self.expdata[i].i * np.log(10)))
-                    plt.ylabel('log($Rq^4$) (\AA$^4$)')
+                x = data.q
+                y = np.log10(data.i * data.q ** 4)
+                dy = (data.di * data.q ** 4) / (data.i * np.log(10))
+                plt.ylabel('log($Rq^4$) (\AA$^4$)')
             else:
-                for i in range(0, len(self.expdata)):
-                    x.append(self.expdata[i].q)
-                    y.append(np.log10(self.expdata[i].i))
-                    dy.append(self.expdata[i].di / (self.expdata[i].i * np.log(10)))
-                    plt.ylabel('log($R$)')
-            x = np.asarray(x)
-            y = np.asarray(y)
-            dy = np.asarray(dy)
+                x = data.q
+                y = np.log10(data.i)
+                dy = data.di / (data.i * np.log(10))
+                plt.ylabel('log($R$)')
             plt.errorbar(x, y, yerr=dy, marker='o', ls='')
             plt.xlabel('$q$ (\AA)')
             plt.show()
@@ -241,6 +394,104 @@ class Files:
         return plt
 
 
+def iterate_frames(universe, indices, flip=False, times=None):
+    """Iterate over frames.
+
+    Reads the atom positions of the given frames of a MDAnalysis trajectory one frame at a time.
+
+    Parameters
+    ----------
+    universe: MDAnalysis.Universe
+        The universe holding the trajectory.
+    indices: array_like int
+        The indices of the frames to be read.
+    flip: bool, optional
+        Should the z-positions be flipped through the xy-plane.
+    times: array_like float, optional
+        The time of each of the frames to be read.
+
+    Yields
+    ------
+    falass.dataformat.Frame
+        The time, cell dimensions and atom z-positions for each of the frames.
+    """
+    for i, ts in enumerate(universe.trajectory[np.asarray(indices, dtype=int)]):
+        zpos = universe.atoms.positions[:, 2]
+        if flip:
+            zpos = flip_zpos(universe.dimensions[2], zpos)
+        yield dataformat.Frame(None if times is None else times[i], universe.dimensions[:3].copy(), zpos)
+
+
+def open_source(source):
+    """Open a trajectory.
+
+    Opens the trajectory described by Files.frame_source() once, such that any of its frames may then be read by
+    frames_from_source() without opening and scanning the file again. This allows each of a number of processes to
+    keep its own handle on the trajectory.
+
+    Parameters
+    ----------
+    source: str, tuple or falass.trajectory.PDBTrajectory
+        Path and name of the .pdb file (or of the .pdb topology and the trajectory file), which is opened with
+        MDAnalysis, or a parsed trajectory (see Files.frame_source()), which is returned unchanged.
+
+    Returns
+    -------
+    MDAnalysis.Universe or falass.trajectory.PDBTrajectory
+        The open trajectory.
+    """
+    if isinstance(source, trajectory.PDBTrajectory):
+        return source
+    if isinstance(source, tuple):
+        return mda.Universe(*source)
+    return mda.Universe(source)
+
+
+def frames_from_source(handle, indices, flip=False):
+    """Iterate over frames of an open trajectory.
+
+    Parameters
+    ----------
+    handle: MDAnalysis.Universe or falass.trajectory.PDBTrajectory
+        The trajectory, as from open_source().
+    indices: array_like int
+        The indices of the frames to be read.
+    flip: bool, optional
+        Should the z-positions be flipped through the xy-plane.
+
+    Yields
+    ------
+    falass.dataformat.Frame
+        The cell dimensions and atom z-positions for each of the frames.
+    """
+    if isinstance(handle, trajectory.PDBTrajectory):
+        return trajectory.iterate_frames(handle, indices, flip)
+    return iterate_frames(handle, indices, flip)
+
+
+def stored_frames(atoms, cell, indices, times=None):
+    """Iterate over frames held in memory.
+
+    Parameters
+    ----------
+    atoms: falass.dataformat.AtomPositionsStack
+        The z-positions of the atoms in every frame, already flipped if this was asked for.
+    cell: array_like float
+        The cell dimensions of every frame.
+    indices: array_like int
+        The indices of the frames.
+    times: array_like float, optional
+        The time of each of the frames.
+
+    Yields
+    ------
+    falass.dataformat.Frame
+        The time, cell dimensions and atom z-positions for each of the frames.
+    """
+    for i, k in enumerate(np.asarray(indices, dtype=int)):
+        yield dataformat.Frame(None if times is None else times[i], np.array(cell[k]), atoms.zpos[k])
+
+
 def check_duplicates(array, check):
     """Stops duplicate atom types.
 
@@ -248,8 +499,8 @@ def check_duplicates(array, check):
 
     Parameters
     ----------
-    array: array-type ScatLens
-        The array to check.
+    array: array-type ScatLens or falass.dataformat.ScatLenTable
+        The array to check, for a ScatLenTable this is a single lookup.
     check: str
         The atom type to try and find.
 
@@ -258,12 +509,74 @@ def check_duplicates(array, check):
     bool
         True if the atom type is already present in the scatlen type array, false if not.
     """
+    if isinstance(array, dataformat.ScatLenTable):
+        return check in array
     for i in range(0, len(array)):
         if array[i].atom == check:
             return True
     return False
 
 
+def load_columns(filename, dtype=np.float64):
+    """Bulk read of a text file.
+
+    Reads the whitespace separated columns of a text file in a single pass with numpy.loadtxt, ignoring anything
+    after a '#' and blank lines.
+
+    Parameters
+    ----------
+    filename: str
+        Path and name of the file.
+    dtype: data-type, optional
+        The type of the values, str for files with text columns.
+
+    Returns
+    -------
+    array_like
+        The (lines x columns) values, with no rows if the file has no data.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        try:
+            return np.loadtxt(filename, dtype=dtype, comments='#', ndmin=2)
+        except ValueError as error:
+            raise ValueError("The file {} could not be read, each line should have the same number of columns: "
+                             "{}".format(filename, error))
+
+
+def dat_columns(columns, resolution=5., ierror=5.):
+    """Reflectometry data from columns.
+
+    Builds the q, i, di and dq columns of a .dat file, for 2 column files the di is a percentage of the intensity
+    and for 2 and 3 column files the dq is a percentage of the q-vector.
+
+    Parameters
+    ----------
+    columns: array_like float
+        The (points x columns) values, with 2, 3 or 4 columns.
+    resolution: float, optional
+        The percentage resolution, used if there is no dq column.
+    ierror: float, optional
+        The percentage error in the intensity, used if there is no di column.
+
+    Returns
+    -------
+    falass.dataformat.QDataTable
+        The reflectometry data.
+    """
+    if columns.shape[0] == 0:
+        return dataformat.QDataTable([], [], [], [])
+    number_of_columns = columns.shape[1]
+    if number_of_columns not in (2, 3, 4):
+        raise ValueError("The .dat file should have 2, 3 or 4 columns, q, i, di and dq, but it has "
+                         "{}.".format(number_of_columns))
+    q = columns[:, 0]
+    i = columns[:, 1]
+    di = columns[:, 2] if number_of_columns > 2 else i * (ierror / 100)
+    dq = columns[:, 3] if number_of_columns > 3 else q * (resolution / 100)
+    return dataformat.QDataTable(q, i, di, dq)
+
+
 def line_count(filename):
     """File length.
 
@@ -1,7 +1,9 @@
 import numpy as np
-from falass import dataformat
+from falass import dataformat, progress, stats
 import matplotlib.pyplot as plt
-from scipy.interpolate import InterpolatedUnivariateSpline
+from multiprocessing.pool import ThreadPool
+from scipy import sparse
+from scipy.interpolate import make_interp_spline
 
 
 class Reflect:
@@ -11,9 +13,9 @@ class Reflect:
 
     Parameters
     ----------
-    sld_profile: array_like falass.dataformat.SLDPro
-        An array describing the scattering length density of the simulation cell under study.
-    exp_data: array_like falass.dataformat.QData
+    sld_profile: falass.dataformat.SLDProfileStack or array_like falass.dataformat.SLDPro
+        An array describing the scattering length density of the simulation cell for each timestep under study.
+    exp_data: falass.dataformat.QDataTable or array_like falass.dataformat.QData
         An array giving the experimental data from the datfile.
     """
     def __init__(self, sld_profile, exp_data):
@@ -21,51 +23,181 @@ class Reflect:
         self.exp_data = exp_data
         self.averagereflect = []
         self.reflect = []
+        self.running_average = stats.RunningAverage()
+        self.average_deviation = None
+        self.merge_change = None
 
-    def calc_ref(self):
+    def calc_ref(self, processes=1, q_chunk=None, frame_chunk=None, store=True, pointwise=False, merge=None,
+                 sample=10):
         """Calculate reflectometry.
 
         The calculation of the reflectometry profiles based on the sld profiles calculated from each of the timesteps
         under study.
+
+        Parameters
+        ----------
+        processes: int, optional
+            The number of threads to share the calculation between, the frames (and q-vectors if there are fewer
+            frames than threads) are divided between the threads. The result is identical to that from a single
+            thread.
+        q_chunk: int, optional
+            The maximum number of q-vectors to be calculated in a single block, this limits the memory used for large
+            numbers of q-vectors.
+        frame_chunk: int, optional
+            The number of frames to be calculated at a time, after each block of frames the running average (see
+            running_average_ref()) is updated. If not given all of the frames are calculated together.
+        store: bool, optional
+            Should the reflectometry profile of each timestep be kept. If false only the running average is kept.
+        pointwise: bool, optional
+            Should the resolution of each q-vector be used for the smearing, as for time-of-flight data, rather than
+            a constant resolution taken from the first q-vector.
+        merge: float, optional
+            If given, adjacent layers with SLD within this tolerance are merged before the calculation (see
+            merge_layers()), which is faster for profiles with many similar layers. A tolerance of 0 merges only
+            identical layers, without changing the reflectometry.
+        sample: int, optional
+            The number of evenly spaced timesteps used to estimate the largest relative change in the reflectometry
+            caused by merging the layers, which is stored in merge_change. If 0 the change is not estimated.
         """
         if len(self.exp_data) > 0:
+            exp_data = dataformat.as_qdata_table(self.exp_data)
+            sld_profile = dataformat.as_sld_stack(self.sld_profile)
             self.reflect = []
-            prog = 0
-            k = 0
-            print("Calculating reflectometry\n[ 0 % ]")
-            for i in range(0, len(self.sld_profile)):
-                k += 1
-                prog_new = np.floor(k / (len(self.sld_profile)) * 100)
-                if prog_new > prog + 9:
-                    prog = prog_new
-                    print("[{} {} % ]".format('#' * int(prog / 10), int(prog / 10) * 10))
-                refl = convolution(self.exp_data, self.sld_profile[i])
-                a = []
-                for j in range(0, len(self.exp_data)):
-                    a.append(dataformat.QData(self.exp_data[j].q, refl[j], 0, self.exp_data[j].dq))
-                self.reflect.append(a)
+            self.running_average = stats.RunningAverage()
+            self.merge_change = None
+            if merge is not None and sample > 0 and len(sld_profile) > 0:
+                self._merge_change(exp_data, sld_profile, merge, sample, pointwise)
+            progress.message("Calculating reflectometry")
+            if frame_chunk is None:
+                frame_chunk = len(sld_profile)
+            refl = []
+            prog = progress.progress('reflect', len(sld_profile))
+            for start in range(0, len(sld_profile), frame_chunk):
+                profiles = sld_profile[start:start + frame_chunk]
+                if merge is not None:
+                    profiles = merge_layers(profiles, merge)
+                block = convolution_stack(exp_data, profiles, processes, q_chunk, pointwise)
+                self.running_average.update_batch(block)
+                if store:
+                    refl.append(block)
+                prog.update(len(block))
+            prog.close()
+            if store:
+                self.reflect = dataformat.QDataStack(exp_data.q, np.concatenate(refl), dq=exp_data.dq)
         else:
             raise ValueError('No q vectors have been defined -- either read a .dat file or get q vectors.')
 
-    def average_ref(self):
+    def _merge_change(self, exp_data, sld_profile, merge, sample, pointwise):
+        subset = sld_profile[np.unique(np.linspace(0, len(sld_profile) - 1, sample).astype(int))]
+        merged = merge_layers(subset, merge)
+        refl = convolution_stack(exp_data, subset, pointwise=pointwise)
+        merged_refl = convolution_stack(exp_data, merged, pointwise=pointwise)
+        self.merge_change = np.max(np.abs(merged_refl - refl) / refl)
+        progress.message("Merging the layers reduces the {} layers to {}, and changes the reflectometry by up to "
+                         "{:.2g} % for a sample of {} timesteps".format(subset.thick.shape[1], merged.thick.shape[1],
+                                                                       self.merge_change * 100, len(subset)))
+
+    def average_ref(self, method='frames', av_sld_profile=None, sample=10, pointwise=False, error='std'):
         """Average reflectometry profiles.
 
-        The averaging of the reflectometry profiles as calculated by the calc_ref() function.
+        The averaging of the reflectometry profiles as calculated by the calc_ref() function. If the reflectometry
+        profile of each timestep was not stored, the running average from calc_ref() is used.
+
+        Alternatively, for quick screening, the reflectometry may be calculated once from the average SLD profile
+        rather than for each timestep. As the reflectometry is not linear in the SLD profile this is an approximation,
+        the maximum relative difference from the average of the reflectometry profiles, for a sample of the
+        timesteps, is stored in average_deviation.
+
+        Parameters
+        ----------
+        method: str, optional
+            Either 'frames' to average the reflectometry profiles of each timestep, or 'profile' to calculate the
+            reflectometry of the average SLD profile.
+        av_sld_profile: falass.dataformat.SLDProfile, optional
+            The average SLD profile for the 'profile' method, such as falass.sld.SLD.av_sld_profile. If not given the
+            average of the sld_profile is used.
+        sample: int, optional
+            The number of evenly spaced timesteps used to estimate the average_deviation for the 'profile' method, if
+            0 the deviation is not estimated.
+        pointwise: bool, optional
+            Should the resolution of each q-vector be used for the smearing in the 'profile' method, see calc_ref().
+        error: str, optional
+            The uncertainty given for the 'frames' method. For 'std' this is the standard deviation over the
+            timesteps. For 'block' or 'autocorrelation' it is the standard error of the mean, accounting for the
+            correlation between consecutive timesteps by block averaging or the integrated autocorrelation time (see
+            falass.stats.correlated_error()); these need the reflectometry profile of each timestep.
         """
         if len(self.exp_data) > 0:
-            self.averagereflect = []
-            for i in range(0, len(self.reflect[0])):
-                self.averagereflect.append(dataformat.QData(self.exp_data[i].q, 0, 0, self.exp_data[i].dq))
-            for i in range(0, len(self.reflect[0])):
-                for j in range(0, len(self.reflect)):
-                    self.averagereflect[i].i += self.reflect[j][i].i
-                self.averagereflect[i].i /= len(self.reflect)
-                for j in range(0, len(self.reflect)):
-                    self.averagereflect[i].di += np.square(self.reflect[j][i].i - self.averagereflect[i].i)
-                self.averagereflect[i].di = np.sqrt(1. / (len(self.reflect) - 1) * self.averagereflect[i].di)
+            if method == 'profile':
+                self.averagereflect = self._reflect_average_profile(av_sld_profile, sample, pointwise)
+                return
+            if method != 'frames':
+                raise ValueError("The averaging method must be either 'frames' or 'profile'.")
+            if error != 'std' and len(self.reflect) == 0:
+                raise ValueError("The reflectometry profile of each timestep is needed for the {} error -- please "
+                                 "run the calc_ref() function with store=True.".format(error))
+            if len(self.reflect) > 0:
+                reflect = dataformat.as_qdata_stack(self.reflect)
+                self.running_average = stats.RunningAverage()
+                self.running_average.update_batch(reflect.i)
+            self.averagereflect = self.running_average_ref()
+            if error != 'std':
+                average = self.averagereflect
+                self.averagereflect = dataformat.QDataTable(average.q, average.i,
+                                                            stats.correlated_error(reflect.i, error), average.dq)
         else:
             raise ValueError('No q vectors have been defined -- either read a .dat file or get q vectors.')
 
+    def _reflect_average_profile(self, av_sld_profile, sample, pointwise):
+        exp_data = dataformat.as_qdata_table(self.exp_data)
+        if av_sld_profile is None:
+            av_sld_profile = average_profile(self.sld_profile)
+        refl = convolution_stack(exp_data, [dataformat.as_sld_profile(av_sld_profile)], pointwise=pointwise)[0]
+        self.average_deviation = None
+        if sample > 0 and len(self.sld_profile) > 1:
+            sld_profile = dataformat.as_sld_stack(self.sld_profile)
+            subset = sld_profile[np.unique(np.linspace(0, len(sld_profile) - 1, sample).astype(int))]
+            frames_refl = np.mean(convolution_stack(exp_data, subset, pointwise=pointwise), axis=0)
+            profile_refl = convolution_stack(exp_data, [average_profile(subset)], pointwise=pointwise)[0]
+            self.average_deviation = np.max(np.abs(profile_refl - frames_refl) / frames_refl)
+            progress.message("The reflectometry of the average SLD profile differs from the average reflectometry "
+                             "by up to {:.2f} % for a sample of {} timesteps".format(self.average_deviation * 100,
+                                                                                    len(subset)))
+        return dataformat.QDataTable(exp_data.q, refl, np.zeros_like(refl), exp_data.dq)
+
+    def effective_sample_size(self):
+        """Effective number of independent timesteps.
+
+        The number of independent timesteps that would give the same uncertainty in the average reflectometry at
+        each q-vector, see falass.stats.effective_sample_size().
+
+        Returns
+        -------
+        array_like float
+            The effective sample size for each q-vector.
+        """
+        if len(self.reflect) == 0:
+            raise ValueError("The reflectometry profile of each timestep is needed -- please run the calc_ref() "
+                             "function with store=True.")
+        return stats.effective_sample_size(dataformat.as_qdata_stack(self.reflect).i)
+
+    def running_average_ref(self):
+        """Running average reflectometry profile.
+
+        The average reflectometry profile and its standard deviation over the timesteps that have been calculated so
+        far, this may be read while calc_ref() is running.
+
+        Returns
+        -------
+        falass.dataformat.QDataTable
+            The average reflectometry profile.
+        """
+        if self.running_average.count == 0:
+            raise ValueError("No reflectometry profiles have been calculated -- please run the calc_ref() function.")
+        exp_data = dataformat.as_qdata_table(self.exp_data)
+        return dataformat.QDataTable(exp_data.q, self.running_average.mean, self.running_average.std(),
+                                     exp_data.dq)
+
     def plot_ref(self, rq4=True): #pragma: no cover
         """Plot reflectometry profile.
 
@@ -77,20 +209,13 @@ class Reflect:
             Should the data be transformed to rq4 space.
         """
         if len(self.exp_data) > 0:
-            x = []
-            y = []
-            dy = []
+            averagereflect = dataformat.as_qdata_table(self.averagereflect)
             plt.rc('text')
             plt.rc('font', family='serif')
             plt.figure(figsize=(15,10))
-            for i in range(0, len(self.exp_data)):
-                x.append(self.averagereflect[i].q)
-                y.append(np.log10(self.averagereflect[i].i * self.averagereflect[i].q ** 4))
-                dy.append((self.averagereflect[i].di * self.averagereflect[i].q ** 4) /
-                          (self.averagereflect[i].i * np.log(10)))
-            x = np.asarray(x)
-            y = np.asarray(y)
-            dy = np.asarray(dy)
+            x = averagereflect.q
+            y = np.log10(averagereflect.i * averagereflect.q ** 4)
+            dy = (averagereflect.di * averagereflect.q ** 4) / (averagereflect.i * np.log(10))
             plt.errorbar(x, y, yerr=dy)
             plt.xlabel('$q$ (\AA)')
             plt.ylabel('log($Rq^4$) (\AA$^4$)')
@@ -98,6 +223,92 @@ class Reflect:
             raise ValueError('No q vectors have been defined -- either read a .dat file or get q vectors.')
         return plt
 
+def average_profile(sld_profile):
+    """Average SLD profile.
+
+    The layer by layer mean of the SLD profiles of a number of frames.
+
+    Parameters
+    ----------
+    sld_profile: falass.dataformat.SLDProfileStack or array_like
+        The SLD profile of each frame.
+
+    Returns
+    -------
+    falass.dataformat.SLDProfile
+        The average SLD profile.
+    """
+    sld_profile = dataformat.as_sld_stack(sld_profile)
+    return dataformat.SLDProfile(np.mean(sld_profile.thick, axis=0), np.mean(sld_profile.real, axis=0),
+                                 np.mean(sld_profile.imag, axis=0))
+
+
+def merge_layers(sld_profile, tolerance=0.):
+    """Merge similar layers.
+
+    Merges each run of adjacent layers whose real and imaginary SLD are within the tolerance of those of the first
+    layer of the run into a single layer, with the total thickness and the thickness weighted mean SLD of the run. The
+    reflectivity() calculation is proportional to the number of layers, so this reduces its cost. With a tolerance of
+    0 only layers with identical SLD (such as the empty space of the simulation cell) are merged, and the
+    reflectometry is unchanged; a larger tolerance is an approximation. The first and last layers, the semi-infinite
+    media, are not merged.
+
+    As the frames of a stack must have the same number of layers, a frame with fewer merged layers is padded with
+    copies of its last merged layer of zero thickness, which do not change its reflectometry.
+
+    Parameters
+    ----------
+    sld_profile: falass.dataformat.SLDProfileStack or array_like
+        The SLD profile of each frame.
+    tolerance: float, optional
+        The largest difference in SLD between layers that are merged.
+
+    Returns
+    -------
+    falass.dataformat.SLDProfileStack
+        The merged SLD profile of each frame.
+    """
+    sld_profile = dataformat.as_sld_stack(sld_profile)
+    thick = np.asarray(sld_profile.thick, dtype=np.float64)
+    real = np.asarray(sld_profile.real, dtype=np.float64)
+    imag = np.asarray(sld_profile.imag, dtype=np.float64)
+    frames, layers = thick.shape
+    if layers < 4:
+        return sld_profile
+    inner = slice(1, layers - 1)
+
+    start = np.zeros((frames, layers - 2), dtype=bool)
+    start[:, 0] = True
+    first_real = real[:, 1].copy()
+    first_imag = imag[:, 1].copy()
+    for j in range(2, layers - 1):
+        new = (np.abs(real[:, j] - first_real) > tolerance) | (np.abs(imag[:, j] - first_imag) > tolerance)
+        start[:, j - 1] = new
+        first_real[new] = real[new, j]
+        first_imag[new] = imag[new, j]
+    segment = np.cumsum(start, axis=1) - 1
+    count = segment[:, -1] + 1
+    width = int(count.max())
+
+    index = (segment + width * np.arange(frames)[:, np.newaxis]).ravel()
+    size = frames * width
+    merged_thick = np.bincount(index, thick[:, inner].ravel(), size).reshape(frames, width)
+    number = np.bincount(index, None, size).reshape(frames, width)
+    merged = []
+    for values in (real, imag):
+        weighted = np.bincount(index, (thick[:, inner] * values[:, inner]).ravel(), size).reshape(frames, width)
+        total = np.bincount(index, values[:, inner].ravel(), size).reshape(frames, width)
+        merged.append(np.where(merged_thick > 0, weighted / np.where(merged_thick > 0, merged_thick, 1.),
+                               total / np.maximum(number, 1)))
+
+    last = np.minimum(np.arange(width), count[:, np.newaxis] - 1)
+    merged_thick = np.where(np.arange(width) < count[:, np.newaxis], merged_thick, 0.)
+    merged = [np.take_along_axis(values, last, axis=1) for values in merged]
+    return dataformat.SLDProfileStack(np.hstack((thick[:, :1], merged_thick, thick[:, -1:])),
+                                      np.hstack((real[:, :1], merged[0], real[:, -1:])),
+                                      np.hstack((imag[:, :1], merged[1], imag[:, -1:])))
+
+
 def convolution(exp_data, sld_profile):
     """Convolution/smearing
 
@@ -105,24 +316,96 @@ def convolution(exp_data, sld_profile):
 
     Parameters
     ----------
-    exp_data: falass.dataformat.QData
+    exp_data: falass.dataformat.QDataTable or array_like falass.dataformat.QData
         The experimental data from the datfile.
-    sld_profile: falass.dataformat.SLDPro
+    sld_profile: falass.dataformat.SLDProfile or array_like falass.dataformat.SLDPro
         The SLD profile calculated from the simulation trajectory.
-    lt: float
-        The thickness of the layers.
 
     Returns
     -------
     array_like
         The smeared reflectometry profile.
     """
+    return convolution_stack(exp_data, [dataformat.as_sld_profile(sld_profile)])[0]
+
+
+def convolution_stack(exp_data, sld_profile, processes=1, q_chunk=None, pointwise=False):
+    """Convolution/smearing of many frames
+
+    The convolution of the reflectometry data of each frame by a gaussian of constant width (a percentage of the
+    q-vector), or of the width given by the resolution of each q-vector. The unsmeared reflectometry of all of the
+    frames is calculated on the oversampled grid in a single call, and smeared with a single product with the cached
+    smearing_matrix() or pointwise_smearing_matrix().
+
+    Parameters
+    ----------
+    exp_data: falass.dataformat.QDataTable or array_like falass.dataformat.QData
+        The experimental data from the datfile.
+    sld_profile: falass.dataformat.SLDProfileStack or array_like
+        The SLD profile of each frame calculated from the simulation trajectory.
+    processes: int, optional
+        The number of threads to share the calculation between.
+    q_chunk: int, optional
+        The maximum number of q-vectors to be calculated in a single block.
+    pointwise: bool, optional
+        Should the resolution of each q-vector be used (see pointwise_smearing_matrix()), rather than a constant
+        percentage taken from the first q-vector.
+
+    Returns
+    -------
+    array_like
+        The (frames x q) smeared reflectometry profiles.
+    """
+    if pointwise:
+        xlin, matrix = pointwise_smearing_matrix(exp_data)
+    else:
+        xlin, matrix = smearing_matrix(exp_data)
+    rvals = parallel_reflectivity(xlin, sld_profile, processes, q_chunk)
+    if matrix is None:
+        return rvals
+    return matrix.dot(rvals.T).T
+
+
+_smearing_cache = {}
+
+
+def smearing_matrix(exp_data, tolerance=1e-25, block=256):
+    """Smearing operator.
+
+    The gaussian smearing of constant width (a percentage of the q-vector) used by convolution_stack() is linear in
+    the reflectometry, the reflectometry is calculated on an oversampled log-spaced grid, convolved with a 51-point
+    gaussian and interpolated with a cubic spline onto the experimental q-vectors. These steps depend only on the
+    q-vectors and resolution, so are combined into a single sparse matrix which is cached for each set of q-vectors.
+
+    Parameters
+    ----------
+    exp_data: falass.dataformat.QDataTable or array_like falass.dataformat.QData
+        The experimental data from the datfile.
+    tolerance: float, optional
+        Matrix elements smaller than this fraction of the largest element are dropped.
+    block: int, optional
+        The number of grid points for which the spline interpolation is calculated at a time.
+
+    Returns
+    -------
+    array_like
+        The oversampled grid of q-vectors that the reflectometry should be calculated at.
+    scipy.sparse.csr_matrix
+        The (q x grid) smearing matrix, None if the resolution is too small for smearing, in which case the grid is
+        the experimental q-vectors.
+    """
     fwhm = 2 * np.sqrt(2 * np.log(2))
 
-    res = exp_data[0].dq / exp_data[0].q
+    exp_data = dataformat.as_qdata_table(exp_data)
+    q = exp_data.q
+    res = exp_data.dq[0] / exp_data.q[0]
 
-    if exp_data[0].dq / exp_data[0].q < 0.0005:
-        return reflectivity(exp_data, sld_profile)
+    if res < 0.0005:
+        return q, None
+
+    key = (q.tobytes(), res, tolerance)
+    if key in _smearing_cache:
+        return _smearing_cache[key]
 
     gnum = 51
     ggpoint = (gnum - 1) / 2
@@ -130,10 +413,6 @@ def convolution(exp_data, sld_profile):
     def gauss(x, s):
         return 1. / s / np.sqrt(2 * np.pi) * np.exp(-0.5 * x ** 2 / s / s)
 
-    q = []
-    for i in range(0, len(exp_data)):
-        q.append(exp_data[i].q)
-
     lowq = np.min(q)
     highq = np.max(q)
 
@@ -147,13 +426,94 @@ def convolution(exp_data, sld_profile):
     gaussx = np.linspace(-1.7 * res, 1.7 * res, gnum)
     gaussy = gauss(gaussx, res / fwhm)
 
-    rvals = reflectivity(xlin, sld_profile)
-    smeared_rvals = np.convolve(rvals, gaussy, mode='same')
-    interpol = InterpolatedUnivariateSpline(xlin, smeared_rvals)
+    # np.convolve(rvals, gaussy, mode='same') as a banded (grid x grid) matrix
+    half = (gnum - 1) // 2
+    convolve = sparse.diags([np.full(xlin.size - abs(half - j), gaussy[j]) for j in range(0, gnum)],
+                            [half - j for j in range(0, gnum)], shape=(xlin.size, xlin.size), format='csc')
+    convolve = convolve * (gaussx[1] - gaussx[0])
+
+    # the spline interpolation is linear, so interpolating each column of the convolution gives the full operator
+    columns = []
+    for first in range(0, xlin.size, block):
+        interpol = make_interp_spline(xlin, convolve[:, first:first + block].toarray(), k=3)
+        column = interpol(q)
+        column[np.abs(column) < tolerance * np.max(np.abs(column))] = 0
+        columns.append(sparse.csr_matrix(column))
+    matrix = sparse.hstack(columns, format='csr')
+
+    if len(_smearing_cache) > 16:
+        _smearing_cache.clear()
+    _smearing_cache[key] = (xlin, matrix)
+    return xlin, matrix
+
+
+def pointwise_smearing_matrix(exp_data):
+    """Pointwise smearing operator.
+
+    The gaussian smearing of the reflectometry where each q-vector has its own resolution, dq (the full width at half
+    maximum), as is the case for time-of-flight data. The reflectometry is calculated on an oversampled log-spaced
+    grid (as dense as for the constant resolution smearing, for the finest resolution) and the smeared reflectometry
+    at each q-vector is the quadrature over the grid points within +/- 3.5 standard deviations, weighted by the
+    gaussian and the trapezoidal rule and normalised. The quadrature weights are precomputed as a single sparse matrix
+    which is cached for each set of q-vectors and resolutions. Points with a resolution less than 0.05 % of the
+    q-vector are not smeared.
+
+    Parameters
+    ----------
+    exp_data: falass.dataformat.QDataTable or array_like falass.dataformat.QData
+        The experimental data from the datfile.
 
-    smeared_output = interpol(q)
-    smeared_output *= gaussx[1] - gaussx[0]
-    return smeared_output
+    Returns
+    -------
+    array_like
+        The oversampled grid of q-vectors that the reflectometry should be calculated at.
+    scipy.sparse.csr_matrix
+        The (q x grid) smearing matrix, None if every resolution is too small for smearing, in which case the grid is
+        the experimental q-vectors.
+    """
+    fwhm = 2 * np.sqrt(2 * np.log(2))
+    intlimit = 3.5
+
+    exp_data = dataformat.as_qdata_table(exp_data)
+    q = exp_data.q
+    res = exp_data.dq / exp_data.q
+    smeared = res >= 0.0005
+
+    if not np.any(smeared):
+        return q, None
+
+    key = ('pointwise', q.tobytes(), exp_data.dq.tobytes())
+    if key in _smearing_cache:
+        return _smearing_cache[key]
+
+    sigma = np.where(smeared, exp_data.dq / fwhm, 0)
+    lowq = np.maximum(q - intlimit * sigma, np.min(q) * 1e-3)
+    highq = q + intlimit * sigma
+
+    # log-spaced grid with the same density as the constant resolution smearing for the finest resolution, the
+    # points that are not smeared are added to the grid
+    step = 1.7 * np.min(res[smeared]) / fwhm / 25
+    start = np.log10(np.min(lowq)) - step
+    finish = np.log10(np.max(highq)) + step
+    xlin = np.power(10., np.linspace(start, finish, int(np.ceil((finish - start) / step)) + 1))
+    xlin = np.union1d(xlin, q[~smeared])
+    trapezoid = np.gradient(xlin)
+
+    first = np.where(smeared, np.searchsorted(xlin, lowq, side='left'), np.searchsorted(xlin, q))
+    last = np.where(smeared, np.searchsorted(xlin, highq, side='right'), first + 1)
+    counts = last - first
+    rows = np.repeat(np.arange(q.size), counts)
+    columns = np.arange(np.sum(counts)) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(first, counts)
+    weights = np.where(smeared[rows],
+                       np.exp(-0.5 * np.square((xlin[columns] - q[rows]) / np.where(smeared, sigma, 1)[rows])) *
+                       trapezoid[columns], 1)
+    weights /= np.bincount(rows, weights=weights, minlength=q.size)[rows]
+    matrix = sparse.csr_matrix((weights, (rows, columns)), shape=(q.size, xlin.size))
+
+    if len(_smearing_cache) > 16:
+        _smearing_cache.clear()
+    _smearing_cache[key] = (xlin, matrix)
+    return xlin, matrix
 
 
 def reflectivity(exp_data, sld_profile):
@@ -163,25 +523,23 @@ def reflectivity(exp_data, sld_profile):
 
     Parameters
     ----------
-    exp_data: falass.dataformat.QData
-        The experimental data from the datfile.
-    sld_profile: falass.dataformat.SLDPro
+    exp_data: array_like float
+        The q-vectors to calculate the reflectometry at.
+    sld_profile: falass.dataformat.SLDProfile or array_like falass.dataformat.SLDPro
         The SLD profile calculated from the simulation trajectory.
-    lt: float
-        The thickness of the layers.
 
     Returns
     -------
     array_like
         The reflectometry profile.
     """
+    sld_profile = dataformat.as_sld_profile(sld_profile)
     layers = np.zeros((len(sld_profile), 4))
-    for i in range(0, len(sld_profile)):
-        layers[i][0] = sld_profile[i].thick
-        layers[i][1] = sld_profile[i].real
-        layers[i][2] = sld_profile[i].imag
-        layers[i][3] = 0
-    qvals = np.asfarray(exp_data).ravel()
+    layers[:, 0] = sld_profile.thick
+    layers[:, 1] = sld_profile.real
+    layers[:, 2] = sld_profile.imag
+    exp_data = np.asarray(exp_data, dtype=np.float64)
+    qvals = exp_data.ravel()
     nlayers = len(sld_profile) - 2
     npnts = qvals.size
 
@@ -198,6 +556,125 @@ def reflectivity(exp_data, sld_profile):
     return np.real(np.reshape(ref, exp_data.shape))
 
 
+def reflectivity_stack(exp_data, sld_profile):
+    """Abeles optical matrix formalism for many frames.
+
+    The calculation of the reflectometry of each frame using the Abeles optical matrix method. Rather than calling
+    reflectivity() for each frame, the characteristic matrices are broadcast over the (frames x q) array, such that
+    there is a single pass over the layers.
+
+    Parameters
+    ----------
+    exp_data: array_like float
+        The q-vectors to calculate the reflectometry at.
+    sld_profile: falass.dataformat.SLDProfileStack or array_like
+        The SLD profile of each frame, each frame must have the same number of layers.
+
+    Returns
+    -------
+    array_like
+        The (frames x q) reflectometry profiles.
+    """
+    sld_profile = dataformat.as_sld_stack(sld_profile)
+    qvals = np.asarray(exp_data, dtype=np.float64).ravel()
+    nlayers = sld_profile.thick.shape[1] - 2
+
+    sld = np.zeros(sld_profile.thick.shape, np.complex128)
+    sld[:] += ((sld_profile.real - sld_profile.real[:, :1]) + 1j * (sld_profile.imag - sld_profile.imag[:, :1]))
+
+    k = np.sqrt(qvals[np.newaxis, :] ** 2. / 4. - 4 * np.pi * sld[:, :1])
+
+    mrtot00 = np.ones(k.shape, np.complex128)
+    mrtot01 = np.zeros(k.shape, np.complex128)
+    mrtot10 = np.zeros(k.shape, np.complex128)
+    mrtot11 = np.ones(k.shape, np.complex128)
+
+    for idx in range(1, nlayers + 2):
+        k_next = np.sqrt(qvals[np.newaxis, :] ** 2. / 4. - 4 * np.pi * sld[:, idx:idx + 1])
+        rj = (k - k_next) / (k + k_next)
+        rj *= np.exp(k * k_next)
+
+        # work out characteristic matrix of layer
+        if idx - 1:
+            mi00 = np.exp(k * 1j * np.fabs(sld_profile.thick[:, idx - 1:idx]))
+            mi11 = np.exp(k * -1j * np.fabs(sld_profile.thick[:, idx - 1:idx]))
+        else:
+            mi00 = 1
+            mi11 = 1
+
+        mi10 = rj * mi00
+        mi01 = rj * mi11
+
+        # matrix multiply mrtot by characteristic matrix
+        p0 = mrtot00 * mi00 + mrtot10 * mi01
+        mrtot10 = mrtot00 * mi10 + mrtot10 * mi11
+        mrtot00 = p0
+
+        p0 = mrtot01 * mi00 + mrtot11 * mi01
+        mrtot11 = mrtot01 * mi10 + mrtot11 * mi11
+        mrtot01 = p0
+
+        k = k_next
+
+    ref = (mrtot01 * np.conj(mrtot01)) / (mrtot00 * np.conj(mrtot00))
+    return np.real(ref)
+
+
+def parallel_reflectivity(exp_data, sld_profile, processes=1, q_chunk=None):
+    """Abeles optical matrix formalism on a thread pool.
+
+    The calculation of the reflectometry of each frame with reflectivity_stack(), where the frames and q-vectors are
+    divided into blocks that are calculated on a pool of threads. The blocks are reassembled in order, such that the
+    result is identical to a single call of reflectivity_stack().
+
+    Parameters
+    ----------
+    exp_data: array_like float
+        The q-vectors to calculate the reflectometry at.
+    sld_profile: falass.dataformat.SLDProfileStack or array_like
+        The SLD profile of each frame, each frame must have the same number of layers.
+    processes: int, optional
+        The number of threads to share the calculation between.
+    q_chunk: int, optional
+        The maximum number of q-vectors to be calculated in a single block. If not given the q-vectors are only
+        divided when there are fewer frames than threads.
+
+    Returns
+    -------
+    array_like
+        The (frames x q) reflectometry profiles.
+    """
+    sld_profile = dataformat.as_sld_stack(sld_profile)
+    qvals = np.asarray(exp_data, dtype=np.float64).ravel()
+    number_of_frames = len(sld_profile)
+    if processes <= 1 and q_chunk is None:
+        return reflectivity_stack(qvals, sld_profile)
+
+    frame_blocks = [block for block in np.array_split(np.arange(number_of_frames), max(processes, 1))
+                    if block.size > 0]
+    if q_chunk is None:
+        q_blocks = int(np.ceil(processes / len(frame_blocks)))
+    else:
+        q_blocks = int(np.ceil(qvals.size / q_chunk))
+    q_blocks = [block for block in np.array_split(np.arange(qvals.size), max(q_blocks, 1)) if block.size > 0]
+
+    tasks = [(frame_block, q_block) for frame_block in frame_blocks for q_block in q_blocks]
+
+    def calculate(task):
+        frame_block, q_block = task
+        return reflectivity_stack(qvals[q_block], sld_profile[frame_block])
+
+    refl = np.zeros((number_of_frames, qvals.size))
+    pool = ThreadPool(max(processes, 1))
+    try:
+        for task, block in zip(tasks, pool.map(calculate, tasks)):
+            refl[task[0][0]:task[0][-1] + 1, task[1][0]:task[1][-1] + 1] = block
+    finally:
+        pool.close()
+        pool.join()
+    return refl
+
+
 def layer_loop(kn, k, idx, layers, mrtot):
     """Calculation that is conducted for each layer.
 
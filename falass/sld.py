@@ -1,5 +1,6 @@
-from falass import dataformat, job
+from falass import dataformat, job, progress, readwrite, stats
 import numpy as np
+import multiprocessing
 import matplotlib.pyplot as plt
 
 
@@ -19,6 +20,7 @@ class SLD:
         self.sld_profile = []
         self.av_sld_profile = []
         self.av_sld_profile_err = []
+        self.running_average = stats.RunningAverage()
 
     def set_sld_profile(self, sld):
         self.sld_profile = sld
@@ -27,85 +29,135 @@ class SLD:
         self.av_sld_profile = av_sld
         self.av_sld_profile_err = av_sld_err
 
-    def get_sld_profile(self):
+    def get_sld_profile(self, processes=1, store=True):
         """Calculate SLD profile.
 
         This will calculate the SLD profile for each of the timesteps defined in the falass.job.Job. This is achieved
         by summing the scattering lengths for each of the atoms found in a given layer (of defined thickness). This
-        total scattering length is converted to a density by division by the volume of the layer.
+        total scattering length is converted to a density by division by the volume of the layer. The frames are
+        read one at a time from the falass.readwrite.Files class, so only the SLD profiles are held in memory. If the
+        cell size changes between the timesteps, every profile has the number of layers of the smallest cell (see
+        number_of_layers()).
+
+        Parameters
+        ----------
+        processes: int, optional
+            The number of worker processes to share the frames between, each process opens the trajectory file
+            once (see falass.readwrite.open_source()) and is then sent the indices of the frames to analyse. If 1 the
+            frames are analysed in the current process.
+        store: bool, optional
+            Should the SLD profile of each timestep be kept. If false only the running average (see
+            running_average_sld_profile()) is kept, so the memory used does not depend on the number of timesteps.
         """
-        prog = 0
         self.sld_profile = []
-        print("Calculating SLD profile\n[ 0 % ]")
-
-        # create mask of which frames to analyse
-        time_mask = np.array([True if t in self.assigned_job.times else False
-                              for t in self.assigned_job.files.times], dtype=bool)
-
-        u = self.assigned_job.files.u
-
-        k = 0
-        for ts in u.trajectory[time_mask]:
-            if self.assigned_job.files.flip:
-                u.atoms.positions[:, 2] = readwrite.flip_zpos(u.dimensions[2],
-                                                              u.atoms.positions[:, 2])
-            build_sld = []
-            z_cut = u.dimensions[2] - self.assigned_job.cut_off_size
-            number_of_bins = int(z_cut / self.assigned_job.layer_thickness)
-            for j in range(0, number_of_bins):
-                build_sld.append(dataformat.SLDPro(self.assigned_job.layer_thickness, 0, 0))
-
-            for atom in u.atoms:
-                if atom.position[2] < number_of_bins * self.assigned_job.layer_thickness:
-                    bin_choose = int(atom.position[2] / self.assigned_job.layer_thickness)
-                    scatlen_to_add = get_scatlen(atom.name,
-                                                 self.assigned_job.files.scat_lens)
-                    build_sld[bin_choose].real += scatlen_to_add[0]
-                    build_sld[bin_choose].imag += scatlen_to_add[1]
-
-                k += 1
-                prog_new = np.floor(k / (len(u.atoms) *
-                                         len(self.assigned_job.files.atoms)) * 100)
-                if prog_new > prog + 9:
-                    prog = prog_new
-                    print("[{} {} % ]".format('#' * int(prog / 10), int(prog / 10) * 10))
-
-            for j in range(0, number_of_bins):
-                build_sld[j].real /= (u.dimensions[0] * u.dimensions[1] * self.assigned_job.layer_thickness)
-                build_sld[j].imag /= (u.dimensions[0] * u.dimensions[1] * self.assigned_job.layer_thickness)
-
-            self.sld_profile.append(build_sld)
-
-    def average_sld_profile(self):
+        self.running_average = stats.RunningAverage()
+        progress.message("Calculating SLD profile")
+
+        files = self.assigned_job.files
+        real_scatlens, imag_scatlens = scatlen_arrays(files.atom_names, files.scat_len_table())
+        indices = np.flatnonzero(files.frame_mask(self.assigned_job.times))
+        if indices.size == 0:
+            raise ValueError("None of the timesteps of the job are in the trajectory, so no frames were selected.")
+        layers = number_of_layers(np.asarray(files.cell)[indices], self.assigned_job.layer_thickness,
+                                  self.assigned_job.cut_off_size)
+        prog = progress.progress('sld', indices.size)
+
+        profiles = []
+        if processes > 1:
+            chunks = [chunk for chunk in np.array_split(indices, processes * 4) if chunk.size > 0]
+            pool = multiprocessing.Pool(processes, initializer=_sld_init,
+                                        initargs=(files.frame_source(), files.flip, real_scatlens, imag_scatlens,
+                                                  self.assigned_job.layer_thickness, self.assigned_job.cut_off_size,
+                                                  layers))
+            try:
+                for chunk_profiles in pool.imap(_sld_worker, chunks):
+                    for real, imag in chunk_profiles:
+                        self._add_profile(real, imag, profiles, store)
+                    prog.update(len(chunk_profiles))
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            for frame in files.frames(self.assigned_job.times):
+                real, imag = bin_sld(frame.zpos, real_scatlens, imag_scatlens, frame.cell,
+                                     self.assigned_job.layer_thickness, self.assigned_job.cut_off_size, layers)
+                self._add_profile(real, imag, profiles, store)
+                prog.update()
+        prog.close()
+
+        if store:
+            self.sld_profile = dataformat.as_sld_stack(profiles)
+
+    def _add_profile(self, real, imag, profiles, store):
+        thick = np.full(real.size, self.assigned_job.layer_thickness)
+        self.running_average.update(np.array([thick, real, imag]))
+        if store:
+            profiles.append(dataformat.SLDProfile(thick, real, imag))
+
+    def average_sld_profile(self, error='std'):
         """Average SLD profiles.
 
-        Allows for the calculation of the average SLD profile across all of the timesteps that were studied.
+        Allows for the calculation of the average SLD profile across all of the timesteps that were studied. If the
+        SLD profile of each timestep was not stored, the running average from get_sld_profile() is used.
+
+        Parameters
+        ----------
+        error: str, optional
+            The uncertainty given in av_sld_profile_err. For 'std' this is the standard deviation over the
+            timesteps. For 'block' or 'autocorrelation' it is the standard error of the mean, accounting for the
+            correlation between consecutive timesteps by block averaging or the integrated autocorrelation time (see
+            falass.stats.correlated_error()); these need the SLD profile of each timestep.
         """
-        prog = 0
-        self.av_sld_profile_err = []
-        self.av_sld_profile = []
-        print("Getting average SLD profile\n[ 0 % ]")
-        z_cut = self.assigned_job.files.cell[0][2] - self.assigned_job.cut_off_size
-        number_of_bins = int(z_cut / self.assigned_job.layer_thickness)
-        k = 0
-        for j in range(0, number_of_bins):
-            self.av_sld_profile.append(dataformat.SLDPro(self.assigned_job.layer_thickness, 0, 0))
-            for i in range(0, len(self.assigned_job.times)):
-                self.av_sld_profile[j].real += self.sld_profile[i][j].real
-                self.av_sld_profile[j].imag += self.sld_profile[i][j].imag
-            self.av_sld_profile[j].real /= len(self.assigned_job.times)
-            self.av_sld_profile[j].imag /= len(self.assigned_job.times)
-            self.av_sld_profile_err.append(dataformat.SLDPro(self.assigned_job.layer_thickness, 0, 0))
-            for i in range(0, len(self.assigned_job.times)):
-                self.av_sld_profile_err[j].real += np.square(self.sld_profile[i][j].real - self.av_sld_profile[j].real)
-                self.av_sld_profile_err[j].imag += np.square(self.sld_profile[i][j].imag - self.av_sld_profile[j].imag)
-                k += 1
-                prog_new = np.floor(k / (number_of_bins * len(self.assigned_job.files.atoms)) * 100)
-                if prog_new > prog + 9:
-                    prog = prog_new
-                    print("[{} {} % ]".format('#' * int(prog / 10), int(prog / 10) * 10))
-            self.av_sld_profile_err[j].real = np.sqrt(1. / (len(self.assigned_job.times) - 1)) * self.av_sld_profile_err[j].real
-            self.av_sld_profile_err[j].imag = np.sqrt(1. / (len(self.assigned_job.times) - 1)) * self.av_sld_profile_err[j].imag
+        progress.message("Getting average SLD profile")
+        if error != 'std' and len(self.sld_profile) == 0:
+            raise ValueError("The SLD profile of each timestep is needed for the {} error -- please run the "
+                             "get_sld_profile() function with store=True.".format(error))
+        if len(self.sld_profile) > 0:
+            profiles = dataformat.as_sld_stack(self.sld_profile)
+            self.running_average = stats.RunningAverage()
+            self.running_average.update_batch(np.stack([profiles.thick, profiles.real, profiles.imag], axis=1))
+        self.av_sld_profile, self.av_sld_profile_err = self.running_average_sld_profile()
+        if error != 'std':
+            self.av_sld_profile_err = dataformat.SLDProfile(self.av_sld_profile.thick,
+                                                            stats.correlated_error(profiles.real, error),
+                                                            stats.correlated_error(profiles.imag, error))
+
+    def effective_sample_size(self):
+        """Effective number of independent timesteps.
+
+        The number of independent timesteps that would give the same uncertainty in the average real SLD of each
+        layer, see falass.stats.effective_sample_size(). Where this is much smaller than the number of timesteps, the
+        trajectory may be thinned (keeping one in every number of timesteps divided by the smallest effective sample
+        size) with little loss of precision.
+
+        Returns
+        -------
+        array_like float
+            The effective sample size for each layer.
+        """
+        if len(self.sld_profile) == 0:
+            raise ValueError("The SLD profile of each timestep is needed -- please run the get_sld_profile() "
+                             "function with store=True.")
+        return stats.effective_sample_size(dataformat.as_sld_stack(self.sld_profile).real)
+
+    def running_average_sld_profile(self):
+        """Running average SLD profile.
+
+        The average SLD profile and its standard deviation over the timesteps that have been calculated so far, this
+        may be read while get_sld_profile() is running.
+
+        Returns
+        -------
+        falass.dataformat.SLDProfile
+            The average SLD profile.
+        falass.dataformat.SLDProfile
+            The standard deviation of the SLD profile.
+        """
+        if self.running_average.count == 0:
+            raise ValueError("No SLD profiles have been calculated -- please run the get_sld_profile() function.")
+        mean = self.running_average.mean
+        std = self.running_average.std()
+        return dataformat.SLDProfile(mean[0], mean[1], mean[2]), dataformat.SLDProfile(mean[0], std[1], std[2])
 
     def plot_sld_profile(self, real=True, imag=False): #pragma: no cover
         """Plot SLD.
@@ -119,22 +171,18 @@ class SLD:
         imag: bool
             Should the imaginary SLD profile be plotted (if both real and imaginary are true the real will be plotted).
         """
-        x = []
-        y = []
-        dy = []
-        buildx = 0
+        av_sld_profile = dataformat.as_sld_profile(self.av_sld_profile)
+        av_sld_profile_err = dataformat.as_sld_profile(self.av_sld_profile_err)
         plt.rc('text')
         plt.rc('font', family='serif')
         plt.figure(figsize=(15,10))
-        for i in range(0, len(self.av_sld_profile)):
-            if real:
-                y.append(self.av_sld_profile[i].real)
-                dy.append(self.av_sld_profile_err[i].real)
-            if imag:
-                y.append(self.av_sld_profile[i].imag)
-                dy.append(self.av_sld_profile_err[i].imag)
-            buildx += self.av_sld_profile[i].thick
-            x.append(buildx)
+        if real:
+            y = av_sld_profile.real
+            dy = av_sld_profile_err.real
+        else:
+            y = av_sld_profile.imag
+            dy = av_sld_profile_err.imag
+        x = np.cumsum(av_sld_profile.thick)
         plt.bar(np.asarray(x) - self.assigned_job.layer_thickness/2., np.asarray(y)*1e6, 
                 width=self.assigned_job.layer_thickness, yerr=np.asarray(dy)*1e6, color='w', edgecolor='k')
         plt.ylabel('SLD (10$^{-6}$ \AA$^{-2}$)')
@@ -153,16 +201,147 @@ def get_scatlen(atom, scat_lens):
     ----------
     atom: str
         The name of the atom type that the scattering length is needed for.
-    scat_lens: array_like falass.dataformat.ScatLens
-        The array of the scattering lengths that is defined in the falass.readwrite.Files class.
+    scat_lens: array_like falass.dataformat.ScatLens or falass.dataformat.ScatLenTable
+        The array of the scattering lengths that is defined in the falass.readwrite.Files class, or its table (see
+        falass.readwrite.Files.scat_len_table()), which is a single lookup.
 
     Returns
     -------
     tuple_like
         The real and imaginary scattering lengths for the given atom type.
     """
-    for i in range(0, len(scat_lens)):
-        if atom == scat_lens[i].atom:
-            return scat_lens[i].real, scat_lens[i].imag
+    if isinstance(scat_lens, dataformat.ScatLenTable):
+        if atom in scat_lens:
+            type_id = scat_lens.ids[atom]
+            return scat_lens.real[type_id], scat_lens.imag[type_id]
+    else:
+        for scat_len in scat_lens:
+            if scat_len.atom == atom:
+                return scat_len.real, scat_len.imag
     raise ValueError("Attempt to get the scattering length of the atom type {} failed. This should never happen. "
                      "Please contact the developers".format(atom))
+
+
+def scat_len_table(scat_lens):
+    """Scattering length table.
+
+    Parameters
+    ----------
+    scat_lens: array_like falass.dataformat.ScatLens or falass.dataformat.ScatLenTable
+        The scattering lengths of the atom types.
+
+    Returns
+    -------
+    falass.dataformat.ScatLenTable
+        The scattering lengths as a table, a ScatLenTable is returned unchanged.
+    """
+    if isinstance(scat_lens, dataformat.ScatLenTable):
+        return scat_lens
+    return dataformat.ScatLenTable(scat_lens)
+
+
+_worker = {}
+
+
+def _sld_init(source, flip, real_scatlens, imag_scatlens, layer_thickness, cut_off_size, layers):
+    _worker['handle'] = readwrite.open_source(source)
+    _worker['options'] = (flip, real_scatlens, imag_scatlens, layer_thickness, cut_off_size, layers)
+
+
+def _sld_worker(indices):
+    flip, real_scatlens, imag_scatlens, layer_thickness, cut_off_size, layers = _worker['options']
+    return [bin_sld(frame.zpos, real_scatlens, imag_scatlens, frame.cell, layer_thickness, cut_off_size, layers)
+            for frame in readwrite.frames_from_source(_worker['handle'], indices, flip)]
+
+
+def scatlen_arrays(atoms, scat_lens):
+    """Scattering lengths for every atom.
+
+    Maps the atom type names of a frame to arrays of real and imaginary scattering lengths, by encoding the atom types
+    as integer ids of a falass.dataformat.ScatLenTable.
+
+    Parameters
+    ----------
+    atoms: array_like str
+        The atom type name of each atom in the simulation.
+    scat_lens: array_like falass.dataformat.ScatLens or falass.dataformat.ScatLenTable
+        The array of the scattering lengths that is defined in the falass.readwrite.Files class.
+
+    Returns
+    -------
+    array_like
+        The real scattering length of each atom.
+    array_like
+        The imaginary scattering length of each atom.
+    """
+    return scat_len_table(scat_lens).lengths(atoms)
+
+
+def number_of_layers(cell, layer_thickness, cut_off_size):
+    """Common number of layers.
+
+    The number of whole layers that fit in the smallest of the cells, once the cut_off_size has been removed. Where
+    the cell size changes during the simulation (such as at constant pressure), binning every frame with this number
+    of layers gives SLD profiles that may be averaged layer by layer.
+
+    Parameters
+    ----------
+    cell: array_like float
+        The cell dimensions of each of the frames.
+    layer_thickness: float
+        The thickness of the layers.
+    cut_off_size: float
+        The size of the simulation cell that should be ignored from the bottom.
+
+    Returns
+    -------
+    int
+        The number of layers.
+    """
+    z_cut = np.asarray(cell, dtype=np.float64).reshape(-1, 3)[:, 2] - cut_off_size
+    return int(np.min((z_cut / layer_thickness).astype(int)))
+
+
+def bin_sld(zpos, real, imag, cell, layer_thickness, cut_off_size, number_of_bins=None):
+    """Histogram a single frame.
+
+    Sums the scattering lengths of the atoms found in each layer of a single frame and converts these to a scattering
+    length density by division by the volume of the layer. Atoms beyond the last whole layer (i.e. within the
+    cut_off_size) are ignored.
+
+    Parameters
+    ----------
+    zpos: array_like float
+        The z-position of each atom.
+    real: array_like float
+        The real scattering length of each atom.
+    imag: array_like float
+        The imaginary scattering length of each atom.
+    cell: array_like float
+        The cell dimensions of the frame.
+    layer_thickness: float
+        The thickness of the layers.
+    cut_off_size: float
+        The size of the simulation cell that should be ignored from the bottom.
+    number_of_bins: int, optional
+        The number of layers, such as the common number of layers of a trajectory (see number_of_layers()). If not
+        given this is the number of whole layers in this frame. Atoms beyond the last layer are ignored.
+
+    Returns
+    -------
+    array_like
+        The real scattering length density of each layer.
+    array_like
+        The imaginary scattering length density of each layer.
+    """
+    if number_of_bins is None:
+        number_of_bins = int((cell[2] - cut_off_size) / layer_thickness)
+    zpos = np.asarray(zpos)
+    mask = zpos < number_of_bins * layer_thickness
+    bins = (zpos[mask] / layer_thickness).astype(int)
+    keep = bins >= 0
+    bins = bins[keep]
+    real_sld = np.bincount(bins, weights=np.asarray(real)[mask][keep], minlength=number_of_bins)
+    imag_sld = np.bincount(bins, weights=np.asarray(imag)[mask][keep], minlength=number_of_bins)
+    volume = cell[0] * cell[1] * layer_thickness
+    return real_sld / volume, imag_sld / volume
@@ -0,0 +1,329 @@
+import numpy as np
+
+
+class RunningAverage:
+    """Online mean and variance.
+
+    A class for the incremental calculation of the mean and variance of a quantity (such as an SLD or reflectometry
+    profile) as each frame is produced, using the Welford algorithm. Only the current mean and sum of squared
+    deviations are held, so the memory used does not grow with the number of frames, and the averages may be read at
+    any point.
+    """
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self.m2 = None
+
+    def update(self, values):
+        """Add a frame.
+
+        Updates the mean and sum of squared deviations with the values from a single frame.
+
+        Parameters
+        ----------
+        values: array_like float
+            The values for the frame.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if self.count == 0:
+            self.mean = np.zeros_like(values)
+            self.m2 = np.zeros_like(values)
+        self._check_shape(values.shape)
+        self.count += 1
+        delta = values - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (values - self.mean)
+
+    def update_batch(self, values):
+        """Add many frames.
+
+        Updates the mean and sum of squared deviations with the values from a number of frames at once, by merging
+        the statistics of the batch with those already held.
+
+        Parameters
+        ----------
+        values: array_like float
+            The values for each frame, where the first axis is the frame.
+        """
+        values = np.asarray(values, dtype=np.float64)
+        count = values.shape[0]
+        if count == 0:
+            return
+        mean = np.mean(values, axis=0)
+        m2 = np.sum(np.square(values - mean), axis=0)
+        if self.count == 0:
+            self.count = count
+            self.mean = mean
+            self.m2 = m2
+            return
+        self._check_shape(mean.shape)
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (count / total)
+        self.m2 = self.m2 + m2 + np.square(delta) * (self.count * count / total)
+        self.count = total
+
+    def _check_shape(self, shape):
+        if shape != self.mean.shape:
+            raise ValueError("The values of a frame have the shape {}, but those of the earlier frames have the shape "
+                             "{}, each frame must have the same number of values (such as layers or q-vectors)."
+                             .format(shape, self.mean.shape))
+
+    def variance(self, ddof=1):
+        """Variance.
+
+        Parameters
+        ----------
+        ddof: int, optional
+            The delta degrees of freedom, the variance is the sum of squared deviations divided by count - ddof.
+
+        Returns
+        -------
+        array_like float
+            The variance of the frames added so far.
+        """
+        if self.count - ddof <= 0:
+            return np.full_like(self.mean, np.nan)
+        return self.m2 / (self.count - ddof)
+
+    def std(self, ddof=1):
+        """Standard deviation.
+
+        Parameters
+        ----------
+        ddof: int, optional
+            The delta degrees of freedom, see variance().
+
+        Returns
+        -------
+        array_like float
+            The standard deviation of the frames added so far.
+        """
+        return np.sqrt(self.variance(ddof))
+
+
+def window_mean(values, window, step=1):
+    """Sliding window means.
+
+    The mean of each window of consecutive frames, found for all of the windows at once from the cumulative sum over
+    the frames, such that the cost does not depend on the window length.
+
+    Parameters
+    ----------
+    values: array_like float
+        The values for each frame, where the first axis is the frame.
+    window: int
+        The number of frames in each window.
+    step: int, optional
+        The number of frames between the starts of consecutive windows.
+
+    Returns
+    -------
+    array_like float
+        The mean of each window, where the first axis is the window.
+    array_like int
+        The index of the first frame of each window.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if window < 1 or step < 1:
+        raise ValueError("The window and step must be at least one frame.")
+    if window > values.shape[0]:
+        raise ValueError("The window of {} frames is longer than the {} frames available.".format(window,
+                                                                                                   values.shape[0]))
+    total = np.zeros((values.shape[0] + 1,) + values.shape[1:])
+    np.cumsum(values, axis=0, out=total[1:])
+    starts = np.arange(0, values.shape[0] - window + 1, step)
+    return (total[starts + window] - total[starts]) / window, starts
+
+
+def block_standard_errors(values, min_blocks=4):
+    """Block averaging.
+
+    The standard error of the mean of correlated frames by the blocking method of Flyvbjerg and Petersen. The frames
+    are repeatedly averaged in pairs (blocks of 1, 2, 4, ... frames), and at each level the standard error of the
+    mean is estimated as though the blocks were independent. Once the blocks are longer than the correlation time the
+    estimate stops increasing. All of the columns (such as layers or q-vectors) are blocked together.
+
+    Parameters
+    ----------
+    values: array_like float
+        The values for each frame, where the first axis is the frame.
+    min_blocks: int, optional
+        The smallest number of blocks at which the estimate is found.
+
+    Returns
+    -------
+    array_like float
+        The estimate of the standard error of the mean at each level, where the first axis is the level.
+    array_like float
+        The uncertainty of each estimate.
+    array_like int
+        The number of frames in a block at each level.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    errors = []
+    deltas = []
+    sizes = []
+    size = 1
+    while values.shape[0] >= min_blocks:
+        n = values.shape[0]
+        error = np.sqrt(np.var(values, axis=0) / (n - 1))
+        errors.append(error)
+        deltas.append(error / np.sqrt(2 * (n - 1)))
+        sizes.append(size)
+        values = 0.5 * (values[0:n - n % 2:2] + values[1:n:2])
+        size *= 2
+    if len(errors) == 0:
+        raise ValueError("At least {} frames are needed for block averaging.".format(min_blocks))
+    return np.array(errors), np.array(deltas), np.array(sizes)
+
+
+def block_error(values, min_blocks=4):
+    """Block averaged standard error of the mean.
+
+    The standard error of the mean of correlated frames, taken from block_standard_errors() at the first level where
+    the estimate has reached a plateau, that is where the estimate at the next level is not larger by more than its
+    uncertainty. If no plateau is reached the estimate of the last level is used, which is then a lower bound.
+
+    Parameters
+    ----------
+    values: array_like float
+        The values for each frame, where the first axis is the frame.
+    min_blocks: int, optional
+        The smallest number of blocks at which the estimate is found.
+
+    Returns
+    -------
+    array_like float
+        The standard error of the mean for each column.
+    """
+    errors, deltas, sizes = block_standard_errors(values, min_blocks)
+    plateau = np.zeros(errors.shape, dtype=bool)
+    plateau[:-1] = errors[1:] <= errors[:-1] + deltas[:-1]
+    plateau[-1] = True
+    level = np.argmax(plateau, axis=0)
+    return np.take_along_axis(errors, level[np.newaxis], axis=0)[0]
+
+
+def autocorrelation(values):
+    """Normalised autocorrelation function.
+
+    The autocorrelation of each column over the frames, found with a fast Fourier transform, and normalised to one at
+    zero lag. Columns that do not change are taken to be uncorrelated.
+
+    Parameters
+    ----------
+    values: array_like float
+        The values for each frame, where the first axis is the frame.
+
+    Returns
+    -------
+    array_like float
+        The autocorrelation at each lag, where the first axis is the lag.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n = values.shape[0]
+    centred = values - np.mean(values, axis=0)
+    size = 1 << int(2 * n - 1).bit_length()
+    transform = np.fft.rfft(centred, n=size, axis=0)
+    acf = np.fft.irfft(transform * np.conj(transform), n=size, axis=0)[:n]
+    variance = acf[0]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        acf = np.where(variance > 0, acf / variance, 0.)
+    acf[0] = 1.
+    return acf
+
+
+def integrated_autocorrelation_time(values, c=5.):
+    """Integrated autocorrelation time.
+
+    The integrated autocorrelation time, tau = 1 + 2 sum rho(t), in frames, of each column, where the sum of the
+    autocorrelation (see autocorrelation()) is cut off with the automatic window of Sokal, at the smallest lag M for
+    which M >= c tau(M). For independent frames tau is 1.
+
+    Parameters
+    ----------
+    values: array_like float
+        The values for each frame, where the first axis is the frame.
+    c: float, optional
+        The window constant, larger values reduce the bias but increase the noise.
+
+    Returns
+    -------
+    array_like float
+        The integrated autocorrelation time of each column.
+    """
+    acf = autocorrelation(values)
+    taus = 2 * np.cumsum(acf, axis=0) - 1
+    lags = np.arange(acf.shape[0]).reshape((-1,) + (1,) * (acf.ndim - 1))
+    window = lags >= c * taus
+    window[-1] = True
+    m = np.argmax(window, axis=0)
+    return np.maximum(np.take_along_axis(taus, np.expand_dims(m, 0), axis=0)[0], 1.)
+
+
+def effective_sample_size(values, c=5.):
+    """Effective sample size.
+
+    The number of independent frames that would give the same uncertainty in the mean as the correlated frames, the
+    number of frames divided by the integrated autocorrelation time. Keeping one in every tau frames loses little of
+    the statistical power, so this tells how far the trajectory may be thinned.
+
+    Parameters
+    ----------
+    values: array_like float
+        The values for each frame, where the first axis is the frame.
+    c: float, optional
+        The window constant, see integrated_autocorrelation_time().
+
+    Returns
+    -------
+    array_like float
+        The effective sample size of each column.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    return values.shape[0] / integrated_autocorrelation_time(values, c)
+
+
+def autocorrelation_error(values, c=5.):
+    """Autocorrelation corrected standard error of the mean.
+
+    The standard error of the mean of correlated frames, sqrt(var tau / n) where tau is the integrated
+    autocorrelation time (see integrated_autocorrelation_time()).
+
+    Parameters
+    ----------
+    values: array_like float
+        The values for each frame, where the first axis is the frame.
+    c: float, optional
+        The window constant, see integrated_autocorrelation_time().
+
+    Returns
+    -------
+    array_like float
+        The standard error of the mean for each column.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    return np.sqrt(np.var(values, axis=0, ddof=1) / effective_sample_size(values, c))
+
+
+def correlated_error(values, method='block'):
+    """Standard error of the mean of correlated frames.
+
+    Parameters
+    ----------
+    values: array_like float
+        The values for each frame, where the first axis is the frame.
+    method: str, optional
+        Either 'block' for block_error() or 'autocorrelation' for autocorrelation_error().
+
+    Returns
+    -------
+    array_like float
+        The standard error of the mean for each column.
+    """
+    if method == 'block':
+        return block_error(values)
+    if method == 'autocorrelation':
+        return autocorrelation_error(values)
+    raise ValueError("The error method must be either 'std', 'block' or 'autocorrelation'.")
@@ -0,0 +1,75 @@
+from numpy.testing import assert_equal, assert_almost_equal
+from falass import adaptive, dataformat, job, readwrite, reflect, sld
+import numpy as np
+import os
+import tempfile
+import unittest
+
+
+def write_pdb(filename, frames, seed=0):
+    rng = np.random.RandomState(seed)
+    with open(filename, 'w') as f:
+        for k in range(0, frames):
+            f.write('TITLE     falass test t= {:.5f}\n'.format(k * 10.))
+            f.write('CRYST1   10.000   10.000   20.000  90.00  90.00  90.00 P 1           1\n')
+            f.write('MODEL     {:4d}\n'.format(k + 1))
+            zpos = np.clip(np.array([5., 8., 10., 12., 15.] * 4) + rng.normal(0., 0.3, 20), 0., 19.999)
+            for i in range(0, 20):
+                f.write('ATOM  {:5d}  C{}  TEST    1       5.000   5.000{:8.3f}  1.00  0.00\n'.format(
+                    i + 1, i % 3 + 1, zpos[i]))
+            f.write('TER\nENDMDL\n')
+
+
+class TestAdaptive(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        self.directory = tempfile.TemporaryDirectory()
+        self.pdbfile = os.path.join(self.directory.name, 'adaptive.pdb')
+        write_pdb(self.pdbfile, 200)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def make_job(self):
+        files = readwrite.Files(self.pdbfile, lgtfile=os.path.join(self.path, 'test.lgt'))
+        files.read_pdb()
+        files.read_lgt()
+        files.get_qs(0.01, 0.3, 30)
+        assigned_job = job.Job(files, 1., 0., interactive=False)
+        assigned_job.set_lgts()
+        assigned_job.set_times()
+        return assigned_job
+
+    def test_adaptive_average(self):
+        assigned_job = self.make_job()
+        profiles, reflectometry, history = adaptive.adaptive_average(assigned_job, assigned_job.files.expdata,
+                                                                     tolerance=1e-2, batch=10, min_frames=20)
+        number = len(profiles.sld_profile)
+        assert_equal(number < 200, True)
+        assert_equal(number, int(history[-1, 0]))
+        assert_equal(history[-1, 1] < 1e-2, True)
+        assert_equal(np.all(history[:-1, 1] >= 1e-2), True)
+        assert_equal(np.all(np.diff(assigned_job.times) > 0), True)
+        assert_equal(assigned_job.times.size, number)
+        # the same as analysing the chosen frames directly
+        direct = sld.SLD(assigned_job)
+        direct.get_sld_profile()
+        assert_almost_equal(profiles.sld_profile.real, direct.sld_profile.real)
+        refl = reflect.Reflect(direct.sld_profile, assigned_job.files.expdata)
+        refl.calc_ref()
+        assert_almost_equal(reflectometry.reflect.i, refl.reflect.i)
+        assert_almost_equal(reflectometry.running_average.mean, np.mean(refl.reflect.i, axis=0))
+
+    def test_adaptive_average_chi2(self):
+        assigned_job = self.make_job()
+        q = assigned_job.files.expdata.q
+        profiles = sld.SLD(assigned_job)
+        profiles.get_sld_profile()
+        average = reflect.convolution(assigned_job.files.expdata, profiles.sld_profile[0])
+        average = average * (1 + 0.05 * np.random.RandomState(1).normal(size=q.size))
+        exp_data = dataformat.QDataTable(q, average, 0.1 * average, 0.05 * q)
+        profiles, reflectometry, history = adaptive.adaptive_average(assigned_job, exp_data, tolerance=1e-9)
+        assert_equal(len(profiles.sld_profile), 200)
+        assert_equal(history.shape, (18, 2))
+        with self.assertRaises(ValueError):
+            adaptive.adaptive_average(assigned_job, exp_data, tolerance=0.)
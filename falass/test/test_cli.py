@@ -0,0 +1,44 @@
+from numpy.testing import assert_equal
+from falass import cli
+from io import StringIO
+import os
+import sys
+import tempfile
+import unittest
+
+
+class TestCli(unittest.TestCase):
+    def test_parse_override(self):
+        assert_equal(cli.parse_override('job.times=[0, 100, 10]'), ('job', 'times', [0, 100, 10]))
+        assert_equal(cli.parse_override('files.flip=true'), ('files', 'flip', True))
+        assert_equal(cli.parse_override('files.pdbfile=a.pdb'), ('files', 'pdbfile', 'a.pdb'))
+        with self.assertRaises(ValueError):
+            cli.parse_override('flip=true')
+
+    def test_main(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'config.toml')
+            with open(filename, 'w') as f:
+                f.write('[files]\npdbfile = "{0}/test.pdb"\nlgtfile = "{0}/test.lgt"\n[job]\nlayer_thickness = 1.0\n'
+                        'cut_off_size = 0.0\n'.format(self.path.replace('\\', '/')))
+            assert_equal(cli.main(['run', filename]), 0)
+            assert_equal(os.path.isfile(os.path.join(directory, 'reflect.txt')), True)
+            assert_equal(os.path.isfile(os.path.join(directory, 'checkpoints', 'manifest.json')), True)
+            assert_equal(cli.main(['run', filename, '--restart']), 0)
+            log = os.path.join(directory, 'falass.log')
+            captured_output = StringIO()
+            sys.stdout = captured_output
+            try:
+                assert_equal(cli.main(['run', filename, '--restart', '--log', log]), 0)
+            finally:
+                sys.stdout = sys.__stdout__
+            with open(log) as f:
+                text = f.read()
+            assert_equal('pipeline.sld: finished in' in text, True)
+            assert_equal(' INFO sld: ' in text, True)
+            assert_equal(' INFO Calculating SLD profile' in text, True)
+            # the messages go to the log rather than stdout
+            assert_equal(captured_output.getvalue(), '')
+            assert_equal(cli.main(['run', filename, '--set', 'job.times=[5.0, 20000.0, 10000.0]']), 1)
+            assert_equal(cli.main(['run', os.path.join(directory, 'missing.toml')]), 1)
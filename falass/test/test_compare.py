@@ -1,5 +1,6 @@
-from numpy.testing import assert_almost_equal
+from numpy.testing import assert_equal, assert_almost_equal
 from falass import compare, dataformat, reflect
+from scipy.optimize import curve_fit
 import numpy as np
 import unittest
 
@@ -120,6 +121,80 @@ class TestCompare(unittest.TestCase):
         assert_almost_equal(a.sim_data_fitted[1].di, 0.4)
         assert_almost_equal(a.sim_data_fitted[2].di, 0.6)
 
+    def test_fit(self):
+        q = np.linspace(0.01, 0.5, 50)
+        sim = 1e-7 / np.power(q, 4) * np.square(1 + 0.3 * np.random.RandomState(0).normal(size=50)) + 1e-8
+        exp = (0.8 * sim * np.power(q, 4) + 2e-7) / np.power(q, 4)
+        exp_data = dataformat.QDataTable(q, exp, 0.05 * exp, 0.05 * q)
+        a = compare.Compare(exp_data, dataformat.QDataTable(q, sim, np.zeros(50), 0.05 * q), 1., 0.)
+        a.fit()
+        assert_almost_equal(a.scale, 0.8)
+        assert_almost_equal(a.background / 2e-7, 1.)
+        assert_almost_equal(a.chi2, 0.)
+        popt, pcov = curve_fit(compare.scale_and_background, sim * np.power(q, 4), exp * np.power(q, 4),
+                               sigma=exp_data.di * np.power(q, 4), bounds=((0.9, 0), (np.inf, np.inf)))
+        a.fit(bounds=((0.9, 0), (np.inf, np.inf)))
+        assert_almost_equal(a.scale, popt[0])
+        assert_almost_equal(a.background / popt[1], 1.)
+
+    def test_fit_scale_and_background(self):
+        q = np.array([0.1, 0.2, 0.3, 0.4])
+        exp_data = dataformat.QDataTable(q, 2. / np.power(q, 4), 0.1 / np.power(q, 4), 0.05 * q)
+        sim = np.array([1., 2., 3., 4.]) / np.power(q, 4)
+        scale, background, chi2 = compare.fit_scale_and_background(exp_data, sim)
+        assert_almost_equal(scale, 1e-100)
+        assert_almost_equal(background, 2.)
+        assert_almost_equal(chi2, 0.)
+        exp_data = dataformat.QDataTable(q, (np.array([1., 2., 3., 4.]) - 1.) / np.power(q, 4),
+                                         0.1 * np.ones(4) / np.power(q, 4), 0.05 * q)
+        scale, background, chi2 = compare.fit_scale_and_background(exp_data, sim)
+        assert_almost_equal(background, 0.)
+        assert_almost_equal(scale, 2. / 3.)
+        assert_almost_equal(chi2, np.sum(np.square((2. / 3. * np.array([1., 2., 3., 4.]) - [0., 1., 2., 3.]) / 0.1)))
+        scale, background, chi2 = compare.fit_scale_and_background(exp_data, sim, ((0, -np.inf), (np.inf, np.inf)))
+        assert_almost_equal(scale, 1.)
+        assert_almost_equal(background, -1.)
+        stack = np.array([sim, 2 * sim, -sim])
+        scale, background, chi2 = compare.fit_scale_and_background(exp_data, stack)
+        assert_almost_equal(scale, [2. / 3., 1. / 3., 1e-100])
+        assert_almost_equal(background, [0., 0., 1.5])
+
+    def test_fit_frames(self):
+        q = np.linspace(0.01, 0.5, 20)
+        sim = 1e-7 / np.power(q, 4) + 1e-8
+        exp_data = dataformat.QDataTable(q, 0.5 * sim + 1e-7 / np.power(q, 4), 0.05 * sim, 0.05 * q)
+        stack = dataformat.QDataStack(q, np.array([sim, 0.5 * sim]), dq=0.05 * q)
+        a = compare.Compare(exp_data, stack[0], 1., 0.)
+        scale, background, chi2 = a.fit_frames(stack)
+        assert_almost_equal(scale, [0.5, 1.])
+        assert_almost_equal(background / 1e-7, [1., 1.])
+        assert_almost_equal(chi2, [0., 0.])
+        assert_almost_equal(a.scale, 1.)
+        a.fit()
+        assert_almost_equal(a.scale, 0.5)
+
+    def test_fit_series(self):
+        q = np.linspace(0.01, 0.5, 20)
+        rng = np.random.RandomState(0)
+        sim = (1e-7 / np.power(q, 4) + 1e-8) * (1 + 0.2 * rng.normal(size=(7, 1))) * (1 + 0.01 * rng.normal(
+            size=(7, 20)))
+        exp_data = dataformat.QDataTable(q, 1e-7 / np.power(q, 4) + 2e-8, 5e-9 / np.power(q, 4), 0.05 * q)
+        stack = dataformat.QDataStack(q, sim, dq=0.05 * q)
+        a = compare.Compare(exp_data, stack[0], 1., 0.)
+        times, scale, background, chi2 = a.fit_series(stack)
+        assert_almost_equal(times, np.arange(7))
+        assert_almost_equal(chi2, a.fit_frames(stack)[2])
+        times, scale, background, chi2 = a.fit_series(stack, window=3, step=2, times=np.arange(7) * 10.)
+        assert_almost_equal(times, [10., 30., 50.])
+        for j, start in enumerate([0, 2, 4]):
+            b = compare.Compare(exp_data, dataformat.QDataTable(q, np.mean(sim[start:start + 3], axis=0)), 1., 0.)
+            b.fit()
+            assert_almost_equal(scale[j], b.scale)
+            assert_almost_equal(chi2[j] / compare.fit_scale_and_background(exp_data, b.sim_data.i)[2], 1.)
+        assert_equal(a.series[3] is chi2, True)
+        with self.assertRaises(ValueError):
+            a.fit_series([])
+
     def test_scale_and_background(self):
         a = np.array([1., 2., 3.])
         scale = 2.
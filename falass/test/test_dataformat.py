@@ -1,4 +1,4 @@
-from numpy.testing import assert_equal
+from numpy.testing import assert_equal, assert_almost_equal
 from falass import dataformat
 import unittest
 
@@ -36,4 +36,97 @@ class TestAtom3Position(unittest.TestCase):
         assert_equal(a.atom, 'C1')
         assert_equal(a.x, 2.)
         assert_equal(a.y, 3.)
-        assert_equal(a.z, 4.)
\ No newline at end of file
+        assert_equal(a.z, 4.)
+
+
+class TestQDataTable(unittest.TestCase):
+    def test_qdatatable(self):
+        a = dataformat.QDataTable([1., 2.], [3., 4.], [5., 6.], [7., 8.])
+        assert_equal(len(a), 2)
+        assert_equal(a.q, [1., 2.])
+        assert_equal(a[1].q, 2.)
+        assert_equal(a[1].i, 4.)
+        assert_equal(a[1].di, 6.)
+        assert_equal(a[1].dq, 8.)
+        assert_equal(a[:1].q, [1.])
+
+    def test_qdatatable_noi(self):
+        a = dataformat.QDataTable([1., 2.], dq=[7., 8.])
+        assert_equal(a.i, None)
+        assert_equal(a[0].i, None)
+        assert_equal(a[0].dq, 7.)
+
+    def test_as_qdata_table(self):
+        a = dataformat.as_qdata_table([dataformat.QData(1., 2., 3., 4.), dataformat.QData(5., 6., 7., 8.)])
+        assert_equal(a.q, [1., 5.])
+        assert_equal(a.i, [2., 6.])
+        assert_equal(a.di, [3., 7.])
+        assert_equal(a.dq, [4., 8.])
+        b = dataformat.as_qdata_table([dataformat.QData(1., None, None, 4.)])
+        assert_equal(b.i, None)
+
+class TestQDataStack(unittest.TestCase):
+    def test_as_qdata_stack(self):
+        frame1 = [dataformat.QData(1., 2., 0., 4.), dataformat.QData(5., 6., 0., 8.)]
+        frame2 = [dataformat.QData(1., 3., 0., 4.), dataformat.QData(5., 7., 0., 8.)]
+        a = dataformat.as_qdata_stack([frame1, frame2])
+        assert_equal(len(a), 2)
+        assert_equal(a.i, [[2., 6.], [3., 7.]])
+        assert_equal(a[1][0].i, 3.)
+        assert_equal(a[1][1].q, 5.)
+
+    def test_qdata_stack_empty(self):
+        a = dataformat.QDataStack([1., 2.], [])
+        assert_equal(len(a), 0)
+        assert_equal(a.di.shape, (0, 0))
+
+
+class TestSLDProfileStack(unittest.TestCase):
+    def test_as_sld_stack(self):
+        frame1 = [dataformat.SLDPro(1., 2., 0.), dataformat.SLDPro(1., 3., 1.)]
+        frame2 = dataformat.SLDProfile([1., 1.], [4., 5.], [0., 2.])
+        a = dataformat.as_sld_stack([frame1, frame2])
+        assert_equal(len(a), 2)
+        assert_equal(a.real, [[2., 3.], [4., 5.]])
+        assert_equal(a.imag, [[0., 1.], [0., 2.]])
+        assert_equal(len(a[0]), 2)
+        assert_equal(a[1][1].real, 5.)
+        assert_equal(a[1][1].thick, 1.)
+
+    def test_as_sld_stack_ragged(self):
+        frame1 = [dataformat.SLDPro(1., 2., 0.), dataformat.SLDPro(1., 3., 1.)]
+        frame2 = [dataformat.SLDPro(1., 2., 0.)]
+        with self.assertRaises(ValueError):
+            dataformat.as_sld_stack([frame1, frame2])
+
+    def test_as_sld_stack_empty(self):
+        a = dataformat.as_sld_stack([])
+        assert_equal(len(a), 0)
+        assert_equal(a.real.shape, (0, 0))
+        assert_equal(len(dataformat.SLDProfileStack([[]], [[]], [[]])), 1)
+
+    def test_atompositionsstack(self):
+        a = dataformat.AtomPositionsStack(['C1', 'C2'], [[1., 2.], [3., 4.], [5., 6.]])
+        assert_equal(len(a), 3)
+        assert_equal(a[1][0].atom, 'C1')
+        assert_equal(a[1][1].zpos, 4.)
+        assert_equal(len(a[1:]), 2)
+        assert_equal([len(frame) for frame in a], [2, 2, 2])
+
+    def test_scatlentable(self):
+        a = dataformat.ScatLenTable([dataformat.ScatLens('C1', 1., 0.), dataformat.ScatLens('C2', 2., 1.),
+                                     dataformat.ScatLens('C1', 5., 5.)])
+        assert_equal(len(a), 2)
+        assert_equal('C2' in a, True)
+        assert_equal(a.add(dataformat.ScatLens('C3', 3., 0.)), True)
+        assert_equal(a.add(dataformat.ScatLens('C3', 4., 0.)), False)
+        assert_almost_equal(a.real, [1e-5, 2e-5, 3e-5])
+        # the arrays are kept rather than rebuilt on each access
+        assert_equal(a.real is a.real, True)
+        assert_equal(a.encode(['C3', 'C1', 'C3', 'C2']), [2, 0, 2, 1])
+        real, imag = a.lengths(['C3', 'C2'])
+        assert_almost_equal(real, [3e-5, 2e-5])
+        assert_almost_equal(imag, [0., 1e-5])
+        assert_equal(a.missing(['C1', 'O', 'C2', 'N', 'O']), ['O', 'N'])
+        with self.assertRaises(ValueError):
+            a.encode(['C1', 'O'])
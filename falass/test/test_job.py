@@ -1,7 +1,10 @@
 from numpy.testing import assert_equal
-from falass import readwrite, job
+from falass import readwrite, job, progress
+import numpy as np
 import os
+import tempfile
 import unittest
+from unittest import mock
 
 class TestJob(unittest.TestCase):
     def test_job(self):
@@ -44,6 +47,39 @@ class TestJob(unittest.TestCase):
         b.set_lgts()
         assert_equal(b.new_file, False)
 
+    def test_set_lgts_missing(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        with tempfile.TemporaryDirectory() as directory:
+            lgtfile = os.path.join(directory, 'test.lgt')
+            with open(lgtfile, 'w') as f:
+                f.write('C1 1.0 0.0\n')
+            a = readwrite.Files(os.path.join(self.path, 'test.pdb'), lgtfile=lgtfile)
+            a.read_pdb()
+            a.read_lgt()
+            b = job.Job(a, 1., 5.)
+            with mock.patch('builtins.input', side_effect=['2.0', '1.0', '3.0', '2.0']):
+                b.set_lgts()
+            assert_equal(b.new_file, True)
+            assert_equal([scat_len.atom for scat_len in a.scat_lens], ['C1', 'C2', 'C3'])
+            assert_equal(os.path.isfile(os.path.join(directory, 'test_1.lgt')), True)
+
+    def test_set_lgts_no_file(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        with tempfile.TemporaryDirectory() as directory:
+            a = readwrite.Files(os.path.join(self.path, 'test.pdb'))
+            a.read_pdb()
+            b = job.Job(a, 1., 5.)
+            recorder = progress.Recorder()
+            previous = progress.set_reporter(recorder)
+            try:
+                with mock.patch('builtins.input', side_effect=['1.0', '0.0', '2.0', '1.0', '3.0', '2.0',
+                                                               os.path.join(directory, 'new')]):
+                    b.set_lgts()
+            finally:
+                progress.set_reporter(previous)
+            assert_equal(recorder.messages[0].startswith('There was no lgt file defined'), True)
+            assert_equal(os.path.isfile(os.path.join(directory, 'new.lgt')), True)
+
     def test_set_times(self):
         self.path = os.path.dirname(os.path.abspath(__file__))
         a = readwrite.Files(os.path.join(self.path, 'test.pdb'), lgtfile=os.path.join(self.path, 'test.lgt'))
@@ -54,6 +90,36 @@ class TestJob(unittest.TestCase):
         assert_equal(len(b.times), 3)
         assert_equal(b.times, [0., 10000., 20000.])
 
+    def test_set_lgts_not_interactive(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        with tempfile.TemporaryDirectory() as directory:
+            lgtfile = os.path.join(directory, 'test.lgt')
+            with open(lgtfile, 'w') as f:
+                f.write('C1 1.0 0.0\n')
+            a = readwrite.Files(os.path.join(self.path, 'test.pdb'), lgtfile=lgtfile)
+            a.read_pdb()
+            a.read_lgt()
+            b = job.Job(a, 1., 5., interactive=False)
+            with mock.patch('builtins.input', side_effect=AssertionError):
+                with self.assertRaises(ValueError):
+                    b.set_lgts()
+            assert_equal(os.listdir(directory), ['test.lgt'])
+
+    def test_set_times_not_interactive(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        a = readwrite.Files(os.path.join(self.path, 'test.pdb'), lgtfile=os.path.join(self.path, 'test.lgt'))
+        a.read_pdb()
+        b = job.Job(a, 1., 5., interactive=False)
+        with mock.patch('builtins.input', side_effect=AssertionError):
+            b.set_times()
+            assert_equal(b.times, [0., 10000., 20000., 30000., 40000., 50000.])
+            b.set_times([10000., 30000., 10000.])
+            assert_equal(b.times, [10000., 20000., 30000.])
+            for times in [[5., 30000., 10000.], [10000., 35000., 10000.], [30000., 10000., 10000.],
+                          [0., 30000., 0.], [0., 30000.]]:
+                with self.assertRaises(ValueError):
+                    b.set_times(times)
+
     def test_check_array_true(self):
         array = [0, 1, 2, 3, 4]
         check = 1
@@ -65,3 +131,9 @@ class TestJob(unittest.TestCase):
         check = 6
         bool_ret = job.check_array(array, check)
         assert_equal(bool_ret, False)
+
+    def test_coarse_to_fine(self):
+        assert_equal(job.coarse_to_fine(11), [0, 8, 4, 2, 6, 10, 1, 3, 5, 7, 9])
+        assert_equal(np.sort(job.coarse_to_fine(100)), np.arange(100))
+        assert_equal(job.coarse_to_fine(1), [0])
+        assert_equal(job.coarse_to_fine(0).size, 0)
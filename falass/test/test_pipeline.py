@@ -0,0 +1,182 @@
+from numpy.testing import assert_equal, assert_almost_equal
+from falass import adaptive, compare, pipeline, readwrite, job, sld, reflect
+import numpy as np
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+
+class TestPipeline(unittest.TestCase):
+    def write_config(self, directory, text, name='config.toml'):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        filename = os.path.join(directory, name)
+        with open(filename, 'w') as f:
+            f.write(text.format(path=self.path.replace('\\', '/')))
+        return filename
+
+    def test_load_config(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = self.write_config(directory, '[files]\npdbfile = "{path}/test.pdb"\nlgtfile = "test.lgt"\n'
+                                                    'flip = true\n[job]\nlayer_thickness = 1.0\ncut_off_size = 0.0\n')
+            config = pipeline.load_config(filename, {'job': {'times': [0., 20000., 10000.]}})
+            assert_equal(config['files']['pdbfile'], os.path.join(self.path, 'test.pdb'))
+            assert_equal(config['files']['lgtfile'], os.path.join(directory, 'test.lgt'))
+            assert_equal(config['files']['flip'], True)
+            assert_equal(config['job']['times'], [0., 20000., 10000.])
+            assert_equal(config['sld']['processes'], 1)
+            assert_equal(config['output']['directory'], directory)
+
+    def test_load_config_json(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = self.write_config(directory, '{{"files": {{"pdbfile": "a.pdb", "lgtfile": "a.lgt"}}, '
+                                                    '"job": {{"layer_thickness": 1, "cut_off_size": 0}}}}',
+                                         name='config.json')
+            config = pipeline.load_config(filename)
+            assert_equal(config['files']['pdbfile'], os.path.join(directory, 'a.pdb'))
+
+    def test_check_config_errors(self):
+        config = {'files': {'pdbfile': 'a.pdb', 'lgtfile': 'a.lgt'}, 'job': {'layer_thickness': 1.,
+                                                                             'cut_off_size': 0.}}
+        pipeline.check_config(config)
+        for section, values in [('files', {'pdbfile': None}), ('jobs', {}), ('job', {'thickness': 1.}),
+                                ('reflect', {'method': 'other'}), ('sld', {'store': False}),
+                                ('compare', {'window': 2}), ('compare', {'window': 2, 'scale': 1.}),
+                                ('adaptive', {'tolerance': 1e-3})]:
+            bad = {key: dict(value) for key, value in config.items()}
+            bad.setdefault(section, {}).update(values)
+            if section in ('compare', 'adaptive'):
+                bad['reflect'] = {'store': False} if 'scale' in values else {'method': 'profile'}
+            with self.assertRaises(ValueError):
+                pipeline.check_config(bad)
+
+    def test_run(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = self.write_config(directory, '[files]\npdbfile = "{path}/test.pdb"\n'
+                                                    'lgtfile = "{path}/test.lgt"\ndatfile = "{path}/test3.dat"\n'
+                                                    '[job]\nlayer_thickness = 1.0\ncut_off_size = 0.0\n'
+                                                    'times = [0.0, 20000.0, 10000.0]\n'
+                                                    '[output]\ndirectory = "out"\n')
+            results = pipeline.run(pipeline.load_config(filename))
+            # the same as the interactive steps
+            a = readwrite.Files(os.path.join(self.path, 'test.pdb'), lgtfile=os.path.join(self.path, 'test.lgt'),
+                                datfile=os.path.join(self.path, 'test3.dat'))
+            a.read_pdb()
+            a.read_lgt()
+            a.read_dat()
+            b = job.Job(a, 1., 0.)
+            b.set_times([0., 20000., 10000.])
+            c = sld.SLD(b)
+            c.get_sld_profile()
+            d = reflect.Reflect(c.sld_profile, a.expdata)
+            d.calc_ref()
+            d.average_ref()
+            assert_almost_equal(results['reflect'].averagereflect.i, d.averagereflect.i)
+            assert_equal(len(results['sld'].sld_profile), 3)
+            written = np.loadtxt(os.path.join(directory, 'out', 'reflect.txt'))
+            assert_almost_equal(written[:, 1], d.averagereflect.i)
+            assert_equal(os.path.isfile(os.path.join(directory, 'out', 'sld.txt')), True)
+            assert_equal(os.path.isfile(os.path.join(directory, 'out', 'fitted.txt')), True)
+            assert_equal(results['compare'] is not None, True)
+            # merging the identical layers does not change the reflectometry
+            config = pipeline.load_config(filename, {'reflect': {'merge': 0.}})
+            merged = pipeline.run(config)
+            assert_almost_equal(merged['reflect'].averagereflect.i / d.averagereflect.i, 1.)
+            assert_almost_equal(merged['reflect'].merge_change, 0.)
+
+    def test_run_adaptive(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = self.write_config(directory, '[files]\npdbfile = "{path}/test.pdb"\n'
+                                                    'lgtfile = "{path}/test.lgt"\ndatfile = "{path}/test3.dat"\n'
+                                                    '[job]\nlayer_thickness = 1.0\ncut_off_size = 0.0\n'
+                                                    '[adaptive]\ntolerance = 1e3\nbatch = 2\nmin_frames = 2\n'
+                                                    '[compare]\nwindow = 2\n')
+            first = pipeline.run(pipeline.load_config(filename))
+            # the first batch and one more, from the coarse to fine order 0, 4, 2, 1, 3, 5
+            assert_equal(len(first['sld'].sld_profile), 4)
+            assert_equal(first['job'].times, [0., 10000., 20000., 40000.])
+            assert_equal(len(first['compare'].series[0]), 3)
+            a = readwrite.Files(os.path.join(self.path, 'test.pdb'), lgtfile=os.path.join(self.path, 'test.lgt'),
+                                datfile=os.path.join(self.path, 'test3.dat'))
+            a.read_pdb()
+            a.read_lgt()
+            a.read_dat()
+            b = job.Job(a, 1., 0., interactive=False)
+            b.times = first['job'].times
+            c = sld.SLD(b)
+            c.get_sld_profile()
+            d = reflect.Reflect(c.sld_profile, a.expdata)
+            d.calc_ref()
+            d.average_ref()
+            assert_almost_equal(first['reflect'].averagereflect.i, d.averagereflect.i)
+            assert_almost_equal(first['reflect'].reflect.i, d.reflect.i)
+            with mock.patch.object(adaptive, 'adaptive_average', side_effect=AssertionError):
+                second = pipeline.run(pipeline.load_config(filename))
+            assert_equal(second['job'].times, first['job'].times)
+            assert_almost_equal(second['reflect'].averagereflect.i, first['reflect'].averagereflect.i)
+
+    def test_stage_keys(self):
+        config = pipeline.check_config({'files': {'pdbfile': 'a.pdb', 'lgtfile': 'a.lgt'},
+                                        'job': {'layer_thickness': 1., 'cut_off_size': 0.}})
+        # without input files, only the configuration is hashed
+        config['files'].update({'pdbfile': None, 'lgtfile': None})
+        keys = pipeline.stage_keys(config)
+        config['compare']['fit'] = False
+        assert_equal(pipeline.stage_keys(config)['sld'], keys['sld'])
+        # the compare fit option changes when the adaptive averaging stops, so also the SLD stage
+        config['adaptive']['tolerance'] = 1e-3
+        keys = pipeline.stage_keys(config)
+        config['compare']['fit'] = True
+        changed = pipeline.stage_keys(config)
+        assert_equal(changed['read'], keys['read'])
+        assert_equal(changed['sld'] != keys['sld'], True)
+
+    def test_run_missing_lgt(self):
+        with tempfile.TemporaryDirectory() as directory:
+            lgtfile = os.path.join(directory, 'test.lgt')
+            with open(lgtfile, 'w') as f:
+                f.write('C1 1.0 0.0\n')
+            filename = self.write_config(directory, '[files]\npdbfile = "{path}/test.pdb"\nlgtfile = "test.lgt"\n'
+                                                    '[job]\nlayer_thickness = 1.0\ncut_off_size = 0.0\n')
+            with self.assertRaises(ValueError):
+                pipeline.run(pipeline.load_config(filename))
+            assert_equal(os.path.isfile(os.path.join(directory, 'reflect.txt')), False)
+
+    def test_run_resume(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = self.write_config(directory, '[files]\npdbfile = "{path}/test.pdb"\n'
+                                                    'lgtfile = "{path}/test.lgt"\ndatfile = "{path}/test3.dat"\n'
+                                                    '[job]\nlayer_thickness = 1.0\ncut_off_size = 0.0\n')
+            first = pipeline.run(pipeline.load_config(filename))
+            manifest = pipeline.read_manifest(os.path.join(directory, 'checkpoints'))
+            assert_equal(sorted(manifest), sorted(pipeline.STAGES))
+            # every stage is loaded from the checkpoints
+            with mock.patch.object(readwrite.Files, 'read_pdb', side_effect=AssertionError), \
+                    mock.patch.object(sld.SLD, 'get_sld_profile', side_effect=AssertionError), \
+                    mock.patch.object(reflect.Reflect, 'calc_ref', side_effect=AssertionError):
+                second = pipeline.run(pipeline.load_config(filename))
+                # a change to the fit only runs the compare stage again
+                third = pipeline.run(pipeline.load_config(filename, {'compare': {'scale': 0.5}}))
+            assert_equal(second['sld'].sld_profile.real, first['sld'].sld_profile.real)
+            assert_equal(second['sld'].av_sld_profile.real, first['sld'].av_sld_profile.real)
+            assert_equal(second['reflect'].averagereflect.i, first['reflect'].averagereflect.i)
+            assert_equal(second['reflect'].reflect.i, first['reflect'].reflect.i)
+            assert_almost_equal(second['compare'].scale, first['compare'].scale)
+            assert_almost_equal(second['compare'].sim_data_fitted.i, first['compare'].sim_data_fitted.i)
+            assert_almost_equal(third['compare'].scale, first['compare'].scale)
+            # the goodness of fit through the trajectory is kept in the checkpoint
+            fifth = pipeline.run(pipeline.load_config(filename, {'compare': {'window': 2}}))
+            series = np.loadtxt(os.path.join(directory, 'series.txt'))
+            assert_equal(series.shape, (len(first['reflect'].reflect) - 1, 4))
+            assert_almost_equal(series[:, 3], fifth['compare'].series[3])
+            with mock.patch.object(compare.Compare, 'fit_series', side_effect=AssertionError):
+                sixth = pipeline.run(pipeline.load_config(filename, {'compare': {'window': 2}}))
+            assert_almost_equal(sixth['compare'].series[3], fifth['compare'].series[3])
+            # a change to the layer thickness runs the read and sld stages again
+            with mock.patch.object(sld.SLD, 'get_sld_profile', autospec=True,
+                                   side_effect=sld.SLD.get_sld_profile) as get_sld_profile:
+                fourth = pipeline.run(pipeline.load_config(filename, {'job': {'layer_thickness': 2.0}}))
+                assert_equal(get_sld_profile.call_count, 1)
+                pipeline.run(pipeline.load_config(filename, {'job': {'layer_thickness': 2.0}}), resume=False)
+                assert_equal(get_sld_profile.call_count, 2)
+            assert_equal(fourth['sld'].sld_profile.thick[0, 0], 2.)
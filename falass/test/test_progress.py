@@ -0,0 +1,96 @@
+from numpy.testing import assert_equal
+from falass import progress
+from io import StringIO
+import logging
+import sys
+import unittest
+
+
+class TestProgress(unittest.TestCase):
+    def test_steps(self):
+        recorder = progress.Recorder()
+        prog = progress.Progress('sld', 25, recorder)
+        for i in range(0, 25):
+            prog.update()
+        prog.close()
+        prog.close()
+        assert_equal([event.done for event in recorder.events], [0, 3, 5, 8, 10, 13, 15, 18, 20, 23, 25])
+        assert_equal([event.finished for event in recorder.events], [False] * 10 + [True])
+        assert_equal(recorder.events[-1].stage, 'sld')
+        assert_equal(recorder.events[-1].total, 25)
+
+    def test_batch_update(self):
+        recorder = progress.Recorder()
+        with progress.Progress('reflect', 100, recorder) as prog:
+            prog.update(45)
+            prog.update(55)
+        assert_equal([event.done for event in recorder.events], [0, 45, 100])
+
+    def test_failed(self):
+        recorder = progress.Recorder()
+        with self.assertRaises(ValueError):
+            with progress.Progress('sld', 100, recorder) as prog:
+                prog.update()
+                raise ValueError('failed')
+        assert_equal([event.finished for event in recorder.events], [False])
+        assert_equal(recorder.timings(), {})
+
+    def test_timed(self):
+        recorder = progress.Recorder()
+        with progress.Progress('read', None, recorder) as prog:
+            prog.update()
+        assert_equal(len(recorder.events), 2)
+        assert_equal(list(recorder.timings().keys()), ['read'])
+        assert_equal(recorder.timings()['read'] >= 0, True)
+
+    def test_print_reporter(self):
+        captured_output = StringIO()
+        sys.stdout = captured_output
+        with progress.Progress('sld', 4, progress.PrintReporter()) as prog:
+            for i in range(0, 4):
+                prog.update()
+        with progress.Progress('read', None, progress.PrintReporter()):
+            pass
+        sys.stdout = sys.__stdout__
+        assert_equal(captured_output.getvalue(), '[ 0 % ]\n[## 20 % ]\n[##### 50 % ]\n[####### 70 % ]\n'
+                                                 '[########## 100 % ]\n')
+
+    def test_logging_reporter(self):
+        logger = logging.getLogger('falass.test_progress')
+        with self.assertLogs(logger, logging.INFO) as logs:
+            with progress.Progress('sld', 2, progress.LoggingReporter(logger)) as prog:
+                prog.update(2)
+        assert_equal(len(logs.output), 1)
+        assert_equal(logs.output[0].startswith('INFO:falass.test_progress:sld: 2/2 in'), True)
+
+    def test_message(self):
+        recorder = progress.Recorder()
+        previous = progress.set_reporter(recorder)
+        try:
+            progress.message('Calculating SLD profile')
+            progress.set_reporter(None)
+            progress.message('Calculating reflectometry')
+            progress.set_reporter(lambda event: None)
+            progress.message('Calculating reflectometry')
+        finally:
+            progress.set_reporter(previous)
+        assert_equal(recorder.messages, ['Calculating SLD profile'])
+        logger = logging.getLogger('falass.test_progress')
+        with self.assertLogs(logger, logging.INFO) as logs:
+            progress.LoggingReporter(logger).message('Reading PDB file')
+        assert_equal(logs.output, ['INFO:falass.test_progress:Reading PDB file'])
+
+    def test_set_reporter(self):
+        recorder = progress.Recorder()
+        previous = progress.set_reporter(recorder)
+        try:
+            with progress.progress('sld', 2) as prog:
+                prog.update(2)
+            progress.set_reporter(None)
+            assert_equal(progress.get_reporter(), None)
+            with progress.progress('reflect', 2) as prog:
+                prog.update(2)
+        finally:
+            progress.set_reporter(previous)
+        assert_equal(isinstance(progress.progress('sld', 2), progress.Progress), True)
+        assert_equal(list(recorder.timings().keys()), ['sld'])
@@ -1,7 +1,12 @@
 from numpy.testing import assert_equal, assert_almost_equal
-from falass import readwrite, dataformat
+from falass import readwrite, dataformat, trajectory
+import MDAnalysis as mda
+import numpy as np
 import os
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 import sys
 if sys.version_info >= (3, 0):
     from io import StringIO
@@ -104,6 +109,134 @@ class TestFiles(unittest.TestCase):
                                 [4.000, 1.000, 4.000], [5.000, 1.000, 4.000], [6.000, 1.000, 4.000]])
         return
 
+    def test_read_pdb_lazy(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        pdb = readwrite.Files(os.path.join(self.path, 'test.pdb'))
+        pdb.read_pdb(lazy=True)
+        assert_equal(pdb.number_of_timesteps, 6)
+        assert_equal(pdb.times, [0., 10000., 20000., 30000., 40000., 50000.])
+        assert_equal(len(pdb.atoms), 0)
+        assert_equal(pdb.atom_names, ['C1', 'C2', 'C3'])
+        assert_equal(pdb.cell, [[1.000, 1.000, 4.000], [2.000, 1.000, 4.000], [3.000, 1.000, 4.000],
+                                [4.000, 1.000, 4.000], [5.000, 1.000, 4.000], [6.000, 1.000, 4.000]])
+        return
+
+    def test_frames(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        pdb = readwrite.Files(os.path.join(self.path, 'test.pdb'))
+        pdb.read_pdb(lazy=True)
+        frames = list(pdb.frames([10000., 40000.]))
+        assert_equal(len(frames), 2)
+        assert_equal(frames[0].time, 10000.)
+        assert_equal(frames[0].cell, [2.000, 1.000, 4.000])
+        assert_equal(frames[0].zpos, [3.500, 1.500, 2.500])
+        assert_equal(frames[1].time, 40000.)
+        assert_equal(frames[1].zpos, [3.500, 1.500, 2.500])
+        assert_equal(len(list(pdb.frames())), 6)
+        frames = list(pdb.frames(indices=[4, 1]))
+        assert_equal([frame.time for frame in frames], [40000., 10000.])
+        assert_equal(frames[1].zpos, [3.500, 1.500, 2.500])
+        return
+
+    def test_frames_flip(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        pdb = readwrite.Files(os.path.join(self.path, 'test.pdb'), flip=True)
+        pdb.read_pdb(lazy=True)
+        frames = list(pdb.frames([0.]))
+        assert_equal(frames[0].zpos, [2.500, 1.500, 0.500])
+        return
+
+    def test_read_pdb_mdanalysis(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        native = readwrite.Files(os.path.join(self.path, 'test.pdb'), flip=True)
+        native.read_pdb()
+        pdb = readwrite.Files(os.path.join(self.path, 'test.pdb'), flip=True)
+        pdb.read_pdb(native=False)
+        assert_equal(native.times, pdb.times)
+        assert_equal(native.cell, pdb.cell)
+        assert_equal(native.atom_names, pdb.atom_names)
+        for i in range(0, len(pdb.atoms)):
+            assert_equal([atom.zpos for atom in native.atoms[i]], [atom.zpos for atom in pdb.atoms[i]])
+            assert_equal(list(native.frames([pdb.times[i]]))[0].zpos, list(pdb.frames([pdb.times[i]]))[0].zpos)
+        frames = list(readwrite.frames_from_source(readwrite.open_source(native.frame_source()), [1, 3], flip=True))
+        assert_equal(frames[1].zpos, [atom.zpos for atom in pdb.atoms[3]])
+        return
+
+    def test_read_pdb_index(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        with tempfile.TemporaryDirectory() as directory:
+            pdbfile = os.path.join(directory, 'test.pdb')
+            shutil.copy(os.path.join(self.path, 'test.pdb'), pdbfile)
+            pdb = readwrite.Files(pdbfile)
+            pdb.read_pdb()
+            pdb.read_pdb(lazy=True)
+            # the index is only written when it is asked for
+            assert_equal(os.path.isfile(trajectory.index_path(pdbfile)), False)
+            pdb.read_pdb(lazy=True, index=True)
+            assert_equal(os.path.isfile(trajectory.index_path(pdbfile)), True)
+            pdb = readwrite.Files(pdbfile)
+            pdb.read_pdb(lazy=True, index=True)
+            assert_equal(pdb.times, [0., 10000., 20000., 30000., 40000., 50000.])
+            frames = list(pdb.frames([20000., 30000.]))
+            assert_equal([frame.zpos for frame in frames], [[2.5, 3.5, 1.5], [1.5, 2.5, 3.5]])
+            assert_equal(frames[1].cell, [4., 1., 4.])
+        return
+
+    def test_read_pdb_cache(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        with tempfile.TemporaryDirectory() as directory:
+            pdbfile = os.path.join(directory, 'test.pdb')
+            shutil.copy(os.path.join(self.path, 'test.pdb'), pdbfile)
+            for i in range(0, 2):
+                pdb = readwrite.Files(pdbfile, flip=True)
+                pdb.read_pdb(cache=True)
+                assert_equal(os.path.isdir(trajectory.cache_path(pdbfile)), True)
+                assert_equal(pdb.times, [0., 10000., 20000., 30000., 40000., 50000.])
+                assert_equal([atom.zpos for atom in pdb.atoms[0]], [2.5, 1.5, 0.5])
+                assert_equal(list(pdb.frames([0.]))[0].zpos, [2.5, 1.5, 0.5])
+            pdb = readwrite.Files(pdbfile, flip=True)
+            pdb.read_pdb(lazy=True, cache=True)
+            assert_equal(len(pdb.atoms), 0)
+            assert_equal(os.path.isfile(trajectory.index_path(pdbfile)), False)
+            # the index is written when it is asked for, even if the cache is used
+            pdb.read_pdb(cache=True, index=True)
+            assert_equal(os.path.isfile(trajectory.index_path(pdbfile)), True)
+            assert_equal(trajectory.load_index(pdbfile).times, pdb.times)
+            assert_equal(list(pdb.frames([0.]))[0].zpos, [2.5, 1.5, 0.5])
+        return
+
+    def test_read_trajfile(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        u = mda.Universe(os.path.join(self.path, 'test.pdb'))
+        with tempfile.TemporaryDirectory() as directory:
+            trajfile = os.path.join(directory, 'test.xtc')
+            with mda.Writer(trajfile, u.atoms.n_atoms) as w:
+                for ts in u.trajectory:
+                    w.write(u.atoms)
+            pdb = readwrite.Files(os.path.join(self.path, 'test.pdb'), trajfile=trajfile)
+            pdb.read_pdb()
+            assert_equal(pdb.number_of_timesteps, 6)
+            assert_equal(pdb.times, [ts.time for ts in mda.Universe(trajfile).trajectory])
+            assert_equal(pdb.atom_names, ['C1', 'C2', 'C3'])
+            assert_almost_equal(pdb.cell[1], [2., 1., 4.])
+            assert_almost_equal([atom.zpos for atom in pdb.atoms[1]], [3.5, 1.5, 2.5])
+            # the frames are served from the positions in memory, not read from the file again
+            with mock.patch.object(readwrite, 'iterate_frames') as reread:
+                frames = list(pdb.frames([pdb.times[1], pdb.times[3]]))
+            assert_equal(reread.called, False)
+            assert_almost_equal(frames[0].zpos, [3.5, 1.5, 2.5])
+            assert_almost_equal(frames[0].cell, [2., 1., 4.])
+            assert_equal(frames[1].time, pdb.times[3])
+            pdb = readwrite.Files(os.path.join(self.path, 'test.pdb'), trajfile=trajfile, flip=True)
+            pdb.read_pdb()
+            assert_almost_equal(list(pdb.frames([pdb.times[1]]))[0].zpos, [0.5, 2.5, 1.5])
+            pdb.read_pdb(lazy=True)
+            assert_equal(len(pdb.atoms), 0)
+            assert_almost_equal(list(pdb.frames([pdb.times[1]]))[0].zpos, [0.5, 2.5, 1.5])
+            frames = list(readwrite.frames_from_source(readwrite.open_source(pdb.frame_source()), [1], flip=True))
+            assert_almost_equal(frames[0].zpos, [0.5, 2.5, 1.5])
+        return
+
     def test_read_lgt(self):
         self.path = os.path.dirname(os.path.abspath(__file__))
         pdb = readwrite.Files('test.pdb', lgtfile=os.path.join(self.path, 'test.lgt'))
@@ -119,6 +252,20 @@ class TestFiles(unittest.TestCase):
         assert_almost_equal(pdb.scat_lens[2].imag, 2e-5)
         return
 
+    def test_scat_len_table(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        pdb = readwrite.Files('test.pdb', lgtfile=os.path.join(self.path, 'test.lgt'))
+        pdb.read_lgt()
+        table = pdb.scat_len_table()
+        assert_equal(table.atoms, ['C1', 'C2', 'C3'])
+        assert_equal(pdb.scat_len_table() is table, True)
+        pdb.scat_lens.append(dataformat.ScatLens('O', 5., 0.))
+        assert_equal(pdb.scat_len_table() is table, True)
+        assert_almost_equal(table.real, [1e-5, 2e-5, 3e-5, 5e-5])
+        pdb.scat_lens = [dataformat.ScatLens('N', 1., 0.)]
+        assert_equal(pdb.scat_len_table().atoms, ['N'])
+        return
+
     def test_read_lgt_not_defined(self):
         pdb = readwrite.Files('test.pdb')
         with self.assertRaises(ValueError) as context:
@@ -231,6 +378,49 @@ class TestFiles(unittest.TestCase):
         return
 
 
+    def test_read_lgt_duplicates(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'dup.lgt')
+            with open(filename, 'w') as f:
+                f.write('# atom real imag\nO 5.803 0.0\nH -3.739 0.0\n\nO 1.0 1.0\nC 6.646 0.0\n')
+            pdb = readwrite.Files('test.pdb', lgtfile=filename, xray=True)
+            pdb.scat_lens.append(dataformat.ScatLens('C', 1., 0.))
+            pdb.read_lgt()
+        assert_equal([scat_len.atom for scat_len in pdb.scat_lens], ['C', 'O', 'H'])
+        assert_almost_equal(pdb.scat_lens[0].real, 1e-5)
+        assert_almost_equal(pdb.scat_lens[1].real, 5.803e-5 * 2.817940)
+        assert_almost_equal(pdb.scat_lens[2].real, -3.739e-5 * 2.817940)
+
+    def test_load_columns(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'test.dat')
+            with open(filename, 'w') as f:
+                f.write('# q i di\n0.01 1.0 0.1\n\n0.02 0.5 0.05 # comment\n')
+            columns = readwrite.load_columns(filename)
+            assert_almost_equal(columns, [[0.01, 1.0, 0.1], [0.02, 0.5, 0.05]])
+            with open(filename, 'w') as f:
+                f.write('# no data\n')
+            assert_equal(readwrite.load_columns(filename).shape[0], 0)
+            with open(filename, 'w') as f:
+                f.write('0.01 1.0 0.1\n0.02 0.5\n')
+            with self.assertRaises(ValueError):
+                readwrite.load_columns(filename)
+
+    def test_dat_columns(self):
+        columns = np.array([[0.1, 2., 0.2, 0.01], [0.2, 1., 0.1, 0.02]])
+        data = readwrite.dat_columns(columns[:, :2], resolution=2., ierror=10.)
+        assert_almost_equal(data.di, [0.2, 0.1])
+        assert_almost_equal(data.dq, [0.002, 0.004])
+        data = readwrite.dat_columns(columns[:, :3], resolution=2.)
+        assert_almost_equal(data.di, [0.2, 0.1])
+        assert_almost_equal(data.dq, [0.002, 0.004])
+        data = readwrite.dat_columns(columns)
+        assert_almost_equal(data.q, [0.1, 0.2])
+        assert_almost_equal(data.dq, [0.01, 0.02])
+        assert_equal(len(readwrite.dat_columns(np.zeros((0, 1)))), 0)
+        with self.assertRaises(ValueError):
+            readwrite.dat_columns(np.zeros((2, 5)))
+
     def test_line_count(self):
         path = os.path.dirname(os.path.abspath(__file__))
         lines = readwrite.line_count(os.path.join(path, 'test.pdb'))
@@ -1,7 +1,8 @@
 from numpy.testing import assert_almost_equal, assert_equal
-from falass import dataformat, reflect
+from falass import dataformat, reflect, stats
 import unittest
 import numpy as np
+from scipy.interpolate import InterpolatedUnivariateSpline
 
 
 class TestReflect(unittest.TestCase):
@@ -99,7 +100,7 @@ class TestReflect(unittest.TestCase):
             layers[i][1] = sld_profile[i].real
             layers[i][2] = sld_profile[i].imag
             layers[i][3] = 0
-        qvals = np.asfarray(exp_data).ravel()
+        qvals = np.asarray(exp_data, dtype=float).ravel()
         nlayers = len(sld_profile) - 2
         npnts = qvals.size
         kn = reflect.make_kn(npnts, nlayers, layers, qvals)
@@ -115,3 +116,219 @@ class TestReflect(unittest.TestCase):
         k_next, rj = reflect.knext_and_rj(kn, idx, k)
         assert_almost_equal(k_next, np.array([7.9266940191 + 0j,  7.927640133 + 0j, 7.93059601 + 0j]))
         assert_almost_equal(rj, np.array([-1.211500325 + 0j, -2.610174734 + 0j, -6.8181020565 + 0j]))
+
+    def test_reflectivity_stack(self):
+        sld1 = [dataformat.SLDPro(1., 0., 0.), dataformat.SLDPro(10., 2e-6, 0.), dataformat.SLDPro(1., 6e-6, 1e-7)]
+        sld2 = [dataformat.SLDPro(1., 0., 0.), dataformat.SLDPro(12., 4e-6, 0.), dataformat.SLDPro(1., 6e-6, 0.)]
+        qvals = np.linspace(0.005, 0.5, 20)
+        refl = reflect.reflectivity_stack(qvals, [sld1, sld2])
+        assert_equal(refl.shape, (2, 20))
+        assert_almost_equal(refl[0], reflect.reflectivity(qvals, sld1))
+        assert_almost_equal(refl[1], reflect.reflectivity(qvals, sld2))
+
+    def test_convolution_stack(self):
+        sld1 = [dataformat.SLDPro(1., 0., 0.), dataformat.SLDPro(10., 2e-6, 0.), dataformat.SLDPro(1., 6e-6, 1e-7)]
+        sld2 = [dataformat.SLDPro(1., 0., 0.), dataformat.SLDPro(12., 4e-6, 0.), dataformat.SLDPro(1., 6e-6, 0.)]
+        qvals = np.linspace(0.005, 0.5, 20)
+        data = dataformat.QDataTable(qvals, dq=qvals * 0.05)
+        refl = reflect.convolution_stack(data, [sld1, sld2])
+        assert_equal(refl.shape, (2, 20))
+        assert_almost_equal(refl[1], reflect.convolution(data, sld2))
+
+    def test_parallel_reflectivity(self):
+        sld1 = [dataformat.SLDPro(1., 0., 0.), dataformat.SLDPro(10., 2e-6, 0.), dataformat.SLDPro(1., 6e-6, 1e-7)]
+        sld2 = [dataformat.SLDPro(1., 0., 0.), dataformat.SLDPro(12., 4e-6, 0.), dataformat.SLDPro(1., 6e-6, 0.)]
+        sld3 = [dataformat.SLDPro(1., 0., 0.), dataformat.SLDPro(14., 3e-6, 0.), dataformat.SLDPro(1., 6e-6, 0.)]
+        qvals = np.linspace(0.005, 0.5, 20)
+        serial = reflect.reflectivity_stack(qvals, [sld1, sld2, sld3])
+        assert_equal(reflect.parallel_reflectivity(qvals, [sld1, sld2, sld3], 2), serial)
+        assert_equal(reflect.parallel_reflectivity(qvals, [sld1, sld2, sld3], 2, q_chunk=7), serial)
+        assert_equal(reflect.parallel_reflectivity(qvals, [sld1], 4), serial[:1])
+
+    def test_calc_ref_processes(self):
+        sld1 = [dataformat.SLDPro(1., 0., 0.), dataformat.SLDPro(10., 2e-6, 0.), dataformat.SLDPro(1., 6e-6, 1e-7)]
+        sld2 = [dataformat.SLDPro(1., 0., 0.), dataformat.SLDPro(12., 4e-6, 0.), dataformat.SLDPro(1., 6e-6, 0.)]
+        qvals = np.linspace(0.005, 0.5, 20)
+        data = dataformat.QDataTable(qvals, dq=qvals * 0.05)
+        a = reflect.Reflect([sld1, sld2], data)
+        a.calc_ref()
+        b = reflect.Reflect([sld1, sld2], data)
+        b.calc_ref(processes=2, q_chunk=5)
+        assert_equal(b.reflect.i, a.reflect.i)
+
+    def test_calc_ref_not_stored(self):
+        sld1 = [dataformat.SLDPro(1., 0., 0.), dataformat.SLDPro(10., 2e-6, 0.), dataformat.SLDPro(1., 6e-6, 1e-7)]
+        sld2 = [dataformat.SLDPro(1., 0., 0.), dataformat.SLDPro(12., 4e-6, 0.), dataformat.SLDPro(1., 6e-6, 0.)]
+        sld3 = [dataformat.SLDPro(1., 0., 0.), dataformat.SLDPro(14., 3e-6, 0.), dataformat.SLDPro(1., 6e-6, 0.)]
+        qvals = np.linspace(0.005, 0.5, 20)
+        data = dataformat.QDataTable(qvals, dq=qvals * 0.05)
+        a = reflect.Reflect([sld1, sld2, sld3], data)
+        a.calc_ref()
+        a.average_ref()
+        b = reflect.Reflect([sld1, sld2, sld3], data)
+        b.calc_ref(frame_chunk=2, store=False)
+        assert_equal(len(b.reflect), 0)
+        assert_equal(b.running_average.count, 3)
+        b.average_ref()
+        assert_almost_equal(b.averagereflect.i, a.averagereflect.i)
+        assert_almost_equal(b.averagereflect.di, a.averagereflect.di)
+        assert_almost_equal(a.averagereflect.di, np.std(a.reflect.i, axis=0, ddof=1))
+
+    def test_average_ref_error(self):
+        rng = np.random.RandomState(0)
+        sld_profile = dataformat.SLDProfileStack(np.ones((16, 3)), 1e-6 * (1 + rng.normal(0., 0.1, (16, 3))),
+                                                 np.zeros((16, 3)))
+        qvals = np.linspace(0.005, 0.5, 20)
+        data = dataformat.QDataTable(qvals, dq=qvals * 0.05)
+        a = reflect.Reflect(sld_profile, data)
+        a.calc_ref()
+        a.average_ref(error='block')
+        assert_almost_equal(a.averagereflect.i, np.mean(a.reflect.i, axis=0))
+        assert_almost_equal(a.averagereflect.di, stats.block_error(a.reflect.i))
+        a.average_ref(error='autocorrelation')
+        assert_almost_equal(a.averagereflect.di, stats.autocorrelation_error(a.reflect.i))
+        assert_almost_equal(a.effective_sample_size(), stats.effective_sample_size(a.reflect.i))
+        b = reflect.Reflect(sld_profile, data)
+        b.calc_ref(store=False)
+        with self.assertRaises(ValueError):
+            b.average_ref(error='block')
+        with self.assertRaises(ValueError):
+            b.effective_sample_size()
+
+    def test_average_ref_profile(self):
+        sld1 = [dataformat.SLDPro(1., 0., 0.), dataformat.SLDPro(10., 2e-6, 0.), dataformat.SLDPro(1., 6e-6, 1e-7)]
+        sld2 = [dataformat.SLDPro(1., 0., 0.), dataformat.SLDPro(10., 4e-6, 0.), dataformat.SLDPro(1., 6e-6, 0.)]
+        sld3 = [dataformat.SLDPro(1., 0., 0.), dataformat.SLDPro(10., 3e-6, 0.), dataformat.SLDPro(1., 6e-6, 0.)]
+        qvals = np.linspace(0.005, 0.5, 20)
+        data = dataformat.QDataTable(qvals, dq=qvals * 0.05)
+        a = reflect.Reflect([sld1, sld2, sld3], data)
+        a.average_ref(method='profile')
+        av_sld = dataformat.SLDProfile([1., 10., 1.], [0., 3e-6, 6e-6], [0., 0., 1e-7 / 3.])
+        assert_almost_equal(a.averagereflect.i, reflect.convolution(data, av_sld))
+        a.calc_ref()
+        frames_refl = np.mean(a.reflect.i, axis=0)
+        assert_almost_equal(a.average_deviation, np.max(np.abs(a.averagereflect.i - frames_refl) / frames_refl))
+        b = reflect.Reflect([sld1, sld2, sld3], data)
+        b.average_ref(method='profile', av_sld_profile=sld1, sample=0)
+        assert_almost_equal(b.averagereflect.i, reflect.convolution(data, sld1))
+        assert_equal(b.average_deviation, None)
+
+    def test_average_ref_method(self):
+        layer1 = dataformat.SLDPro(1., 0., 0.)
+        data = dataformat.QDataTable([0.05], dq=[0.05 * 0.05])
+        a = reflect.Reflect([[layer1, layer1]], data)
+        with self.assertRaises(ValueError):
+            a.average_ref(method='other')
+
+    def test_average_profile(self):
+        sld1 = [dataformat.SLDPro(1., 0., 0.), dataformat.SLDPro(10., 2e-6, 0.)]
+        sld2 = [dataformat.SLDPro(1., 0., 0.), dataformat.SLDPro(10., 4e-6, 1e-6)]
+        a = reflect.average_profile([sld1, sld2])
+        assert_almost_equal(a.thick, [1., 10.])
+        assert_almost_equal(a.real, [0., 3e-6])
+        assert_almost_equal(a.imag, [0., 0.5e-6])
+
+    def test_merge_layers(self):
+        thick = np.ones((2, 7))
+        real = np.array([[0., 1e-6, 1e-6, 1e-6, 3e-6, 3e-6, 6e-6], [0., 1e-6, 2e-6, 2e-6, 2e-6, 4e-6, 6e-6]])
+        imag = np.zeros((2, 7))
+        thick[1, 2] = 3.
+        sld = dataformat.SLDProfileStack(thick, real, imag)
+        a = reflect.merge_layers(sld)
+        assert_equal(a.thick.shape, (2, 5))
+        assert_almost_equal(a.thick, [[1., 3., 2., 0., 1.], [1., 1., 5., 1., 1.]])
+        assert_almost_equal(a.real, [[0., 1e-6, 3e-6, 3e-6, 6e-6], [0., 1e-6, 2e-6, 4e-6, 6e-6]])
+        assert_almost_equal(np.sum(a.thick * a.real, axis=1), np.sum(thick * real, axis=1))
+        qvals = np.linspace(0.005, 0.5, 20)
+        assert_almost_equal(reflect.reflectivity_stack(qvals, a) / reflect.reflectivity_stack(qvals, sld), 1.)
+
+    def test_merge_layers_tolerance(self):
+        sld = [dataformat.SLDPro(1., 0., 0.), dataformat.SLDPro(1., 1e-6, 0.), dataformat.SLDPro(3., 1.1e-6, 0.),
+               dataformat.SLDPro(1., 1.3e-6, 0.), dataformat.SLDPro(1., 6e-6, 0.)]
+        a = reflect.merge_layers([sld], 0.2e-6)
+        assert_almost_equal(a.thick, [[1., 4., 1., 1.]])
+        assert_almost_equal(a.real, [[0., 1.075e-6, 1.3e-6, 6e-6]])
+        b = reflect.merge_layers([sld[:3]], 1.)
+        assert_equal(b.thick, [[1., 1., 3.]])
+
+    def test_calc_ref_merge(self):
+        sld1 = [dataformat.SLDPro(1., 0., 0.), dataformat.SLDPro(10., 2e-6, 0.), dataformat.SLDPro(10., 2e-6, 0.),
+                dataformat.SLDPro(10., 2.1e-6, 0.), dataformat.SLDPro(1., 6e-6, 1e-7)]
+        sld2 = [dataformat.SLDPro(1., 0., 0.), dataformat.SLDPro(12., 4e-6, 0.), dataformat.SLDPro(12., 3e-6, 0.),
+                dataformat.SLDPro(12., 3e-6, 0.), dataformat.SLDPro(1., 6e-6, 0.)]
+        qvals = np.linspace(0.005, 0.5, 20)
+        data = dataformat.QDataTable(qvals, dq=qvals * 0.05)
+        a = reflect.Reflect([sld1, sld2], data)
+        a.calc_ref()
+        assert_equal(a.merge_change, None)
+        b = reflect.Reflect([sld1, sld2], data)
+        b.calc_ref(merge=0., frame_chunk=1)
+        assert_almost_equal(b.reflect.i / a.reflect.i, 1.)
+        assert_almost_equal(b.merge_change, 0.)
+        c = reflect.Reflect([sld1, sld2], data)
+        c.calc_ref(merge=0.2e-6)
+        assert_equal(c.merge_change > 0, True)
+        assert_almost_equal(c.merge_change, np.max(np.abs(c.reflect.i - a.reflect.i) / a.reflect.i))
+
+    def test_smearing_matrix(self):
+        sld1 = [dataformat.SLDPro(1., 0., 0.), dataformat.SLDPro(10., 2e-6, 0.), dataformat.SLDPro(1., 6e-6, 1e-7)]
+        qvals = np.linspace(0.005, 0.5, 50)
+        data = dataformat.QDataTable(qvals, dq=qvals * 0.05)
+        xlin, matrix = reflect.smearing_matrix(data)
+        assert_equal(matrix.shape, (50, xlin.size))
+        xlin2, matrix2 = reflect.smearing_matrix(dataformat.QDataTable(qvals.copy(), dq=qvals * 0.05))
+        assert_equal(matrix2 is matrix, True)
+        # the smearing matrix should be equivalent to a gaussian convolution followed by spline interpolation
+        fwhm = 2 * np.sqrt(2 * np.log(2))
+        gaussx = np.linspace(-1.7 * 0.05, 1.7 * 0.05, 51)
+        gaussy = 1. / (0.05 / fwhm) / np.sqrt(2 * np.pi) * np.exp(-0.5 * gaussx ** 2 / (0.05 / fwhm) ** 2)
+        smeared = np.convolve(reflect.reflectivity(xlin, sld1), gaussy, mode='same')
+        expected = InterpolatedUnivariateSpline(xlin, smeared)(qvals) * (gaussx[1] - gaussx[0])
+        assert_almost_equal(reflect.convolution(data, sld1) / expected, np.ones(50))
+
+    def test_pointwise_smearing_matrix(self):
+        sld1 = [dataformat.SLDPro(1., 0., 0.), dataformat.SLDPro(10., 2e-6, 0.), dataformat.SLDPro(1., 6e-6, 1e-7)]
+        qvals = np.linspace(0.005, 0.5, 50)
+        dqvals = qvals * np.linspace(0.02, 0.08, 50)
+        data = dataformat.QDataTable(qvals, dq=dqvals)
+        xlin, matrix = reflect.pointwise_smearing_matrix(data)
+        assert_equal(matrix.shape, (50, xlin.size))
+        assert_almost_equal(np.asarray(matrix.sum(axis=1)).ravel(), np.ones(50))
+        xlin2, matrix2 = reflect.pointwise_smearing_matrix(dataformat.QDataTable(qvals.copy(), dq=dqvals.copy()))
+        assert_equal(matrix2 is matrix, True)
+        # the smearing should be equivalent to a direct gaussian quadrature at each q-vector
+        fwhm = 2 * np.sqrt(2 * np.log(2))
+        expected = np.zeros(50)
+        for j in range(0, 50):
+            x = np.linspace(qvals[j] - 3.5 * dqvals[j] / fwhm, qvals[j] + 3.5 * dqvals[j] / fwhm, 801)
+            weights = np.exp(-0.5 * np.square((x - qvals[j]) / (dqvals[j] / fwhm)))
+            expected[j] = np.sum(weights * reflect.reflectivity(x, sld1)) / np.sum(weights)
+        result = reflect.convolution_stack(data, [sld1], pointwise=True)[0]
+        assert_almost_equal(result / expected, np.ones(50), decimal=2)
+
+    def test_pointwise_smearing_matrix_mixed(self):
+        sld1 = [dataformat.SLDPro(1., 0., 0.), dataformat.SLDPro(10., 2e-6, 0.), dataformat.SLDPro(1., 6e-6, 1e-7)]
+        qvals = np.linspace(0.005, 0.5, 50)
+        dqvals = np.where(qvals < 0.1, qvals * 0.0001, qvals * 0.05)
+        data = dataformat.QDataTable(qvals, dq=dqvals)
+        result = reflect.convolution_stack(data, [sld1], pointwise=True)[0]
+        assert_almost_equal(result[qvals < 0.1], reflect.reflectivity(qvals[qvals < 0.1], sld1))
+        xlin, matrix = reflect.pointwise_smearing_matrix(dataformat.QDataTable(qvals, dq=qvals * 0.0001))
+        assert_equal(matrix, None)
+        assert_equal(xlin, qvals)
+
+    def test_calc_ref_pointwise(self):
+        sld1 = [dataformat.SLDPro(1., 0., 0.), dataformat.SLDPro(10., 2e-6, 0.), dataformat.SLDPro(1., 6e-6, 1e-7)]
+        qvals = np.linspace(0.005, 0.5, 50)
+        data = dataformat.QDataTable(qvals, dq=qvals * 0.05)
+        b = reflect.Reflect([sld1], data)
+        b.calc_ref(pointwise=True)
+        constant = reflect.convolution(data, sld1)
+        assert_almost_equal(b.reflect.i[0] / constant, np.ones(50), decimal=2)
+
+    def test_smearing_matrix_no_resolution(self):
+        qvals = np.linspace(0.005, 0.5, 50)
+        data = dataformat.QDataTable(qvals, dq=qvals * 0.0001)
+        xlin, matrix = reflect.smearing_matrix(data)
+        assert_equal(matrix, None)
+        assert_equal(xlin, qvals)
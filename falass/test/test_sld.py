@@ -1,7 +1,10 @@
 from numpy.testing import assert_equal, assert_almost_equal
-from falass import readwrite, job, sld, dataformat
+from falass import readwrite, job, sld, dataformat, reflect, stats
+import numpy as np
 import os
+import tempfile
 import unittest
+from unittest import mock
 
 
 class TestSLD(unittest.TestCase):
@@ -116,6 +119,105 @@ class TestSLD(unittest.TestCase):
         assert_almost_equal(c.sld_profile[2][3].imag, 1e-5 / 3.)
         return
 
+    def test_get_sld_profile_lazy(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        a = readwrite.Files(os.path.join(self.path, 'test.pdb'), lgtfile=os.path.join(self.path, 'test.lgt'))
+        a.read_pdb(lazy=True)
+        a.read_lgt()
+        b = job.Job(a, 1., 0.)
+        b.set_times(times=[0., 20000., 10000.])
+        b.set_lgts()
+        c = sld.SLD(b)
+        c.get_sld_profile()
+        assert_equal(len(c.sld_profile), 3)
+        assert_almost_equal(c.sld_profile.real, [[0., 1e-5, 2e-5, 3e-5], [0., 1e-5, 1.5e-5, 0.5e-5],
+                                                 [0., 1e-5, 1e-5 / 3., 2e-5 / 3.]])
+        assert_almost_equal(c.sld_profile.imag, [[0., 0., 1e-5, 2e-5], [0., 0.5e-5, 1e-5, 0.],
+                                                 [0., 2e-5 / 3., 0., 1e-5 / 3.]])
+        return
+
+    def test_get_sld_profile_processes(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        a = readwrite.Files(os.path.join(self.path, 'test.pdb'), lgtfile=os.path.join(self.path, 'test.lgt'))
+        a.read_pdb(lazy=True)
+        a.read_lgt()
+        b = job.Job(a, 1., 0.)
+        b.set_times(times=[0., 50000., 10000.])
+        b.set_lgts()
+        c = sld.SLD(b)
+        c.get_sld_profile()
+        d = sld.SLD(b)
+        d.get_sld_profile(processes=2)
+        assert_equal(len(d.sld_profile), 6)
+        assert_equal(d.sld_profile.real, c.sld_profile.real)
+        assert_equal(d.sld_profile.imag, c.sld_profile.imag)
+        assert_equal(d.sld_profile.thick, c.sld_profile.thick)
+        return
+
+    def test_get_sld_profile_cell_changes(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        with open(os.path.join(self.path, 'test.pdb')) as f:
+            lines = f.readlines()
+        # the cell of the second frame is 5.5 Angstrom in z, such that it has 5 whole layers rather than 4
+        cryst = [i for i, line in enumerate(lines) if line.startswith('CRYST1')]
+        lines[cryst[1]] = lines[cryst[1]][:24] + '{:9.3f}'.format(5.5) + lines[cryst[1]][33:]
+        with tempfile.TemporaryDirectory() as directory:
+            pdbfile = os.path.join(directory, 'npt.pdb')
+            with open(pdbfile, 'w') as f:
+                f.writelines(lines)
+            for lazy, processes in [(False, 1), (True, 1), (True, 2)]:
+                a = readwrite.Files(pdbfile, lgtfile=os.path.join(self.path, 'test.lgt'))
+                a.read_pdb(lazy=lazy)
+                a.read_lgt()
+                b = job.Job(a, 1., 0.)
+                b.set_times(times=[0., 20000., 10000.])
+                c = sld.SLD(b)
+                c.get_sld_profile(processes=processes)
+                assert_equal(c.sld_profile.real.shape, (3, 4))
+                assert_almost_equal(c.sld_profile.real[1], [0., 1e-5, 1.5e-5, 0.5e-5])
+                c.average_sld_profile()
+                assert_equal(len(c.av_sld_profile), 4)
+            d = reflect.Reflect(c.sld_profile, dataformat.QDataTable(np.linspace(0.01, 0.5, 10),
+                                                                     dq=np.linspace(0.01, 0.5, 10) * 0.05))
+            d.calc_ref()
+            d.average_ref()
+            assert_equal(d.reflect.i.shape, (3, 10))
+        return
+
+    def test_get_sld_profile_no_frames(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        a = readwrite.Files(os.path.join(self.path, 'test.pdb'), lgtfile=os.path.join(self.path, 'test.lgt'))
+        a.read_pdb(lazy=True)
+        a.read_lgt()
+        b = job.Job(a, 1., 0.)
+        b.times = [5.]
+        c = sld.SLD(b)
+        with self.assertRaises(ValueError):
+            c.get_sld_profile()
+        return
+
+    def test_number_of_layers(self):
+        assert_equal(sld.number_of_layers([[1., 1., 4.], [1., 1., 5.5], [1., 1., 4.5]], 1., 0.), 4)
+        assert_equal(sld.number_of_layers([[1., 1., 5.5]], 0.5, 1.), 9)
+        return
+
+    def test_sld_worker(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        a = readwrite.Files(os.path.join(self.path, 'test.pdb'), lgtfile=os.path.join(self.path, 'test.lgt'))
+        a.read_pdb(native=False)
+        a.read_lgt()
+        real, imag = sld.scatlen_arrays(a.atom_names, a.scat_lens)
+        with mock.patch.object(readwrite, 'open_source', wraps=readwrite.open_source) as opened:
+            sld._sld_init(a.frame_source(), False, real, imag, 1., 0., 4)
+            first = sld._sld_worker(np.array([0, 2]))
+            second = sld._sld_worker(np.array([1]))
+        # the trajectory is opened once by each worker, not for each chunk
+        assert_equal(opened.call_count, 1)
+        assert_equal(len(first), 2)
+        assert_almost_equal(first[0][0], [0., 1e-5, 2e-5, 3e-5])
+        assert_almost_equal(second[0][0], [0., 1e-5, 1.5e-5, 0.5e-5])
+        return
+
     def test_average_sld_profile(self):
         self.path = os.path.dirname(os.path.abspath(__file__))
         a = readwrite.Files(os.path.join(self.path, 'test.pdb'), lgtfile=os.path.join(self.path, 'test.lgt'),
@@ -141,6 +243,37 @@ class TestSLD(unittest.TestCase):
         return
 
 
+    def test_average_sld_profile_not_stored(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        a = readwrite.Files(os.path.join(self.path, 'test.pdb'), lgtfile=os.path.join(self.path, 'test.lgt'))
+        a.read_pdb(lazy=True)
+        a.read_lgt()
+        b = job.Job(a, 1., 0.)
+        b.set_times(times=[0., 20000., 10000.])
+        b.set_lgts()
+        c = sld.SLD(b)
+        c.get_sld_profile()
+        c.average_sld_profile()
+        d = sld.SLD(b)
+        d.get_sld_profile(store=False)
+        assert_equal(len(d.sld_profile), 0)
+        assert_equal(d.running_average.count, 3)
+        d.average_sld_profile()
+        assert_almost_equal(d.av_sld_profile.real, c.av_sld_profile.real)
+        assert_almost_equal(d.av_sld_profile.imag, c.av_sld_profile.imag)
+        assert_almost_equal(d.av_sld_profile.thick, [1., 1., 1., 1.])
+        assert_almost_equal(d.av_sld_profile_err.real, c.av_sld_profile_err.real)
+        assert_almost_equal(d.av_sld_profile_err.imag, c.av_sld_profile_err.imag)
+        assert_almost_equal(c.av_sld_profile_err.real[1], np.std([1e-5, 1e-5, 1e-5], ddof=1))
+        return
+
+    def test_running_average_sld_profile_empty(self):
+        a = sld.SLD(None)
+        with self.assertRaises(ValueError):
+            a.running_average_sld_profile()
+        return
+
+
     def test_get_scatlen(self):
         atom1 = dataformat.ScatLens('C1', 1.0, 0.0)
         atom2 = dataformat.ScatLens('C2', 2.0, 1.0)
@@ -162,3 +295,54 @@ class TestSLD(unittest.TestCase):
         self.assertTrue("Attempt to get the scattering length of the atom type {} failed. This should never "
                                      "happen. Please contact the developers".format('C4') in str(context.exception))
         return
+
+
+    def test_scatlen_arrays(self):
+        atom1 = dataformat.ScatLens('C1', 1.0, 0.0)
+        atom2 = dataformat.ScatLens('C2', 2.0, 1.0)
+        atom3 = dataformat.ScatLens('C3', 3.0, 2.0)
+        array = [atom1, atom2, atom3]
+        real, imag = sld.scatlen_arrays(['C3', 'C1', 'C3', 'C2'], array)
+        assert_almost_equal(real, [3.0e-5, 1.0e-5, 3.0e-5, 2.0e-5])
+        assert_almost_equal(imag, [2.0e-5, 0.0, 2.0e-5, 1.0e-5])
+        return
+
+
+    def test_bin_sld(self):
+        zpos = [0.5, 1.5, 1.7, 3.5, 4.5]
+        real = [1., 2., 3., 4., 5.]
+        imag = [0., 1., 1., 2., 2.]
+        real_sld, imag_sld = sld.bin_sld(zpos, real, imag, [2., 1., 5.], 1., 1.)
+        assert_almost_equal(real_sld, [1. / 2., 5. / 2., 0., 4. / 2.])
+        assert_almost_equal(imag_sld, [0., 2. / 2., 0., 2. / 2.])
+        real_sld, imag_sld = sld.bin_sld(zpos, real, imag, [2., 1., 5.], 1., 1., 2)
+        assert_almost_equal(real_sld, [1. / 2., 5. / 2.])
+        return
+
+    def test_average_sld_profile_std(self):
+        # the error is the standard deviation over the timesteps with N - 1 degrees of freedom
+        real = np.random.RandomState(1).normal(size=(5, 3))
+        a = sld.SLD(None)
+        a.set_sld_profile(dataformat.SLDProfileStack(np.ones((5, 3)), real, np.zeros((5, 3))))
+        a.average_sld_profile()
+        assert_almost_equal(a.av_sld_profile_err.real, np.sqrt(np.sum(np.square(real - np.mean(real, axis=0)),
+                                                                      axis=0) / 4.))
+        assert_almost_equal(a.av_sld_profile_err.real, np.std(real, axis=0, ddof=1))
+        return
+
+    def test_average_sld_profile_error(self):
+        real = np.random.RandomState(0).normal(size=(64, 3))
+        a = sld.SLD(None)
+        a.set_sld_profile(dataformat.SLDProfileStack(np.ones((64, 3)), real, np.zeros((64, 3))))
+        a.average_sld_profile(error='block')
+        assert_almost_equal(a.av_sld_profile.real, np.mean(real, axis=0))
+        assert_almost_equal(a.av_sld_profile_err.real, stats.block_error(real))
+        assert_almost_equal(a.av_sld_profile_err.imag, np.zeros(3))
+        a.average_sld_profile(error='autocorrelation')
+        assert_almost_equal(a.av_sld_profile_err.real, stats.autocorrelation_error(real))
+        assert_almost_equal(a.effective_sample_size(), stats.effective_sample_size(real))
+        b = sld.SLD(None)
+        with self.assertRaises(ValueError):
+            b.average_sld_profile(error='block')
+        with self.assertRaises(ValueError):
+            b.effective_sample_size()
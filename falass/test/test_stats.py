@@ -0,0 +1,97 @@
+from numpy.testing import assert_equal, assert_almost_equal
+from falass import stats
+import numpy as np
+import unittest
+
+
+class TestRunningAverage(unittest.TestCase):
+    def test_update(self):
+        values = np.array([[1., 2.], [3., 6.], [8., 1.], [2., 2.]])
+        a = stats.RunningAverage()
+        for i in range(0, values.shape[0]):
+            a.update(values[i])
+        assert_equal(a.count, 4)
+        assert_almost_equal(a.mean, np.mean(values, axis=0))
+        assert_almost_equal(a.variance(), np.var(values, axis=0, ddof=1))
+        assert_almost_equal(a.std(ddof=0), np.std(values, axis=0))
+
+    def test_update_batch(self):
+        values = np.random.RandomState(0).normal(size=(11, 3))
+        a = stats.RunningAverage()
+        a.update_batch(values[:4])
+        a.update(values[4])
+        a.update_batch(values[5:])
+        assert_equal(a.count, 11)
+        assert_almost_equal(a.mean, np.mean(values, axis=0))
+        assert_almost_equal(a.std(), np.std(values, axis=0, ddof=1))
+
+    def test_variance_single(self):
+        a = stats.RunningAverage()
+        a.update([1., 2.])
+        assert_equal(np.isnan(a.variance()), [True, True])
+        assert_equal(a.variance(ddof=0), [0., 0.])
+
+    def test_update_shape(self):
+        a = stats.RunningAverage()
+        a.update([1., 2.])
+        with self.assertRaises(ValueError):
+            a.update([1., 2., 3.])
+        with self.assertRaises(ValueError):
+            a.update_batch([[1., 2., 3.]])
+
+
+class TestWindowMean(unittest.TestCase):
+    def test_window_mean(self):
+        values = np.random.RandomState(0).normal(size=(10, 3))
+        means, starts = stats.window_mean(values, 4, 3)
+        assert_equal(starts, [0, 3, 6])
+        for mean, start in zip(means, starts):
+            assert_almost_equal(mean, np.mean(values[start:start + 4], axis=0))
+        means, starts = stats.window_mean(values[:, 0], 1)
+        assert_almost_equal(means, values[:, 0])
+
+    def test_window_mean_errors(self):
+        with self.assertRaises(ValueError):
+            stats.window_mean(np.zeros(5), 6)
+        with self.assertRaises(ValueError):
+            stats.window_mean(np.zeros(5), 2, 0)
+
+
+class TestCorrelatedErrors(unittest.TestCase):
+    def ar1(self, phi, n=4000, columns=2, seed=0):
+        noise = np.random.RandomState(seed).normal(size=(n, columns))
+        values = np.zeros((n, columns))
+        for t in range(1, n):
+            values[t] = phi * values[t - 1] + noise[t]
+        return values
+
+    def test_autocorrelation(self):
+        values = np.array([1., 2., 3., 2., 1., 2., 3.])
+        centred = values - np.mean(values)
+        acf = stats.autocorrelation(values)
+        for lag in range(0, 4):
+            assert_almost_equal(acf[lag], np.sum(centred[:7 - lag] * centred[lag:]) / np.sum(np.square(centred)))
+        assert_equal(stats.autocorrelation(np.ones((5, 2)))[:, 0], [1., 0., 0., 0., 0.])
+
+    def test_integrated_autocorrelation_time(self):
+        values = self.ar1(0.8)
+        tau = stats.integrated_autocorrelation_time(values)
+        assert_equal(np.all(np.abs(tau - 9.) < 2.5), True)
+        assert_almost_equal(stats.effective_sample_size(values), 4000 / tau)
+        independent = np.random.RandomState(1).normal(size=(4000, 2))
+        assert_equal(np.all(np.abs(stats.integrated_autocorrelation_time(independent) - 1.) < 0.2), True)
+        assert_equal(stats.integrated_autocorrelation_time(np.ones((10, 1))), [1.])
+
+    def test_block_error(self):
+        values = self.ar1(0.8, n=2 ** 14)
+        true_error = np.sqrt(1 / (1 - 0.8 ** 2) * 9. / 2 ** 14)
+        errors, deltas, sizes = stats.block_standard_errors(values)
+        assert_equal(sizes[:4], [1, 2, 4, 8])
+        assert_almost_equal(errors[0], np.std(values, axis=0) / np.sqrt(2 ** 14 - 1))
+        assert_equal(np.all(np.abs(stats.block_error(values) / true_error - 1.) < 0.25), True)
+        assert_equal(np.all(np.abs(stats.autocorrelation_error(values) / true_error - 1.) < 0.25), True)
+        assert_almost_equal(stats.correlated_error(values, 'block'), stats.block_error(values))
+        with self.assertRaises(ValueError):
+            stats.block_standard_errors(np.zeros(3))
+        with self.assertRaises(ValueError):
+            stats.correlated_error(values, 'other')
@@ -0,0 +1,110 @@
+from numpy.testing import assert_equal
+from falass import trajectory
+import MDAnalysis as mda
+import numpy as np
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestTrajectory(unittest.TestCase):
+    def test_read_pdb(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        traj = trajectory.read_pdb(os.path.join(self.path, 'test.pdb'))
+        assert_equal(len(traj), 6)
+        assert_equal(traj.names, ['C1', 'C2', 'C3'])
+        assert_equal(traj.times, [0., 10000., 20000., 30000., 40000., 50000.])
+        assert_equal(traj.cell[:, 0], [1., 2., 3., 4., 5., 6.])
+        assert_equal(traj.zpos.dtype, np.float32)
+        assert_equal(traj.zpos[1], [3.5, 1.5, 2.5])
+        return
+
+    def test_read_pdb_mdanalysis(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        for name in ['test.pdb', 'test2.pdb']:
+            u = mda.Universe(os.path.join(self.path, name))
+            expected = np.array([u.atoms.positions[:, 2] for ts in u.trajectory])
+            for chunk_size in [trajectory.CHUNK_SIZE, 100, 7]:
+                traj = trajectory.read_pdb(os.path.join(self.path, name), chunk_size=chunk_size)
+                assert_equal(traj.zpos, expected)
+                assert_equal(traj.names, u.atoms.names)
+        return
+
+    def test_read_pdb_positions(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        traj = trajectory.read_pdb(os.path.join(self.path, 'test.pdb'), positions=False)
+        assert_equal(traj.zpos, None)
+        zpos = list(trajectory.read_frame_zpos(traj.pdbfile, traj.offsets, [4, 0]))
+        assert_equal(zpos, [[3.5, 1.5, 2.5], [1.5, 2.5, 3.5]])
+        frames = list(trajectory.iterate_frames(traj, [2], flip=True, times=[20000.]))
+        assert_equal(frames[0].time, 20000.)
+        assert_equal(frames[0].cell, [3., 1., 4.])
+        assert_equal(frames[0].zpos, [1.5, 0.5, 2.5])
+        return
+
+    def test_read_pdb_end_records(self):
+        lines = ['CRYST1    1.000    1.000    4.000  90.00  90.00  90.00 P 1           1',
+                 'ATOM      1  C1  DSPCA   1      00.500  00.500  01.500  1.00  0.00           C',
+                 'HETATM    2  O   DSPCA   1      00.500  00.500  -2.250  1.00  0.00           O',
+                 'END']
+        with tempfile.TemporaryDirectory() as directory:
+            pdbfile = os.path.join(directory, 'end.pdb')
+            with open(pdbfile, 'w') as f:
+                f.write('\n'.join(lines * 2))
+            traj = trajectory.read_pdb(pdbfile)
+            assert_equal(traj.names, ['C1', 'O'])
+            assert_equal(traj.zpos, [[1.5, -2.25], [1.5, -2.25]])
+            assert_equal(list(trajectory.read_frame_zpos(pdbfile, traj.offsets, [1])), [[1.5, -2.25]])
+            with open(pdbfile, 'w') as f:
+                f.write('\n'.join(lines + lines[:2] + lines[3:]))
+            with self.assertRaises(ValueError):
+                trajectory.read_pdb(pdbfile)
+        return
+
+    def test_read_index(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        with tempfile.TemporaryDirectory() as directory:
+            pdbfile = os.path.join(directory, 'test.pdb')
+            shutil.copy(os.path.join(self.path, 'test.pdb'), pdbfile)
+            assert_equal(trajectory.load_index(pdbfile), None)
+            traj = trajectory.read_index(pdbfile)
+            assert_equal(os.path.isfile(trajectory.index_path(pdbfile)), True)
+            index = trajectory.load_index(pdbfile)
+            assert_equal(index.times, traj.times)
+            assert_equal(index.cell, traj.cell)
+            assert_equal(index.names, ['C1', 'C2', 'C3'])
+            assert_equal(index.offsets, traj.offsets)
+            assert_equal(list(trajectory.read_frame_zpos(pdbfile, index.offsets, [1])), [[3.5, 1.5, 2.5]])
+            # the index is out of date once the pdbfile changes
+            with open(pdbfile, 'a') as f:
+                f.write('REMARK    CHANGED\n')
+            os.utime(pdbfile, ns=(0, 0))
+            assert_equal(trajectory.load_index(pdbfile), None)
+            assert_equal(trajectory.read_index(pdbfile).times, traj.times)
+            assert_equal(trajectory.load_index(pdbfile) is not None, True)
+        return
+
+    def test_read_cached(self):
+        self.path = os.path.dirname(os.path.abspath(__file__))
+        with tempfile.TemporaryDirectory() as directory:
+            pdbfile = os.path.join(directory, 'test.pdb')
+            shutil.copy(os.path.join(self.path, 'test.pdb'), pdbfile)
+            assert_equal(trajectory.load_cache(pdbfile), None)
+            traj = trajectory.read_cached(pdbfile)
+            cached = trajectory.load_cache(pdbfile)
+            assert_equal(isinstance(cached.zpos, np.memmap), True)
+            assert_equal(cached.zpos, traj.zpos)
+            assert_equal(cached.names, ['C1', 'C2', 'C3'])
+            assert_equal(cached.times, traj.times)
+            assert_equal(cached.cell, traj.cell)
+            assert_equal(cached.offsets, traj.offsets)
+            # a change of the same size and modification time is found by the content hash
+            stat = os.stat(pdbfile)
+            with open(pdbfile, 'r+') as f:
+                f.write('REMARK    CHANGED FOR FALASS')
+            os.utime(pdbfile, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            assert_equal(trajectory.load_cache(pdbfile), None)
+            assert_equal(trajectory.read_cached(pdbfile).zpos, traj.zpos)
+            assert_equal(trajectory.load_cache(pdbfile) is not None, True)
+        return
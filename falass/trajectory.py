@@ -0,0 +1,466 @@
+import hashlib
+import mmap
+import os
+import numpy as np
+from falass import dataformat
+
+CHUNK_SIZE = 2 ** 24
+INDEX_VERSION = 1
+CACHE_VERSION = 1
+
+
+class PDBTrajectory:
+    """Parsed .pdb trajectory.
+
+    A class to hold the parts of a .pdb trajectory that are needed by falass, these are the atom type names (from the
+    first frame), the time of each timestep (from the 'TITLE' lines), the cell dimensions of each frame (from the
+    'CRYST1' lines), the z-position of each atom in each frame (if these were read) and the byte offset at which each
+    frame starts in the file, such that single frames can be read again later.
+
+    Parameters
+    ----------
+    pdbfile: str
+        Path and name of the .pdb file.
+    names: array_like str
+        The atom type name of each atom.
+    times: array_like float
+        The time of each timestep.
+    cell: array_like float
+        The (frames x 3) cell dimensions.
+    zpos: array_like float
+        The (frames x atoms) z-positions, None if the positions were not read.
+    offsets: array_like int
+        The byte offset of the start of each frame, and of the end of the last frame.
+    """
+    def __init__(self, pdbfile, names, times, cell, zpos, offsets):
+        self.pdbfile = pdbfile
+        self.names = names
+        self.times = times
+        self.cell = cell
+        self.zpos = zpos
+        self.offsets = offsets
+
+    def __len__(self):
+        return self.offsets.size - 1
+
+
+def read_pdb(pdbfile, positions=True, chunk_size=CHUNK_SIZE):
+    """Parse .pdb.
+
+    Reads a .pdb trajectory in a single pass over a memory-map of the file. The file is taken in chunks of whole lines
+    and only the record name (the first six columns) of each line is looked at, the atom type name (columns 13-16)
+    and z-position (columns 47-54) are taken directly from the fixed columns of the 'ATOM' and 'HETATM' lines, and the
+    'TITLE' and 'CRYST1' lines are parsed for the time and cell dimensions. Frames end at the 'ENDMDL' records (or the
+    'END' records if there are none). No per-atom objects are created, the z-positions are held as a single
+    (frames x atoms) float32 array.
+
+    Parameters
+    ----------
+    pdbfile: str
+        Path and name of the .pdb file.
+    positions: bool, optional
+        Should the z-positions be read, if false only the atom type names, times, cell dimensions and frame offsets
+        are found.
+    chunk_size: int, optional
+        The approximate number of bytes to be parsed at a time.
+
+    Returns
+    -------
+    falass.trajectory.PDBTrajectory
+        The parsed trajectory.
+    """
+    names = []
+    first_frame = True
+    times = []
+    cell = []
+    zpos = []
+    endmdl = _FrameCounter()
+    end = _FrameCounter()
+    size = os.path.getsize(pdbfile)
+    if size == 0:
+        raise ValueError("The pdbfile {} is empty.".format(pdbfile))
+    with open(pdbfile, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for start, stop in _chunks(mm, 0, size, chunk_size):
+            chunk = _parse_chunk(mm, start, stop, positions, first_frame)
+            if first_frame:
+                names.extend(chunk['names'])
+                first_frame = chunk['endmdl'][0].size == 0 and chunk['end'][0].size == 0
+            times.extend(chunk['times'])
+            cell.extend(chunk['cell'])
+            if positions:
+                zpos.append(chunk['zpos'])
+            endmdl.add(chunk['atom_starts'], chunk['endmdl'], start)
+            end.add(chunk['atom_starts'], chunk['end'], start)
+    counts, offsets = endmdl.finish(size) if len(endmdl.offsets) > 1 else end.finish(size)
+    if counts.size == 0 or counts[0] == 0:
+        raise ValueError("No atoms were found in the pdbfile {}.".format(pdbfile))
+    if np.any(counts != counts[0]):
+        raise ValueError("The frames of the pdbfile {} have differing numbers of atoms.".format(pdbfile))
+    if positions:
+        zpos = np.concatenate(zpos).reshape(counts.size, counts[0])
+    else:
+        zpos = None
+    return PDBTrajectory(pdbfile, np.array(names[:counts[0]]), np.array(times, dtype=np.float64),
+                         np.array(cell, dtype=np.float32).reshape(-1, 3), zpos, offsets)
+
+
+def index_path(pdbfile):
+    """Index file name.
+
+    Parameters
+    ----------
+    pdbfile: str
+        Path and name of the .pdb file.
+
+    Returns
+    -------
+    str
+        Path and name of the sidecar index of the .pdb file.
+    """
+    return pdbfile + '.index.npz'
+
+
+def save_index(trajectory):
+    """Save the frame index.
+
+    Writes the atom type names, times, cell dimensions and byte offset of each frame of a parsed trajectory to a
+    sidecar .npz file next to the .pdb file, with the size and modification time of the .pdb file so that the index
+    can be checked against the file when it is loaded. If the index cannot be written (such as for a read-only
+    directory) nothing is done.
+
+    Parameters
+    ----------
+    trajectory: falass.trajectory.PDBTrajectory
+        The parsed trajectory.
+    """
+    stat = os.stat(trajectory.pdbfile)
+    try:
+        with open(index_path(trajectory.pdbfile), 'wb') as f:
+            np.savez(f, version=INDEX_VERSION, size=stat.st_size, mtime=stat.st_mtime_ns, names=trajectory.names,
+                     times=trajectory.times, cell=trajectory.cell, offsets=trajectory.offsets)
+    except OSError:
+        pass
+
+
+def load_index(pdbfile):
+    """Load the frame index.
+
+    Reads the sidecar index written by save_index(), if it exists and the size and modification time of the .pdb
+    file have not changed since it was written.
+
+    Parameters
+    ----------
+    pdbfile: str
+        Path and name of the .pdb file.
+
+    Returns
+    -------
+    falass.trajectory.PDBTrajectory
+        The parsed trajectory without the atom positions, or None if there is no valid index.
+    """
+    stat = os.stat(pdbfile)
+    try:
+        with np.load(index_path(pdbfile)) as index:
+            if (index['version'] != INDEX_VERSION or index['size'] != stat.st_size or
+                    index['mtime'] != stat.st_mtime_ns):
+                return None
+            return PDBTrajectory(pdbfile, index['names'], index['times'], index['cell'], None, index['offsets'])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def read_index(pdbfile, chunk_size=CHUNK_SIZE):
+    """Frame index of a .pdb.
+
+    Loads the sidecar index of the .pdb file, if this is missing or out of date the file is scanned (without reading
+    the atom positions) by read_pdb() and the index is saved, such that later runs do not need to scan the file.
+
+    Parameters
+    ----------
+    pdbfile: str
+        Path and name of the .pdb file.
+    chunk_size: int, optional
+        The approximate number of bytes to be parsed at a time, if the file is scanned.
+
+    Returns
+    -------
+    falass.trajectory.PDBTrajectory
+        The parsed trajectory without the atom positions.
+    """
+    trajectory = load_index(pdbfile)
+    if trajectory is None:
+        trajectory = read_pdb(pdbfile, positions=False, chunk_size=chunk_size)
+        save_index(trajectory)
+    return trajectory
+
+
+def cache_path(pdbfile):
+    """Cache directory name.
+
+    Parameters
+    ----------
+    pdbfile: str
+        Path and name of the .pdb file.
+
+    Returns
+    -------
+    str
+        Path and name of the directory holding the cache of the parsed .pdb file.
+    """
+    return pdbfile + '.cache'
+
+
+def content_hash(pdbfile, samples=16, block=2 ** 16):
+    """Sampled content hash.
+
+    A hash of the size of the file and of a number of evenly spaced blocks of it, including the first and last. This
+    is quick for even very large files, while still noticing most changes that keep the same size and modification
+    time.
+
+    Parameters
+    ----------
+    pdbfile: str
+        Path and name of the file.
+    samples: int, optional
+        The number of blocks to hash.
+    block: int, optional
+        The number of bytes in each block.
+
+    Returns
+    -------
+    str
+        The hexadecimal digest.
+    """
+    size = os.path.getsize(pdbfile)
+    digest = hashlib.blake2b(str(size).encode(), digest_size=16)
+    with open(pdbfile, 'rb') as f:
+        for position in np.unique(np.linspace(0, max(size - block, 0), samples).astype(np.int64)):
+            f.seek(position)
+            digest.update(f.read(block))
+    return digest.hexdigest()
+
+
+def _cache_key(pdbfile):
+    stat = os.stat(pdbfile)
+    return {'path': os.path.abspath(pdbfile), 'size': stat.st_size, 'mtime': stat.st_mtime_ns,
+            'hash': content_hash(pdbfile)}
+
+
+def save_cache(trajectory):
+    """Save the parsed trajectory.
+
+    Writes the z-positions (as a .npy file, which can be memory-mapped when it is loaded), the atom types and the
+    type index of each atom, the times, cell dimensions and frame offsets of a parsed trajectory to a cache directory
+    next to the .pdb file. The cache is keyed on the path, size, modification time and a sampled content hash of the
+    .pdb file. If the cache cannot be written nothing is done.
+
+    Parameters
+    ----------
+    trajectory: falass.trajectory.PDBTrajectory
+        The parsed trajectory, including the z-positions.
+    """
+    path = cache_path(trajectory.pdbfile)
+    key = _cache_key(trajectory.pdbfile)
+    types, type_index = np.unique(trajectory.names, return_inverse=True)
+    try:
+        os.makedirs(path, exist_ok=True)
+        # the positions are written first, such that a complete metadata file marks a complete cache
+        with open(os.path.join(path, 'zpos.npy.tmp'), 'wb') as f:
+            np.save(f, trajectory.zpos)
+        os.replace(os.path.join(path, 'zpos.npy.tmp'), os.path.join(path, 'zpos.npy'))
+        with open(os.path.join(path, 'meta.npz.tmp'), 'wb') as f:
+            np.savez(f, version=CACHE_VERSION, types=types, type_index=type_index, times=trajectory.times,
+                     cell=trajectory.cell, offsets=trajectory.offsets, **key)
+        os.replace(os.path.join(path, 'meta.npz.tmp'), os.path.join(path, 'meta.npz'))
+    except OSError:
+        pass
+
+
+def load_cache(pdbfile):
+    """Load the parsed trajectory.
+
+    Reads the cache written by save_cache(), if it exists and the .pdb file has not changed since it was written. The
+    z-positions are memory-mapped, such that only the frames that are used are read from the disk.
+
+    Parameters
+    ----------
+    pdbfile: str
+        Path and name of the .pdb file.
+
+    Returns
+    -------
+    falass.trajectory.PDBTrajectory
+        The parsed trajectory, or None if there is no valid cache.
+    """
+    path = cache_path(pdbfile)
+    try:
+        with np.load(os.path.join(path, 'meta.npz')) as meta:
+            if meta['version'] != CACHE_VERSION:
+                return None
+            key = _cache_key(pdbfile)
+            if any(meta[name] != value for name, value in key.items()):
+                return None
+            zpos = np.load(os.path.join(path, 'zpos.npy'), mmap_mode='r')
+            if zpos.shape != (meta['offsets'].size - 1, meta['type_index'].size):
+                return None
+            return PDBTrajectory(pdbfile, meta['types'][meta['type_index']], meta['times'], meta['cell'], zpos,
+                                 meta['offsets'])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def read_cached(pdbfile, chunk_size=CHUNK_SIZE):
+    """Parse .pdb with a cache.
+
+    Loads the cache of the parsed .pdb file, if this is missing or out of date the file is parsed by read_pdb() and
+    the cache is saved, such that later sessions do not need to parse the file again.
+
+    Parameters
+    ----------
+    pdbfile: str
+        Path and name of the .pdb file.
+    chunk_size: int, optional
+        The approximate number of bytes to be parsed at a time, if the file is parsed.
+
+    Returns
+    -------
+    falass.trajectory.PDBTrajectory
+        The parsed trajectory.
+    """
+    trajectory = load_cache(pdbfile)
+    if trajectory is None:
+        trajectory = read_pdb(pdbfile, chunk_size=chunk_size)
+        save_cache(trajectory)
+    return trajectory
+
+
+def read_frame_zpos(pdbfile, offsets, indices, chunk_size=CHUNK_SIZE):
+    """Read frames from a .pdb.
+
+    Reads the z-positions of the given frames only, using the byte offsets of the frames found by read_pdb(), such
+    that the rest of the file is not touched.
+
+    Parameters
+    ----------
+    pdbfile: str
+        Path and name of the .pdb file.
+    offsets: array_like int
+        The byte offset of the start of each frame, and of the end of the last frame.
+    indices: array_like int
+        The indices of the frames to be read.
+    chunk_size: int, optional
+        The approximate number of bytes to be parsed at a time.
+
+    Yields
+    ------
+    array_like float
+        The float32 z-position of each atom in the frame.
+    """
+    with open(pdbfile, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for k in np.asarray(indices, dtype=int):
+            yield np.concatenate([_parse_chunk(mm, start, stop, True, False)['zpos']
+                                  for start, stop in _chunks(mm, offsets[k], offsets[k + 1], chunk_size)])
+
+
+def iterate_frames(trajectory, indices, flip=False, times=None):
+    """Iterate over frames.
+
+    Gives the atom positions of the given frames of a parsed .pdb one frame at a time, from the z-positions held in
+    memory or, if these were not read, from the file.
+
+    Parameters
+    ----------
+    trajectory: falass.trajectory.PDBTrajectory
+        The parsed trajectory.
+    indices: array_like int
+        The indices of the frames.
+    flip: bool, optional
+        Should the z-positions be flipped through the xy-plane.
+    times: array_like float, optional
+        The time of each of the frames.
+
+    Yields
+    ------
+    falass.dataformat.Frame
+        The time, cell dimensions and atom z-positions for each of the frames.
+    """
+    indices = np.asarray(indices, dtype=int)
+    if trajectory.zpos is None:
+        positions = read_frame_zpos(trajectory.pdbfile, trajectory.offsets, indices)
+    else:
+        positions = (trajectory.zpos[k] for k in indices)
+    for i, zpos in enumerate(positions):
+        cell = trajectory.cell[indices[i]].copy()
+        if flip:
+            zpos = np.sqrt(np.square(cell[2] - zpos))
+        yield dataformat.Frame(None if times is None else times[i], cell, zpos)
+
+
+class _FrameCounter:
+    """Counts the atoms in each frame, as the chunks of the file are parsed."""
+    def __init__(self):
+        self.counts = []
+        self.offsets = [0]
+        self.current = 0
+
+    def add(self, atom_starts, boundaries, chunk_start):
+        boundary_starts, boundary_ends = boundaries
+        if boundary_starts.size == 0:
+            self.current += atom_starts.size
+            return
+        pieces = np.bincount(np.searchsorted(boundary_starts, atom_starts), minlength=boundary_starts.size + 1)
+        self.counts.append(self.current + pieces[0])
+        self.counts.extend(pieces[1:-1].tolist())
+        self.current = pieces[-1]
+        self.offsets.extend((boundary_ends + chunk_start).tolist())
+
+    def finish(self, size):
+        if self.current > 0:
+            self.counts.append(self.current)
+            self.offsets.append(size)
+        return np.array(self.counts, dtype=np.int64), np.array(self.offsets, dtype=np.int64)
+
+
+def _chunks(mm, start, stop, chunk_size):
+    while start < stop:
+        end = min(start + chunk_size, stop)
+        if end < stop:
+            newline = mm.rfind(b'\n', start, end)
+            end = mm.find(b'\n', end, stop) + 1 if newline == -1 else newline + 1
+            if end == 0:
+                end = stop
+        yield start, end
+        start = end
+
+
+def _parse_chunk(mm, start, stop, positions, names):
+    buf = np.frombuffer(mm, dtype=np.uint8, count=stop - start, offset=start)
+    newlines = np.flatnonzero(buf == 10)
+    starts = np.concatenate(([0], newlines + 1))
+    ends = np.append(newlines, buf.size)
+    if starts[-1] == buf.size:
+        starts, ends = starts[:-1], ends[:-1]
+    heads = buf[np.minimum(starts[:, np.newaxis] + np.arange(6), buf.size - 1)].view('S6').ravel()
+
+    atoms = (heads == b'ATOM  ') | (heads == b'HETATM')
+    atom_starts = starts[atoms]
+    endmdl = heads == b'ENDMDL'
+    end = (heads.astype('S3') == b'END') & ~endmdl
+    chunk = {'atom_starts': atom_starts,
+             'endmdl': (starts[endmdl], np.minimum(ends[endmdl] + 1, buf.size)),
+             'end': (starts[end], np.minimum(ends[end] + 1, buf.size)),
+             'times': [float(bytes(buf[s:e]).split()[-1]) for s, e in zip(starts[heads == b'TITLE '],
+                                                                          ends[heads == b'TITLE '])],
+             'cell': [[float(bytes(buf[s + 6:s + 15])), float(bytes(buf[s + 15:s + 24])),
+                       float(bytes(buf[s + 24:s + 33]))] for s in starts[heads == b'CRYST1']]}
+
+    if positions:
+        if np.any(ends[atoms] - atom_starts < 54):
+            raise ValueError("An atom line of the pdbfile is too short to contain a z-position.")
+        chunk['zpos'] = buf[atom_starts[:, np.newaxis] + np.arange(46, 54)].view('S8').ravel().astype(
+            np.float64).astype(np.float32)
+    if names:
+        boundaries = np.concatenate((chunk['endmdl'][0], chunk['end'][0]))
+        first = atom_starts[atom_starts < np.min(boundaries)] if boundaries.size > 0 else atom_starts
+        chunk['names'] = [bytes(buf[s + 12:s + 16]).decode().strip() for s in first]
+    return chunk
@@ -1,5 +1,4 @@
-from distutils.core import setup
-from setuptools import find_packages
+from setuptools import setup, find_packages
 
 # versioning
 MAJOR = 1
@@ -26,6 +25,9 @@ setup(
         'numpy', 'matplotlib', 'scipy'
     ],
     include_package_data=True,
+    entry_points={
+        'console_scripts': ['falass = falass.cli:main'],
+    },
     classifiers=[
         'Development Status :: 3 - Alpha',
         'Intended Audience :: Science/Research',